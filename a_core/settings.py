@@ -63,10 +63,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, repeat honeypot offenders are rejected before any other work
+    'honeypot_monitor.middleware.HoneypotBlockMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'a_users.middleware.LegacyAuthBackendMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -74,9 +77,11 @@ MIDDLEWARE = [
     'django_htmx.middleware.HtmxMiddleware',
 ]
 
+# Same as Django's and allauth's backends, the user of a session is loaded
+# with its profile (see a_users/backends.py)
 AUTHENTICATION_BACKENDS = [
-    'django.contrib.auth.backends.ModelBackend',
-    'allauth.account.auth_backends.AuthenticationBackend',
+    'a_users.backends.ProfileModelBackend',
+    'a_users.backends.ProfileAuthenticationBackend',
 ]
 
 ROOT_URLCONF = 'a_core.urls'
@@ -122,6 +127,15 @@ else:
         }
     }
 
+# Shared by every gunicorn worker so signal invalidations reach all of them,
+# the table is created by the games migrations
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -166,6 +180,34 @@ if ENVIRONMENT == 'production':
 else:
     EXPORTS_ROOT = os.path.join(BASE_DIR, 'exports')
 
+# Export jobs and merge downloads each work in their own folder under
+# EXPORTS_ROOT/jobs, folders unused for longer than this are swept
+EXPORT_WORKSPACE_TTL = 7 * 24 * 60 * 60  # seconds
+
+# A running export whose worker gave no sign of life (claim or compiled chunk)
+# for this long is marked as failed, e.g. after the worker was killed
+EXPORT_JOB_TIMEOUT = 15 * 60  # seconds
+
+# Compiled label PDFs, reused while the label content does not change
+LABEL_CACHE_ROOT = os.path.join(EXPORTS_ROOT, 'label_cache')
+LABEL_CACHE_MAX_SIZE = 500 * 1024 * 1024  # bytes
+LABEL_CACHE_MAX_AGE = 90 * 24 * 60 * 60  # seconds
+
+# Compile the label of a game in the export worker as soon as it is added or
+# edited, exports then find it in the label cache. Successive edits within
+# LABEL_PRERENDER_DELAY are compiled once, after the last one
+LABEL_PRERENDER = env.bool('LABEL_PRERENDER', default=False)
+LABEL_PRERENDER_DELAY = 30  # seconds
+
+# Precompiled pdflatex formats of the label template preamble
+LABEL_FORMAT_ROOT = os.path.join(EXPORTS_ROOT, 'label_formats')
+
+# Columns and rows of labels per printable sheet, as many as fit when unset
+LABEL_SHEET_GRIDS = {
+    # 'letter': (4, 3),
+    # 'a4': (3, 3),
+}
+
 MEDIA_ROOT = BASE_DIR / 'media'
 MEDIA_URL = 'media/'
 # Default primary key field type
@@ -228,7 +270,8 @@ LOGGING = {
     'handlers': {
         'file': {
             'level': 'WARNING',
-            'class': 'logging.FileHandler',
+            # Written by a background thread, logging never blocks a request
+            'class': 'honeypot_monitor.log_handlers.QueuedFileHandler',
             'filename': BASE_DIR / 'logs' / 'honeypot.log',
             'formatter': 'verbose',
         },
@@ -249,9 +292,38 @@ LOGGING = {
             'level': 'WARNING',
             'propagate': True,
         },
+        'honeypot_monitor': {
+            'handlers': ['file', 'console'],
+            'level': 'WARNING',
+            'propagate': True,
+        },
     },
 }
 
+# Honeypot attempts are buffered and written with one INSERT per batch, after
+# this many attempts or this many milliseconds
+HONEYPOT_FLUSH_SIZE = 100
+HONEYPOT_FLUSH_INTERVAL = 500
+
+# Days of raw honeypot attempts kept, older ones only remain as daily rollups
+# (python manage.py rollup_honeypot, run daily from cron)
+HONEYPOT_RETENTION_DAYS = 30
+
+# IPs with HONEYPOT_BLOCK_THRESHOLD honeypot hits in the last HONEYPOT_BLOCK_TTL
+# seconds, or hitting it faster than the token bucket allows, get a static 403
+# on every page until HONEYPOT_BLOCK_TTL seconds after their last hit. Off until
+# the client address is set up: behind a proxy, HONEYPOT_CLIENT_IP_HEADER must
+# carry it and the proxy must be listed in HONEYPOT_TRUSTED_PROXIES
+HONEYPOT_BLOCK = env.bool('HONEYPOT_BLOCK', default=False)
+HONEYPOT_CLIENT_IP_HEADER = env('HONEYPOT_CLIENT_IP_HEADER', default='HTTP_X_REAL_IP')  # request.META key, X-Real-IP from nginx proxy_params
+HONEYPOT_TRUSTED_PROXIES = env.list('HONEYPOT_TRUSTED_PROXIES', default=['127.0.0.1', '::1'])
+HONEYPOT_BLOCK_THRESHOLD = 3
+HONEYPOT_BLOCK_TTL = 24 * 60 * 60  # seconds
+HONEYPOT_BLOCK_REFRESH = 60  # seconds between reloads of the offenders from the database
+HONEYPOT_BLOCK_SHARED_CACHE = False  # share the reloaded offenders between workers through CACHES
+HONEYPOT_RATE_BURST = 5
+HONEYPOT_RATE_PER_MINUTE = 2
+
 #if ENVIRONMENT == 'production':
     # Security settings for production
     #SECURE_BROWSER_XSS_FILTER = True
@@ -3,11 +3,14 @@ from django.contrib.auth.decorators import user_passes_test
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.http import HttpResponse
+from django.db.models import Count, Q, Sum
 from a_users.models import Profile
 from django.core.mail import send_mail
 from django.conf import settings
+from games.exports import CSV_CHUNK_SIZE, streaming_csv_response
+from games.models import Game
+from games.pagination import decode_cursor, encode_cursor
 import logging
-import csv
 
 def is_admin_user(user):
     """Check if user is admin/staff"""
@@ -17,41 +20,47 @@ def help_support(request):
     """Display help and support contact information"""
     return render(request, 'help_support.html')
 
+USERS_PAGE_SIZE = 50
+
+USER_CSV_HEADER = [
+    'User ID', 'Username', 'Email', 'First Name', 'Last Name', 'Phone Number', 
+    'Drop Off Location', 'Payment Choice', 'Status', 'Is Staff', 'Date Joined'
+]
+
+DROPOFF_LOCATION_LABELS = dict(Profile.DROPOFF_LOCATION_CHOICES)
+PAYMENT_CHOICE_LABELS = dict(Profile.PAYMENT_CHOICE_CHOICES)
+
+def user_csv_rows(users):
+    """Yield the header then one CSV row per user of the queryset"""
+    yield USER_CSV_HEADER
+    rows = users.values_list(
+        'id', 'username', 'email', 'first_name', 'last_name', 'profile__phone_number',
+        'profile__dropoff_location', 'profile__payment_choice', 'is_active', 'is_staff', 'date_joined'
+    ).iterator(chunk_size=CSV_CHUNK_SIZE)
+    for user_id, username, email, first_name, last_name, phone_number, dropoff_location, payment_choice, is_active, is_staff, date_joined in rows:
+        yield [
+            user_id,
+            username,
+            email or '',
+            first_name or '',
+            last_name or '',
+            phone_number or '',
+            DROPOFF_LOCATION_LABELS.get(dropoff_location, dropoff_location) if dropoff_location else 'Not Set',
+            PAYMENT_CHOICE_LABELS.get(payment_choice, payment_choice) if payment_choice else 'Not Set',
+            'Active' if is_active else 'Inactive',
+            'Yes' if is_staff else 'No',
+            date_joined.strftime('%Y-%m-%d %H:%M:%S')
+        ]
+
 @user_passes_test(is_admin_user)
 def admin_users_dashboard(request):
     """Admin-only view showing all users in a table format"""
     User = get_user_model()
-    users = User.objects.all().select_related('profile').order_by('-date_joined')
+    users = User.objects.all().order_by('-date_joined', '-id')
     
     # Handle CSV export
     if request.GET.get('export') == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="users_export.csv"'
-        
-        writer = csv.writer(response)
-        # Write header row
-        writer.writerow([
-            'User ID', 'Username', 'Email', 'First Name', 'Last Name', 'Phone Number', 
-            'Drop Off Location', 'Payment Choice', 'Status', 'Is Staff', 'Date Joined'
-        ])
-        
-        # Write data rows
-        for user in users:
-            writer.writerow([
-                user.id,
-                user.username,
-                user.email or '',
-                user.first_name or '',
-                user.last_name or '',
-                user.profile.phone_number if hasattr(user, 'profile') and user.profile.phone_number else '',
-                user.profile.get_dropoff_location_display() if hasattr(user, 'profile') and user.profile.dropoff_location else 'Not Set',
-                user.profile.get_payment_choice_display() if hasattr(user, 'profile') and user.profile.payment_choice else 'Not Set',
-                'Active' if user.is_active else 'Inactive',
-                'Yes' if user.is_staff else 'No',
-                user.date_joined.strftime('%Y-%m-%d %H:%M:%S')
-            ])
-        
-        return response
+        return streaming_csv_response(user_csv_rows(users), 'users_export.csv')
     
     # Handle user deletion
     if request.method == 'POST' and 'delete_user' in request.POST:
@@ -68,10 +77,45 @@ def admin_users_dashboard(request):
             messages.error(request, 'User not found.')
         return redirect('admin_users_dashboard')
     
+    # Keyset pagination on (date_joined, id), pages are appended by HTMX "load more"
+    cursor = decode_cursor(request.GET.get('cursor', ''), 'datetime')
+    page = users.select_related('profile')
+    if cursor:
+        date_joined, user_id = cursor
+        page = page.filter(Q(date_joined__lt=date_joined) | Q(date_joined=date_joined, id__lt=user_id))
+    
+    page = list(page[:USERS_PAGE_SIZE + 1])
+    
+    next_cursor = None
+    if len(page) > USERS_PAGE_SIZE:
+        page = page[:USERS_PAGE_SIZE]
+        last = page[-1]
+        next_cursor = encode_cursor(last.date_joined, last.id)
+    
+    # Game counts aggregated for the users of this page only, not the whole table
+    game_counts = {
+        row['user_id']: row
+        for row in Game.objects.filter(user_id__in=[user.id for user in page]).values('user_id').annotate(
+            games_listed=Count('id'),
+            games_received=Count('id', filter=Q(received=True)),
+            games_total_price=Sum('price'),
+        )
+    }
+    for user in page:
+        counts = game_counts.get(user.id, {})
+        user.games_listed = counts.get('games_listed', 0)
+        user.games_received = counts.get('games_received', 0)
+        user.games_total_price = counts.get('games_total_price')
+    
     context = {
-        'users': users,
+        'users': page,
+        'next_cursor': next_cursor,
     }
     
+    if request.htmx and cursor:
+        return render(request, 'partials/admin_users_rows.html', context)
+    
+    context['total_users'] = User.objects.count()
     return render(request, 'admin_users_dashboard.html', context)
 
 def test_email_debug(request):
@@ -0,0 +1,32 @@
+from allauth.account.auth_backends import AuthenticationBackend
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class ProfileUserMixin:
+    """Load the user of a session together with its profile, in one query"""
+
+    def get_user(self, user_id):
+        # The header of every page shows the profile avatar and name
+        try:
+            user = UserModel._default_manager.select_related('profile').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        try:
+            user = await UserModel._default_manager.select_related('profile').aget(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+class ProfileModelBackend(ProfileUserMixin, ModelBackend):
+    pass
+
+
+class ProfileAuthenticationBackend(ProfileUserMixin, AuthenticationBackend):
+    pass
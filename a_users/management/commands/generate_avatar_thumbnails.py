@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from a_users.models import Profile
+from a_users.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Create the thumbnails of the avatars uploaded before thumbnails existed, or that failed to process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate the thumbnails of every avatar')
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['force']:
+            profiles = profiles.filter(image_thumbnails={})
+
+        done = 0
+        failed = 0
+        for profile_id, image_name in profiles.values_list('id', 'image').iterator():
+            try:
+                generate_thumbnails(profile_id, image_name)
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'{image_name}: {e}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Created thumbnails for {done} avatars, {failed} failed'))
@@ -0,0 +1,20 @@
+from django.contrib.auth import BACKEND_SESSION_KEY
+
+# Backends of the sessions opened before a_users.backends was introduced
+LEGACY_BACKENDS = {
+    'django.contrib.auth.backends.ModelBackend': 'a_users.backends.ProfileModelBackend',
+    'allauth.account.auth_backends.AuthenticationBackend': 'a_users.backends.ProfileAuthenticationBackend',
+}
+
+
+class LegacyAuthBackendMiddleware:
+    """Point sessions of the former backends to their profile loading subclass, so nobody gets logged out"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        backend = request.session.get(BACKEND_SESSION_KEY)
+        if backend in LEGACY_BACKENDS:
+            request.session[BACKEND_SESSION_KEY] = LEGACY_BACKENDS[backend]
+        return self.get_response(request)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('a_users', '0003_profile_payment_choice'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='dropoff_location',
+            field=models.CharField(choices=[('Abington', 'Abington'), ('Norton', 'Norton'), ('Saugus', 'Saugus'), ('Framingham', 'Framingham')], db_index=True, default='Abington', help_text='Select your preferred dropoff location', max_length=20),
+        ),
+    ]
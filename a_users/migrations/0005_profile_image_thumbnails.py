@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('a_users', '0004_alter_profile_dropoff_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='image_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Storage names of the avatar thumbnails by size (see thumbnails.py)'),
+        ),
+    ]
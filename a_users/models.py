@@ -18,12 +18,14 @@ class Profile(models.Model):
     
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     image = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    image_thumbnails = models.JSONField(default=dict, blank=True, editable=False, help_text='Storage names of the avatar thumbnails by size (see thumbnails.py)')
     display_name = models.CharField(max_length=20, null=True, blank=True)
     phone_number = models.CharField(max_length=15, null=True, blank=True, help_text='Enter phone number (e.g., +1-555-123-4567)')
     dropoff_location = models.CharField(
         max_length=20,
         choices=DROPOFF_LOCATION_CHOICES,
         default='Abington',
+        db_index=True,
         help_text='Select your preferred dropoff location'
     )
     payment_choice = models.CharField(
@@ -51,4 +53,21 @@ class Profile(models.Model):
             avatar = self.image.url
         except:
             avatar = static('images/avatar.svg')
-        return avatar
\ No newline at end of file
+        return avatar
+    
+    def avatar_url(self, size):
+        """Return the smallest avatar thumbnail at least size pixels wide, the original until thumbnails are ready"""
+        for thumbnail_size in sorted(int(key) for key in self.image_thumbnails):
+            if thumbnail_size >= size:
+                return self.image.storage.url(self.image_thumbnails[str(thumbnail_size)])
+        return self.avatar
+    
+    @property
+    def avatar_small(self):
+        # Header avatar, 32px
+        return self.avatar_url(64)
+    
+    @property
+    def avatar_large(self):
+        # Profile pages, 144px
+        return self.avatar_url(288)
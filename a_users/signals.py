@@ -1,8 +1,10 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_init, post_save, pre_save
 from allauth.account.models import EmailAddress
 from django.contrib.auth.models import User
+from django_cleanup.signals import cleanup_post_delete
 from .models import Profile
+from .thumbnails import delete_thumbnails, schedule_thumbnails
 
 @receiver(post_save, sender=User)
 def user_post_save(sender, instance, created, **kwargs):
@@ -33,4 +35,30 @@ def user_post_save(sender, instance, created, **kwargs):
 def user_pre_save(sender, instance, **kwargs):
     if instance.username:
         instance.username = instance.username.lower()
-    
\ No newline at end of file
+
+
+@receiver(post_init, sender=Profile)
+def profile_post_init(sender, instance, **kwargs):
+    # Name of the avatar the profile was loaded with, read from __dict__ so a
+    # deferred field never triggers a query
+    image = instance.__dict__.get('image')
+    instance._loaded_image_name = getattr(image, 'name', image) or ''
+
+@receiver(pre_save, sender=Profile)
+def profile_pre_save(sender, instance, update_fields=None, **kwargs):
+    instance._image_changed = (update_fields is None or 'image' in update_fields) and (instance.image.name or '') != instance._loaded_image_name
+    if instance._image_changed:
+        # Thumbnails of the previous avatar, the new ones are made after the save
+        instance.image_thumbnails = {}
+
+@receiver(post_save, sender=Profile)
+def profile_post_save(sender, instance, **kwargs):
+    if getattr(instance, '_image_changed', False) and instance.image:
+        schedule_thumbnails(instance)
+    instance._loaded_image_name = instance.image.name or ''
+
+@receiver(cleanup_post_delete, sender=Profile)
+def profile_image_deleted(sender, file, file_name, field_name, success, **kwargs):
+    # django_cleanup deleted a replaced or orphaned avatar, its thumbnails go with it
+    if success and field_name == 'image':
+        delete_thumbnails(file.storage, file_name)
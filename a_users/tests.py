@@ -1,3 +1,82 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from a_core.views import USERS_PAGE_SIZE
+from games.models import Game
+from games.pagination import decode_cursor, encode_cursor
+
+
+class AdminUsersDashboardTests(TestCase):
+    """Check the keyset pages of the admin users dashboard"""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password', date_joined=now)
+        # Groups of users joined at the same instant, so pages split ties on id
+        User.objects.bulk_create([
+            User(username=f'user{i}', date_joined=now - timedelta(days=i // 7)) for i in range(2 * USERS_PAGE_SIZE + 10)
+        ])
+        seller = User.objects.get(username='user3')
+        Game.objects.create(user=seller, name='Azul', price=Decimal('10.00'), condition='good', received=True)
+        Game.objects.create(user=seller, name='Root', price=Decimal('5.50'), condition='fair')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def load_pages(self):
+        """Follow the "load more" cursors, return the ids of every page"""
+        response = self.client.get(reverse('admin_users_dashboard'))
+        pages = [[user.id for user in response.context['users']]]
+        while response.context['next_cursor']:
+            self.assertEqual(decode_cursor(response.context['next_cursor'], 'datetime')[1], pages[-1][-1])
+            response = self.client.get(
+                reverse('admin_users_dashboard'), {'cursor': response.context['next_cursor']}, HTTP_HX_REQUEST='true'
+            )
+            pages.append([user.id for user in response.context['users']])
+        return pages
+
+    def test_cursor_round_trip(self):
+        user = User.objects.get(username='user20')
+        cursor = encode_cursor(user.date_joined, user.id)
+        self.assertEqual(decode_cursor(cursor, 'datetime'), (user.date_joined, user.id))
+        self.assertIsNone(decode_cursor('garbage', 'datetime'))
+
+    def test_pages_cover_every_user_once(self):
+        pages = self.load_pages()
+        self.assertEqual(len(pages), 3)
+        ids = [user_id for page in pages for user_id in page]
+        expected = list(User.objects.order_by('-date_joined', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_game_counts_of_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin_users_dashboard'))
+        users = {user.username: user for user in response.context['users']}
+        self.assertEqual(users['user3'].games_listed, 2)
+        self.assertEqual(users['user3'].games_received, 1)
+        self.assertEqual(users['user3'].games_total_price, Decimal('15.50'))
+        self.assertEqual(users['user4'].games_listed, 0)
+        self.assertIsNone(users['user4'].games_total_price)
+        # Games are only aggregated for the users of the page
+        game_queries = [query['sql'] for query in queries.captured_queries if '"games_game"' in query['sql']]
+        self.assertEqual(len(game_queries), 1)
+        self.assertIn(' IN (', game_queries[0])
 
-# Create your tests here.
+    def test_page_reads_date_joined_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('The plan is only checked on SQLite')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('admin_users_dashboard'))
+        sql = next(query['sql'] for query in queries.captured_queries if 'ORDER BY "auth_user"."date_joined" DESC' in query['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            plan = '\n'.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('games_user_date_joined_idx', plan)
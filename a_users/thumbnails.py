@@ -0,0 +1,98 @@
+"""
+Avatar thumbnails.
+
+Profile.image keeps the uploaded file as is. Once the upload is committed, a
+background thread crops it to squares of each AVATAR_THUMBNAIL_SIZES and
+stores them as WebP (JPEG if Pillow lacks WebP support) under
+``avatars/thumbs/<size>/``. Until they are ready pages show the original.
+
+Thumbnail names derive from the name of the original, so when django_cleanup
+deletes a replaced or orphaned avatar its thumbnails are deleted with it.
+"""
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# Square sizes in pixels: the 32px header avatar and the 144px profile picture, at 2x
+AVATAR_THUMBNAIL_SIZES = [64, 288]
+THUMBNAIL_DIR = 'avatars/thumbs'
+THUMBNAIL_FORMATS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+THUMBNAIL_QUALITY = 85
+
+# A single thread, uploads are rare and Pillow should not compete with requests
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='avatar-thumbnails')
+
+
+def thumbnail_format():
+    return 'WEBP' if features.check('webp') else 'JPEG'
+
+
+def thumbnail_name(image_name, size, image_format=None):
+    """Return the storage name of a thumbnail of an avatar"""
+    extension = THUMBNAIL_FORMATS[image_format or thumbnail_format()]
+    return f'{THUMBNAIL_DIR}/{size}/{posixpath.basename(image_name)}.{extension}'
+
+
+def render_thumbnail(image, size, image_format):
+    """Return the bytes of a square thumbnail of a Pillow image"""
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha and image_format != 'JPEG' else 'RGB')
+    thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, image_format, quality=THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+def delete_thumbnails(storage, image_name):
+    for size in AVATAR_THUMBNAIL_SIZES:
+        for image_format in THUMBNAIL_FORMATS:
+            storage.delete(thumbnail_name(image_name, size, image_format))
+
+
+def generate_thumbnails(profile_id, image_name):
+    """Create the thumbnails of an avatar and record them on the profile, return their names"""
+    from .models import Profile
+
+    storage = Profile._meta.get_field('image').storage
+    with storage.open(image_name) as f:
+        image = Image.open(f)
+        # Phone photos are often stored sideways with an orientation tag
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    image_format = thumbnail_format()
+    names = {}
+    for size in AVATAR_THUMBNAIL_SIZES:
+        name = thumbnail_name(image_name, size, image_format)
+        # Replace a previous version instead of getting a renamed copy
+        storage.delete(name)
+        names[str(size)] = storage.save(name, ContentFile(render_thumbnail(image, size, image_format)))
+
+    # The avatar may have been replaced in the meantime
+    if not Profile.objects.filter(pk=profile_id, image=image_name).update(image_thumbnails=names):
+        delete_thumbnails(storage, image_name)
+        return {}
+    return names
+
+
+def _generate_in_background(profile_id, image_name):
+    # The thread keeps its own connection, drop it if it expired
+    close_old_connections()
+    try:
+        generate_thumbnails(profile_id, image_name)
+    except Exception:
+        logger.exception('Failed to generate the thumbnails of avatar %s', image_name)
+
+
+def schedule_thumbnails(profile):
+    """Generate the thumbnails of the avatar of a profile once the current transaction commits"""
+    profile_id, image_name = profile.pk, profile.image.name
+    transaction.on_commit(lambda: _executor.submit(_generate_in_background, profile_id, image_name))
+
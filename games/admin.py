@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Game
+from .models import Game, ExportJob, ExportJobItem
 
 @admin.register(Game)
 class GameAdmin(admin.ModelAdmin):
@@ -32,3 +32,22 @@ class GameAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user')
+
+
+class ExportJobItemInline(admin.TabularInline):
+    model = ExportJobItem
+    fields = ['position', 'game', 'game_name', 'status', 'error_message']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'created_by', 'status', 'total', 'processed', 'succeeded', 'output_file', 'created_at', 'finished_at']
+    list_filter = ['status', 'created_at']
+    readonly_fields = ['created_by', 'total', 'processed', 'succeeded', 'output_file', 'error_message', 'created_at', 'started_at', 'finished_at']
+    inlines = [ExportJobItemInline]
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('created_by')
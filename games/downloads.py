@@ -0,0 +1,60 @@
+"""
+Streamed downloads of generated PDFs with HTTP range support.
+
+``ranged_response.RangedFileResponse`` handles the Range header but sizes the
+file with ``len(file.read())`` and never closes it, so the reader is replaced
+by one that takes the size from the file system, streams the file in blocks
+and runs cleanup callbacks once the response is closed.
+"""
+import os
+
+from django.http import FileResponse
+from django.utils.http import content_disposition_header
+from ranged_response import RangedFileReader, RangedFileResponse
+
+
+class ClosingFileReader(RangedFileReader):
+    """Ranged reader of a file on disk that runs cleanup callbacks when it is closed"""
+    block_size = 64 * 1024
+
+    def __init__(self, path, cleanup=None, sent_cleanup=None):
+        self.f = open(path, 'rb')
+        self.size = os.fstat(self.f.fileno()).st_size
+        self.start = 0
+        self.stop = self.size
+        self.cleanup = cleanup
+        self.sent_cleanup = sent_cleanup
+        self.sent = False
+
+    def __iter__(self):
+        yield from super().__iter__()
+        # Only reached when the whole range went out without the client leaving
+        self.sent = self.start == 0 and self.stop >= self.size
+
+    def close(self):
+        self.f.close()
+        if self.cleanup:
+            self.cleanup()
+        if self.sent and self.sent_cleanup:
+            self.sent_cleanup()
+
+
+class FileDownloadResponse(RangedFileResponse):
+    """
+    Attachment download of a file on disk, answering Range requests with 206.
+
+    cleanup is called once the response is closed, sent_cleanup only if the
+    whole file was sent (not after a partial range or an aborted download).
+    Pass ranged=False for a file that will not exist anymore for a resumed
+    request, the whole file is then always sent.
+    """
+
+    def __init__(self, request, path, filename, content_type='application/pdf', cleanup=None, sent_cleanup=None, ranged=True):
+        self.ranged_file = ClosingFileReader(path, cleanup, sent_cleanup)
+        # Skip RangedFileResponse.__init__, it would build its own reader
+        FileResponse.__init__(self, self.ranged_file, content_type=content_type)
+        self['Content-Disposition'] = content_disposition_header(True, filename)
+        self['Content-Length'] = self.ranged_file.size
+        self['Accept-Ranges'] = 'bytes' if ranged else 'none'
+        if ranged and 'HTTP_RANGE' in request.META:
+            self.add_range_headers(request.META['HTTP_RANGE'])
@@ -0,0 +1,331 @@
+"""
+Background processing of label export jobs.
+
+The admin dashboard only queues an ExportJob with one ExportJobItem per
+selected game. The ``run_export_worker`` management command claims pending
+jobs, reuses the labels found in the label cache, splits the remaining ones
+into chunks compiled in parallel across CPU cores (each chunk in a single TeX
+run), records the outcome of every label and assembles the final sheet in the
+workspace of the job (see games/workspaces.py). Jobs using the native backend
+skip TeX entirely and draw their labels in process (see games/label_pdf.py).
+
+With ``settings.LABEL_PRERENDER`` the worker also compiles the labels of newly
+added or edited games into the label cache while it has no export to run.
+"""
+import math
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Prefetch, Q
+from django.utils import timezone
+
+from . import imposition, label_pdf, labels, label_cache, workspaces
+from .models import ExportJob, ExportJobItem, Game, LabelPrerender
+
+# Upper bound of labels compiled in one TeX run, keeps progress updates regular
+MAX_CHUNK_SIZE = 100
+
+
+def enqueue_label_export(games, user, sheet_layout='labels', label_backend='latex'):
+    """Create a pending export job for the given games queryset"""
+    with transaction.atomic():
+        job = ExportJob.objects.create(created_by=user, sheet_layout=sheet_layout, label_backend=label_backend)
+        items = [
+            ExportJobItem(job=job, game_id=game_id, game_name=game_name, position=position)
+            for position, (game_id, game_name) in enumerate(games.values_list('id', 'name'))
+        ]
+        ExportJobItem.objects.bulk_create(items, batch_size=500)
+        job.total = len(items)
+        job.save(update_fields=['total'])
+    return job
+
+
+def recent_export_jobs(limit=5):
+    """Return the template context of the export progress panel"""
+    queryset = ExportJob.objects.select_related('created_by').prefetch_related(
+        Prefetch('items', queryset=ExportJobItem.objects.filter(status='failed'), to_attr='failed_items')
+    )
+    jobs = list(queryset[:limit])
+    # The panel polls while a job is active, never for a job whose worker is gone
+    cutoff = _stale_cutoff()
+    if any(job.status == 'running' and (job.heartbeat_at or job.started_at or job.created_at) < cutoff for job in jobs):
+        recover_stale_jobs()
+        jobs = list(queryset[:limit])
+    return {
+        'export_jobs': jobs,
+        'export_jobs_active': any(job.is_active for job in jobs),
+    }
+
+
+def claim_job(job_id):
+    """Mark a pending job as running, return it or None if another worker claimed it first"""
+    # The conditional update makes sure only one worker can claim a job,
+    # even with several workers on different nodes
+    now = timezone.now()
+    claimed = ExportJob.objects.filter(pk=job_id, status='pending').update(
+        status='running',
+        started_at=now,
+        heartbeat_at=now,
+    )
+    return ExportJob.objects.get(pk=job_id) if claimed else None
+
+
+def claim_next_job():
+    """Atomically claim the oldest pending job, return None if there is nothing to do"""
+    for job_id in ExportJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True)[:10]:
+        job = claim_job(job_id)
+        if job is not None:
+            return job
+    return None
+
+
+def _stale_cutoff():
+    return timezone.now() - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT)
+
+
+def recover_stale_jobs():
+    """Fail the running jobs whose worker stopped (killed, out of memory, restarted), return how many"""
+    cutoff = _stale_cutoff()
+    return ExportJob.objects.filter(status='running').filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    ).update(
+        status='failed',
+        error_message='The export worker stopped while processing this export, please queue it again.',
+        finished_at=timezone.now(),
+    )
+
+
+def _record_chunk(job, chunk, results, reason):
+    """Store the outcome of a compiled chunk and advance the job progress"""
+    ok_ids = [item.pk for item, ok in zip(chunk, results) if ok]
+    failed_ids = [item.pk for item, ok in zip(chunk, results) if not ok]
+    with transaction.atomic():
+        if ok_ids:
+            ExportJobItem.objects.filter(pk__in=ok_ids).update(status='success')
+        if failed_ids:
+            ExportJobItem.objects.filter(pk__in=failed_ids).update(status='failed', error_message=reason[:255])
+        ExportJob.objects.filter(pk=job.pk).update(
+            processed=F('processed') + len(chunk),
+            succeeded=F('succeeded') + len(ok_ids),
+            heartbeat_at=timezone.now(),
+        )
+
+
+def _compile_chunks(preamble, chunk_bodies, chunk_paths, workers):
+    """Yield (index, results, reason) for every chunk as soon as it is compiled"""
+    if workers == 1:
+        for index, (bodies, paths) in enumerate(zip(chunk_bodies, chunk_paths)):
+            try:
+                yield index, labels.compile_labels(preamble, bodies, paths), 'LaTeX compilation failed'
+            except Exception as e:
+                yield index, [False] * len(bodies), f'Error: {str(e)}'
+        return
+
+    # Worker processes never touch the database, do not share connections with them
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(labels.compile_labels, preamble, bodies, paths): index
+            for index, (bodies, paths) in enumerate(zip(chunk_bodies, chunk_paths))
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                yield index, future.result(), 'LaTeX compilation failed'
+            except Exception as e:
+                yield index, [False] * len(chunk_bodies[index]), f'Error: {str(e)}'
+
+
+def _render_latex(job, available, temp_dir, pages_path, workers):
+    """Compile the labels with pdflatex into pages_path, reusing the label cache, return the printed items"""
+    preamble, body = labels.split_template(labels.load_template())
+    bodies = {item.pk: labels.render_label_body(item.game, body) for item in available}
+    keys = {item.pk: label_cache.label_key(preamble, bodies[item.pk]) for item in available}
+
+    # Labels whose content did not change since they were last compiled
+    label_paths = {}
+    for item in available:
+        path = label_cache.lookup(keys[item.pk])
+        if path is not None:
+            label_paths[item.pk] = path
+    hits = [item for item in available if item.pk in label_paths]
+    if hits:
+        _record_chunk(job, hits, [True] * len(hits), '')
+
+    misses = [item for item in available if item.pk not in label_paths]
+    if misses:
+        # Dump the template preamble before the worker processes need it
+        labels.label_format(preamble)
+    chunk_size = max(1, min(MAX_CHUNK_SIZE, math.ceil(len(misses) / workers)))
+    chunks = [misses[i:i + chunk_size] for i in range(0, len(misses), chunk_size)]
+
+    chunk_bodies = [[bodies[item.pk] for item in chunk] for chunk in chunks]
+    chunk_paths = [[os.path.join(temp_dir, f'label_{item.pk}.pdf') for item in chunk] for chunk in chunks]
+    for index, results, reason in _compile_chunks(preamble, chunk_bodies, chunk_paths, workers):
+        for item, path, ok in zip(chunks[index], chunk_paths[index], results):
+            if ok:
+                label_paths[item.pk] = label_cache.store(keys[item.pk], path)
+        _record_chunk(job, chunks[index], results, reason)
+
+    # Assemble the pages in the order the games were selected
+    printed = [item for item in available if item.pk in label_paths]
+    if len(printed) == 1:
+        shutil.copyfile(label_paths[printed[0].pk], pages_path)
+    elif printed and not labels.merge_pdfs([label_paths[item.pk] for item in printed], pages_path):
+        raise RuntimeError('Failed to merge the labels. Please check if pdftk is installed.')
+    return printed
+
+
+def _render_native(job, available, pages_path):
+    """Draw the labels in process into pages_path, return the printed items"""
+    contents = []
+    printed = []
+    failed = []
+    for item in available:
+        try:
+            contents.append(label_pdf.draw_label(item.game))
+        except Exception:
+            failed.append(item)
+        else:
+            printed.append(item)
+    if printed:
+        with open(pages_path, 'wb') as f:
+            label_pdf.write_pdf(contents, f)
+    _record_chunk(job, printed + failed, [True] * len(printed) + [False] * len(failed), 'Label rendering failed')
+    return printed
+
+
+def run_job(job, workers=None):
+    """Render every label of a claimed job and assemble the final sheet"""
+    workers = workers or os.cpu_count() or 1
+
+    items = list(job.items.select_related('game').order_by('position'))
+
+    # Games deleted after the export was queued
+    missing = [item for item in items if item.game is None]
+    if missing:
+        _record_chunk(job, missing, [False] * len(missing), 'Game no longer exists')
+    available = [item for item in items if item.game is not None]
+
+    # Everything this job writes stays in its own workspace, locked while the job runs
+    workspace = workspaces.job_workspace(job)
+    with workspaces.workspace_lock(workspace):
+        workspaces.write_manifest(
+            workspace,
+            job=job.pk,
+            created_by=job.created_by.username if job.created_by else None,
+            status='running',
+            files=[],
+        )
+        temp_dir = tempfile.mkdtemp(dir=workspace)
+        try:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            output_file = f"labels_job{job.pk}_{timestamp}.pdf"
+            output_path = os.path.join(workspace, output_file)
+            # Label pages are imposed on printable sheets in a second pass
+            pages_path = output_path if job.sheet_layout == 'labels' else os.path.join(temp_dir, 'labels.pdf')
+            if job.label_backend == 'native':
+                printed = _render_native(job, available, pages_path)
+            else:
+                printed = _render_latex(job, available, temp_dir, pages_path, workers)
+
+            files = []
+            if printed:
+                if job.sheet_layout != 'labels':
+                    imposition.impose_pdf(pages_path, output_path, sheet=job.sheet_layout)
+                files.append(output_file)
+
+            # Only a job still running is finished, recover_stale_jobs may have
+            # failed it while a chunk took longer than EXPORT_JOB_TIMEOUT
+            finished = ExportJob.objects.filter(pk=job.pk, status='running').update(
+                status='done' if printed or not job.total else 'failed',
+                output_file=workspaces.relative_path(output_path) if printed else '',
+                error_message='' if printed or not job.total else 'No label could be generated.',
+                finished_at=timezone.now(),
+            )
+            job.refresh_from_db()
+            if finished and printed:
+                # Only flag the games as printed once their labels are in the sheet
+                Game.objects.filter(id__in=[item.game_id for item in printed]).update(printed=True, updated_at=timezone.now())
+            workspaces.write_manifest(workspace, status=job.status, files=files if finished else [])
+        except Exception:
+            workspaces.write_manifest(workspace, status='failed')
+            raise
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    # Keep the label cache within its configured size and drop abandoned workspaces
+    label_cache.prune()
+    workspaces.sweep_workspaces()
+    return job
+
+
+def schedule_label_prerenders(game_ids):
+    """Queue the labels of games for compilation, or push back the pending ones"""
+    render_after = timezone.now() + timedelta(seconds=settings.LABEL_PRERENDER_DELAY)
+    # A single upsert, repeated edits only move the deadline
+    LabelPrerender.objects.bulk_create(
+        [LabelPrerender(game_id=game_id, render_after=render_after) for game_id in game_ids],
+        update_conflicts=True,
+        unique_fields=['game'],
+        update_fields=['render_after'],
+        batch_size=500,
+    )
+
+
+def prerender_due_labels(workers=1, limit=None):
+    """
+    Compile into the label cache the queued labels whose debounce delay is
+    over. Returns the number of labels taken from the queue.
+    """
+    limit = limit or MAX_CHUNK_SIZE * workers
+    now = timezone.now()
+    due = LabelPrerender.objects.filter(render_after__lte=now).order_by('render_after').values_list('game_id', 'render_after')[:limit]
+    # Only the worker deleting the row renders the label, and an edit made
+    # since the row was read keeps it queued until its new deadline
+    claimed = [
+        game_id for game_id, render_after in due
+        if LabelPrerender.objects.filter(game_id=game_id, render_after=render_after).delete()[0]
+    ]
+    if not claimed:
+        return 0
+
+    preamble, body = labels.split_template(labels.load_template())
+    bodies = {}
+    keys = {}
+    for game in Game.objects.filter(pk__in=claimed):
+        bodies[game.pk] = labels.render_label_body(game, body)
+        keys[game.pk] = label_cache.label_key(preamble, bodies[game.pk])
+    misses = [game_id for game_id in bodies if label_cache.lookup(keys[game_id]) is None]
+    if not misses:
+        return len(claimed)
+
+    labels.label_format(preamble)
+    chunk_size = max(1, min(MAX_CHUNK_SIZE, math.ceil(len(misses) / workers)))
+    chunks = [misses[i:i + chunk_size] for i in range(0, len(misses), chunk_size)]
+    temp_dir = tempfile.mkdtemp()
+    try:
+        chunk_bodies = [[bodies[game_id] for game_id in chunk] for chunk in chunks]
+        chunk_paths = [[os.path.join(temp_dir, f'label_{game_id}.pdf') for game_id in chunk] for chunk in chunks]
+        # Failed labels are left out, the export compiles them again and reports the error
+        for index, results, reason in _compile_chunks(preamble, chunk_bodies, chunk_paths, workers):
+            for game_id, path, ok in zip(chunks[index], chunk_paths[index], results):
+                if ok:
+                    label_cache.store(keys[game_id], path)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return len(claimed)
+
+
+def fail_job(job, error):
+    """Mark a job as failed after an unexpected error in the worker"""
+    ExportJob.objects.filter(pk=job.pk).update(
+        status='failed',
+        error_message=str(error),
+        finished_at=timezone.now(),
+    )
@@ -0,0 +1,156 @@
+"""
+Bulk CSV import of game listings.
+
+Sellers with large collections upload one CSV instead of submitting the add
+game form once per title. Every row goes through GameForm, so the rules are
+exactly those of the form, and the valid rows are inserted with
+``bulk_create`` in batches inside one transaction. Invalid rows are reported
+with their line number and left out.
+
+The header may use the field names (``name``, ``price``, ...) or the column
+titles of the admin CSV export (``Game Name``, ``Price``, ...), and choice
+columns accept either the stored value or its label.
+"""
+import csv
+import io
+import re
+
+from django.conf import settings
+from django.db import transaction
+
+from .export_jobs import schedule_label_prerenders
+from .exports import GAME_CSV_FIELDS, GAME_CSV_HEADER, yes_no
+from .forms import GameForm
+from .models import Game
+from .stats import invalidate_seller_names, sync_user_stats
+
+# Largest file accepted in one upload
+MAX_IMPORT_ROWS = 10000
+# Rows per INSERT statement
+IMPORT_BATCH_SIZE = 500
+
+IMPORT_FIELDS = GameForm._meta.fields
+BOOLEAN_FIELDS = {'missing_pieces', 'smoking_house', 'musty_smell'}
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'x', 'on'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n', 'off'}
+# 1,250.00, a comma anywhere else (12,50) is left for the form to reject
+THOUSANDS_PRICE_RE = re.compile(r'^\d{1,3}(,\d{3})+(\.\d+)?$')
+
+# Accepted column titles, field names and the titles of the admin export
+COLUMN_ALIASES = {field: field for field in IMPORT_FIELDS}
+COLUMN_ALIASES.update({
+    title.lower(): field
+    for title, field in zip(GAME_CSV_HEADER, GAME_CSV_FIELDS)
+    if field in IMPORT_FIELDS
+})
+
+# Stored value of a choice from its value or label, case insensitive
+CHOICE_VALUES = {
+    'condition': {
+        **{label.lower(): value for value, label in Game.CONDITION_CHOICES},
+        **{label.split(' - ')[0].lower(): value for value, label in Game.CONDITION_CHOICES},
+        **{value: value for value, label in Game.CONDITION_CHOICES},
+    },
+    'pet': {
+        **{label.lower(): value for value, label in Game.PET_CHOICES},
+        **{value: value for value, label in Game.PET_CHOICES},
+    },
+}
+
+
+class GameImportError(Exception):
+    """Raised when the uploaded file cannot be read as a games CSV at all"""
+
+
+def template_rows():
+    """Yield the header and an example row of an import file"""
+    yield IMPORT_FIELDS
+    yield ['Ticket to Ride', '25.00', 'very good', yes_no(True), 'One train missing', yes_no(False), yes_no(False), 'cat']
+
+
+def _row_data(row, columns):
+    """Return the GameForm data of a CSV row and the errors the form cannot report"""
+    data = {}
+    errors = []
+    for index, field in columns.items():
+        value = row[index].strip() if index < len(row) else ''
+        if field in BOOLEAN_FIELDS:
+            # A checkbox takes any unknown value as checked
+            if value.lower() in TRUE_VALUES:
+                data[field] = 'on'
+            elif value.lower() not in FALSE_VALUES:
+                errors.append(f'{field}: Enter Yes or No, not {value}.')
+            continue
+        if field in CHOICE_VALUES:
+            value = CHOICE_VALUES[field].get(value.lower(), value)
+        elif field == 'price':
+            value = value.lstrip('$')
+            if THOUSANDS_PRICE_RE.match(value):
+                value = value.replace(',', '')
+        data[field] = value
+    # Same default as the add game form, for a missing column or an empty cell
+    if not data.get('pet'):
+        data['pet'] = 'none'
+    return data, errors
+
+
+def read_rows(uploaded_file):
+    """Yield (line number, GameForm data, errors) for every row of an uploaded CSV"""
+    text = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    try:
+        header = next(reader, None)
+        if not header:
+            raise GameImportError('The file is empty.')
+        yield from _read_rows(reader, header)
+    except UnicodeDecodeError:
+        raise GameImportError('The file is not UTF-8 encoded, save it as "CSV UTF-8" and upload it again.')
+
+
+def _read_rows(reader, header):
+    """Map the header to GameForm fields, then yield the rows like read_rows"""
+    columns = {}
+    for index, title in enumerate(header):
+        field = COLUMN_ALIASES.get(title.strip().lower())
+        if field is not None and field not in columns.values():
+            columns[index] = field
+    missing = [field for field in ('name', 'price', 'condition') if field not in columns.values()]
+    if missing:
+        raise GameImportError(f'Missing columns: {", ".join(missing)}.')
+
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        yield (reader.line_num, *_row_data(row, columns))
+
+
+def import_games(uploaded_file, user):
+    """
+    Create the games of an uploaded CSV for user.
+
+    Returns a dict with the number of games created and the list of
+    (line number, errors) of the rows left out.
+    """
+    games = []
+    errors = []
+    for line, data, row_errors in read_rows(uploaded_file):
+        if len(games) + len(errors) >= MAX_IMPORT_ROWS:
+            raise GameImportError(f'The file has more than {MAX_IMPORT_ROWS} games, split it into several files.')
+        form = GameForm(data)
+        if form.is_valid() and not row_errors:
+            game = form.save(commit=False)
+            game.user = user
+            games.append(game)
+        else:
+            row_errors += [f'{field}: {message}' if field != '__all__' else message for field, messages in form.errors.items() for message in messages]
+            errors.append((line, row_errors))
+
+    if games:
+        with transaction.atomic():
+            created = Game.objects.bulk_create(games, batch_size=IMPORT_BATCH_SIZE)
+            # bulk_create skips the Game signals, update what they maintain
+            sync_user_stats(user.pk)
+            invalidate_seller_names()
+            if settings.LABEL_PRERENDER:
+                schedule_label_prerenders([game.pk for game in created if game.pk])
+    return {'created': len(games), 'errors': errors}
@@ -0,0 +1,124 @@
+"""
+Imposition of label pages onto printable sheets.
+
+The label template produces one 2x3in page per game. To print them on a
+regular printer the pages are laid out in a grid on Letter or A4 sheets, with
+cut marks around the grid, in a single pass over the merged label PDF. The
+labels are placed as vector content, nothing is rasterized.
+
+Imposition is a second pass after the labels are rendered rather than part of
+the render: the 2x3in label PDFs stay the unit of the label cache and are
+reused by every layout. A grid set in ``settings.LABEL_SHEET_GRIDS`` that does
+not fit the sheet is ignored in favour of the most labels that fit.
+"""
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Sheet sizes in PostScript points
+SHEET_SIZES = {
+    'letter': (612, 792),
+    'a4': (595.28, 841.89),
+}
+
+# Blank border kept around the grid, room for the cut marks
+SHEET_MARGIN = 18  # 0.25in
+CUT_MARK_LENGTH = 9
+CUT_MARK_GAP = 3
+
+
+def fitted_grid(sheet, label_width, label_height):
+    """Return (columns, rows) of the most labels that fit on a sheet within its margin"""
+    sheet_width, sheet_height = SHEET_SIZES[sheet]
+    columns = int((sheet_width - 2 * SHEET_MARGIN) // label_width)
+    rows = int((sheet_height - 2 * SHEET_MARGIN) // label_height)
+    return max(1, columns), max(1, rows)
+
+
+def sheet_grid(sheet, label_width, label_height):
+    """Return (columns, rows) of the labels on a sheet, from settings.LABEL_SHEET_GRIDS or the most that fit"""
+    fitted = fitted_grid(sheet, label_width, label_height)
+    grid = getattr(settings, 'LABEL_SHEET_GRIDS', {}).get(sheet)
+    if not grid:
+        return fitted
+    try:
+        columns, rows = (int(value) for value in grid)
+    except (TypeError, ValueError):
+        columns = rows = 0
+    # A configured grid larger than the fitted one would draw labels off the sheet
+    if not (1 <= columns <= fitted[0] and 1 <= rows <= fitted[1]):
+        logger.warning(
+            'LABEL_SHEET_GRIDS[%r] = %r does not fit %.0fx%.0fpt labels, using %dx%d',
+            sheet, grid, label_width, label_height, *fitted,
+        )
+        return fitted
+    return columns, rows
+
+
+def cut_marks(left, bottom, label_width, label_height, columns, rows):
+    """Return the PDF drawing operators of the cut marks around a grid"""
+    right = left + columns * label_width
+    top = bottom + rows * label_height
+    xs = [left + column * label_width for column in range(columns + 1)]
+    ys = [bottom + row * label_height for row in range(rows + 1)]
+    start, end = CUT_MARK_GAP, CUT_MARK_GAP + CUT_MARK_LENGTH
+
+    lines = []
+    for x in xs:
+        lines.append((x, bottom - end, x, bottom - start))
+        lines.append((x, top + start, x, top + end))
+    for y in ys:
+        lines.append((left - end, y, left - start, y))
+        lines.append((right + start, y, right + end, y))
+
+    operators = ['q', '0.25 w', '0 G']
+    operators += [f'{x1:.2f} {y1:.2f} m {x2:.2f} {y2:.2f} l S' for x1, y1, x2, y2 in lines]
+    operators.append('Q')
+    return '\n'.join(operators).encode('ascii')
+
+
+def impose_pdf(input_path, output_path, sheet='letter', marks=True):
+    """
+    Lay the pages of input_path out on sheets of the given size, row by row
+    from the top left. Returns the number of sheets written.
+    """
+    from pypdf import PdfReader, PdfWriter, Transformation
+    from pypdf.generic import ContentStream, DecodedStreamObject
+
+    reader = PdfReader(input_path)
+    labels = reader.pages
+    if not labels:
+        return 0
+    label_width = float(labels[0].mediabox.width)
+    label_height = float(labels[0].mediabox.height)
+    columns, rows = sheet_grid(sheet, label_width, label_height)
+    per_sheet = columns * rows
+
+    # Center the grid on the sheet
+    sheet_width, sheet_height = SHEET_SIZES[sheet]
+    left = (sheet_width - columns * label_width) / 2
+    bottom = (sheet_height - rows * label_height) / 2
+
+    writer = PdfWriter()
+    sheets = 0
+    try:
+        for first in range(0, len(labels), per_sheet):
+            sheets += 1
+            page = writer.add_blank_page(sheet_width, sheet_height)
+            if marks:
+                stream = DecodedStreamObject()
+                stream.set_data(cut_marks(left, bottom, label_width, label_height, columns, rows))
+                page.replace_contents(ContentStream(stream, writer))
+            for index, label in enumerate(labels[first:first + per_sheet]):
+                column = index % columns
+                row = rows - 1 - index // columns
+                x = left + column * label_width - float(label.mediabox.left)
+                y = bottom + row * label_height - float(label.mediabox.bottom)
+                page.merge_transformed_page(label, Transformation().translate(x, y))
+        with open(output_path, 'wb') as f:
+            writer.write(f)
+    finally:
+        writer.close()
+    return sheets
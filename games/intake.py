@@ -0,0 +1,56 @@
+"""
+Bulk intake of games at the store.
+
+On intake days staff receive hundreds of boxes. Instead of saving each game
+(one SELECT and one UPDATE per box), the scanned ids are marked received or
+printed with a single UPDATE. Games that were already received keep their
+original received date.
+"""
+import re
+
+from django.utils import timezone
+
+from .models import Game
+
+INTAKE_ACTIONS = ['received', 'printed']
+
+
+def parse_game_ids(text):
+    """Return the game ids found in free text (one per line, or separated by commas or spaces)"""
+    ids = []
+    seen = set()
+    for token in re.split(r'[\s,;]+', text.strip()):
+        token = token.lstrip('#')
+        if not token.isdigit():
+            continue
+        game_id = int(token)
+        if game_id not in seen:
+            seen.add(game_id)
+            ids.append(game_id)
+    return ids
+
+
+def mark_games(game_ids, action):
+    """
+    Mark games as received or printed in one UPDATE.
+
+    Returns a dict with the number of games updated, the number already in
+    that state and the ids that do not exist.
+    """
+    if action not in INTAKE_ACTIONS:
+        raise ValueError(f'Unknown intake action: {action}')
+
+    game_ids = list(game_ids)
+    now = timezone.now()
+    games = Game.objects.filter(id__in=game_ids)
+    if action == 'received':
+        updated = games.filter(received=False).update(received=True, received_date=now, updated_at=now)
+    else:
+        updated = games.filter(printed=False).update(printed=True, updated_at=now)
+
+    existing = set(games.values_list('id', flat=True))
+    return {
+        'updated': updated,
+        'unchanged': len(existing) - updated,
+        'missing': [game_id for game_id in game_ids if game_id not in existing],
+    }
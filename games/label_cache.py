@@ -0,0 +1,131 @@
+"""
+Content-addressed cache of compiled label PDFs.
+
+Each label PDF is stored under ``settings.LABEL_CACHE_ROOT`` keyed by the
+SHA-256 of the complete LaTeX document of the label (template preamble and
+rendered body) and LABEL_CACHE_VERSION. A game whose label-relevant fields did
+not change since it was last printed therefore hits the cache and is reused as
+is, while any change to the game or to ``tex_template.txt`` produces a new key.
+
+Cache hits refresh the modification time of the file so that pruning evicts
+the least recently used labels first.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+
+from . import labels
+
+# Bump when the rendering code changes in a way the document source does not reflect
+LABEL_CACHE_VERSION = '1'
+
+
+def label_key(preamble, body):
+    """Return the cache key of a rendered label"""
+    document = labels.render_document(preamble, [body])
+    return hashlib.sha256(f'{LABEL_CACHE_VERSION}\n{document}'.encode('utf-8')).hexdigest()
+
+
+def cache_path(key):
+    """Return the location of a cache entry"""
+    return os.path.join(settings.LABEL_CACHE_ROOT, key[:2], f'{key}.pdf')
+
+
+def lookup(key):
+    """Return the path of a cached label PDF, or None on a cache miss"""
+    path = cache_path(key)
+    try:
+        # Mark the entry as recently used
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def store(key, pdf_path):
+    """Move a freshly compiled label PDF into the cache and return its cache path"""
+    path = cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write next to the final location then rename, readers never see partial files
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    shutil.move(pdf_path, temp_path)
+    os.replace(temp_path, path)
+    return path
+
+
+def get_label_pdf(game):
+    """Return the path of the label PDF of a game, compiling it on a cache miss"""
+    preamble, body = labels.split_template(labels.load_template())
+    game_body = labels.render_label_body(game, body)
+    key = label_key(preamble, game_body)
+    path = lookup(key)
+    if path is not None:
+        return path
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        pdf_filepath = os.path.join(temp_dir, 'label.pdf')
+        if not labels.compile_labels(preamble, [game_body], [pdf_filepath])[0]:
+            return None
+        return store(key, pdf_filepath)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def cache_entries():
+    """Return (path, size, mtime) of every cache entry"""
+    entries = []
+    for root, dirs, files in os.walk(settings.LABEL_CACHE_ROOT):
+        for file in files:
+            path = os.path.join(root, file)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+    return entries
+
+
+def prune(max_size=None, max_age=None):
+    """
+    Evict cache entries, least recently used first.
+
+    Entries unused for more than max_age seconds are removed, then the oldest
+    entries are removed until the cache is below max_size bytes. Defaults come
+    from settings.LABEL_CACHE_MAX_SIZE and settings.LABEL_CACHE_MAX_AGE.
+    Returns a tuple (removed_files, freed_bytes).
+    """
+    if max_size is None:
+        max_size = settings.LABEL_CACHE_MAX_SIZE
+    if max_age is None:
+        max_age = settings.LABEL_CACHE_MAX_AGE
+
+    entries = sorted(cache_entries(), key=lambda entry: entry[2])
+    total_size = sum(size for path, size, mtime in entries)
+    now = time.time()
+
+    removed = 0
+    freed = 0
+    for path, size, mtime in entries:
+        if path.endswith('.tmp'):
+            # Leftover of an interrupted store, recent ones are still being written
+            if now - mtime <= 3600:
+                continue
+            is_stale = True
+        else:
+            is_stale = bool(max_age) and now - mtime > max_age
+        if not is_stale and (max_size is None or total_size <= max_size):
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        removed += 1
+        freed += size
+        total_size -= size
+    return removed, freed
@@ -0,0 +1,185 @@
+"""
+Native label renderer writing PDF directly, without pdflatex.
+
+Labels are drawn with the standard Helvetica fonts every PDF reader provides,
+so nothing is embedded and a label page is a few hundred bytes of drawing
+operators. The layout follows ``tex_template.txt``: a 2x3in page with the
+PAXU25 code boxed in the top right corner, the game name, the seller's rating,
+the component assessment and the price at the bottom. Rendering happens in
+the calling process, thousands of labels per second, so it can be used inline
+(for instance at intake) where spawning pdflatex would be too slow.
+"""
+import io
+import zlib
+
+from .labels import label_values
+
+PAGE_WIDTH = 144  # 2in
+PAGE_HEIGHT = 216  # 3in
+MARGIN = 7.2  # 0.1in
+TEXT_WIDTH = PAGE_WIDTH - 2 * MARGIN
+
+TINY = 5
+FOOTNOTE = 8
+LARGE = 12
+
+# Advance widths (1/1000 em) of the printable ASCII characters, from the
+# Adobe font metrics of the standard fonts
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+# Resource names of the fonts in the page content
+FONTS = {
+    'F1': ('Helvetica', HELVETICA_WIDTHS),
+    'F2': ('Helvetica-Bold', HELVETICA_BOLD_WIDTHS),
+}
+# Width of the characters outside printable ASCII, a reasonable average
+DEFAULT_WIDTH = 556
+
+
+def text_width(text, font, size):
+    widths = FONTS[font][1]
+    total = 0
+    for char in text:
+        code = ord(char)
+        total += widths[code - 32] if 32 <= code < 127 else DEFAULT_WIDTH
+    return total * size / 1000
+
+
+def wrap(text, font, size, width=TEXT_WIDTH):
+    """Split text into lines fitting width, breaking between words"""
+    lines = []
+    line = ''
+    for word in text.split():
+        candidate = f'{line} {word}' if line else word
+        if line and text_width(candidate, font, size) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines
+
+
+def pdf_string(text):
+    """Encode text as a PDF literal string in WinAnsiEncoding"""
+    data = text.encode('cp1252', errors='replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+class LabelCanvas:
+    """Drawing operators of one label page, laid out from the top down"""
+
+    def __init__(self):
+        self.operators = []
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def text(self, text, font, size, x=MARGIN):
+        self.operators.append(b'BT /%s %g Tf %.2f %.2f Td %s Tj ET' % (font.encode(), size, x, self.y, pdf_string(text)))
+
+    def paragraph(self, text, font, size, underline=False, space_after=0):
+        """Draw wrapped lines starting below the current position"""
+        for line in wrap(text, font, size):
+            self.y -= size * 1.15
+            self.text(line, font, size)
+            if underline:
+                width = text_width(line, font, size)
+                self.operators.append(b'%.2f %.2f m %.2f %.2f l S' % (MARGIN, self.y - 1, MARGIN + width, self.y - 1))
+        self.y -= space_after
+
+    def content(self):
+        return b'\n'.join([b'0.4 w'] + self.operators)
+
+
+def draw_label(game):
+    """Return the content stream of the label of a game"""
+    values = label_values(game)
+    canvas = LabelCanvas()
+
+    # Code of the scan station, boxed in the top right corner
+    code = f"PAXU25:{values['game.id']}"
+    code_width = text_width(code, 'F2', LARGE)
+    box_x = PAGE_WIDTH - MARGIN - code_width - 4
+    canvas.y -= LARGE + 2
+    canvas.text(code, 'F2', LARGE, x=box_x + 2)
+    canvas.operators.append(b'%.2f %.2f %.2f %.2f re S' % (box_x, canvas.y - 3, code_width + 4, LARGE + 4))
+    canvas.y -= 6
+
+    canvas.paragraph(values['game.name'], 'F1', TINY, space_after=4)
+    canvas.paragraph("SELLER'S RATING", 'F2', FOOTNOTE, underline=True, space_after=3)
+    canvas.paragraph(values['game.condition'], 'F2', FOOTNOTE, space_after=4)
+    canvas.paragraph('COMPONENT ASSESSMENT', 'F2', FOOTNOTE, underline=True, space_after=2)
+    for key in ('missingcomponents', 'smokinghousehold', 'animalcondition', 'mustysmell'):
+        canvas.paragraph(values[key], 'F1', FOOTNOTE, space_after=2)
+
+    # Price at the bottom of the label, shrunk if it does not fit the width
+    price = f"SELLER'S PRICE: ${values['game.price']}"
+    size = min(LARGE, LARGE * TEXT_WIDTH / text_width(price, 'F2', LARGE))
+    canvas.y = MARGIN
+    canvas.text(price, 'F2', size)
+    return canvas.content()
+
+
+def write_pdf(contents, f):
+    """Write a PDF with one label page per content stream to a binary file"""
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # page tree, filled in once the page numbers are known
+    ]
+    font_refs = []
+    for name, (base_font, widths) in FONTS.items():
+        objects.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>' % base_font.encode())
+        font_refs.append(b'/%s %d 0 R' % (name.encode(), len(objects)))
+    resources = b'<< /Font << ' + b' '.join(font_refs) + b' >> >>'
+
+    page_refs = []
+    for content in contents:
+        stream = zlib.compress(content)
+        objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources %s /Contents %d 0 R >>'
+            % (PAGE_WIDTH, PAGE_HEIGHT, resources, len(objects))
+        )
+        page_refs.append(b'%d 0 R' % len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(page_refs), len(page_refs))
+
+    # Byte offsets are counted from the start of the PDF, f may already hold data
+    start = f.tell()
+    f.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(f.tell() - start)
+        f.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+    xref = f.tell() - start
+    f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for offset in offsets:
+        f.write(b'%010d 00000 n \n' % offset)
+    f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+
+
+def render_labels(games, output_path):
+    """Render the labels of games into one PDF, one page per game"""
+    contents = [draw_label(game) for game in games]
+    with open(output_path, 'wb') as f:
+        write_pdf(contents, f)
+
+
+def render_label(game):
+    """Return the PDF of the label of a single game as bytes"""
+    buffer = io.BytesIO()
+    write_pdf([draw_label(game)], buffer)
+    return buffer.getvalue()
@@ -0,0 +1,329 @@
+"""
+Label rendering engine for the admin label export.
+
+Labels are rendered from ``tex_template.txt``. Instead of spawning one
+pdflatex process per game, the bodies of all selected labels are placed in a
+single multi-page document sharing the template preamble and compiled in one
+TeX run. A single label can still be compiled on its own when needed.
+
+The template preamble is dumped once into a precompiled pdflatex format so
+that each compile skips loading the document class and packages.
+"""
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+
+PDFLATEX_PATH = '/usr/bin/pdflatex'
+PDFTK_PATH = '/usr/bin/pdftk'
+
+# Names of the formats that failed to build in this process, not retried
+_failed_formats = set()
+
+TEMPLATE_PATH = os.path.join(settings.BASE_DIR, 'games', 'templates', 'export_templates', 'tex_template.txt')
+
+BEGIN_DOCUMENT = '\\begin{document}'
+END_DOCUMENT = '\\end{document}'
+
+# Placeholders used in tex_template.txt, substituted in a single pass so that
+# user supplied text can never be picked up as another placeholder
+PLACEHOLDER_RE = re.compile(r'game\.id|game\.name|game\.condition|game\.price|missingcomponents|smokinghousehold|animalcondition|mustysmell')
+
+TEX_SPECIAL_CHARS = {
+    '\\': r'\textbackslash{}',
+    '&': r'\&',
+    '%': r'\%',
+    '$': r'\$',
+    '#': r'\#',
+    '_': r'\_',
+    '{': r'\{',
+    '}': r'\}',
+    '~': r'\textasciitilde{}',
+    '^': r'\textasciicircum{}',
+}
+TEX_SPECIAL_RE = re.compile('|'.join(re.escape(c) for c in TEX_SPECIAL_CHARS))
+
+
+def tex_escape(text):
+    """Escape characters that have a special meaning in LaTeX"""
+    return TEX_SPECIAL_RE.sub(lambda m: TEX_SPECIAL_CHARS[m.group()], str(text))
+
+
+def load_template():
+    """Return the raw content of the label template"""
+    with open(TEMPLATE_PATH, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def split_template(template_content):
+    """Split the template into its preamble and the body of the document"""
+    preamble, _, rest = template_content.partition(BEGIN_DOCUMENT)
+    body, _, _ = rest.partition(END_DOCUMENT)
+    return preamble, body
+
+
+# Fields of Game printed on the label, a change to any of them needs a new label
+LABEL_FIELDS = ['name', 'condition', 'price', 'missing_pieces', 'description_of_missing_pieces', 'smoking_house', 'pet', 'musty_smell']
+
+
+def label_values(game):
+    """Return the placeholder values of the label for a game"""
+    if game.missing_pieces:
+        missing_components = f"Missing Components: {game.description_of_missing_pieces or 'Yes'}"
+    else:
+        missing_components = "All Components Present"
+
+    if game.smoking_house:
+        smoking_household = "Smoking Household: Yes"
+    else:
+        smoking_household = "Smoking Household: No"
+
+    if game.pet != 'none':
+        animal_condition = f"Animal Exposure: {game.get_pet_display()}"
+    else:
+        animal_condition = "Animal Exposure: None"
+
+    if game.musty_smell:
+        musty_smell = "Musty Smell: Yes"
+    else:
+        musty_smell = "Musty Smell: No"
+
+    return {
+        'game.id': str(game.id),
+        'game.name': game.name,
+        'game.condition': game.get_condition_display(),
+        'game.price': str(game.price),
+        'missingcomponents': missing_components,
+        'smokinghousehold': smoking_household,
+        'animalcondition': animal_condition,
+        'mustysmell': musty_smell,
+    }
+
+
+def render_label_body(game, body):
+    """Fill the template body with the values of a game"""
+    values = {key: tex_escape(value) for key, value in label_values(game).items()}
+    return PLACEHOLDER_RE.sub(lambda m: values[m.group()], body)
+
+
+def render_document(preamble, bodies):
+    """Build a document with one page per label body"""
+    # Each label is wrapped in a group so font size switches do not leak
+    # into the next page
+    pages = '\n\\clearpage\n'.join(f'\\begingroup\n{body}\n\\par\\endgroup' for body in bodies)
+    return f'{preamble}{BEGIN_DOCUMENT}\n{pages}\n{END_DOCUMENT}\n'
+
+
+def label_filename(game):
+    """Return the base filename (without extension) used for a game label"""
+    safe_name = "".join(c for c in game.name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    safe_name = safe_name.replace(' ', '_')
+    return f"game_{game.id}_{safe_name}"
+
+
+def compile_tex(tex_source, work_dir, jobname, format_path=None):
+    """
+    Compile a LaTeX source with pdflatex, return the PDF path or None on failure.
+
+    When format_path is given, the source must not contain a preamble: it is
+    compiled on top of that precompiled format.
+    """
+    tex_filepath = os.path.join(work_dir, f'{jobname}.tex')
+    with open(tex_filepath, 'w', encoding='utf-8') as f:
+        f.write(tex_source)
+
+    cmd = [PDFLATEX_PATH, '-interaction=nonstopmode', '-halt-on-error']
+    env = None
+    if format_path is not None:
+        format_dir, format_file = os.path.split(format_path)
+        cmd.append('-fmt=' + os.path.splitext(format_file)[0])
+        # Look up the format in its directory first, then in the TeX defaults
+        env = dict(os.environ, TEXFORMATS=format_dir + os.pathsep)
+    cmd += ['-jobname=' + jobname, '-output-directory=' + work_dir, tex_filepath]
+
+    result = subprocess.call(cmd, cwd=work_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    pdf_filepath = os.path.join(work_dir, f'{jobname}.pdf')
+    if result == 0 and os.path.exists(pdf_filepath):
+        return pdf_filepath
+    return None
+
+
+def label_format(preamble):
+    """
+    Return the path of a precompiled pdflatex format holding the template preamble.
+
+    Loading the document class and packages of the template dominates the
+    compile time of a label, so the preamble is dumped once into a format file
+    named after a hash of the preamble and of the pdflatex binary. Editing the
+    template or upgrading TeX therefore rebuilds the format automatically.
+    Returns None if the format cannot be built, labels are then compiled with
+    the full preamble.
+    """
+    try:
+        pdflatex_mtime = os.stat(PDFLATEX_PATH).st_mtime
+    except OSError:
+        return None
+    digest = hashlib.sha256(f'{pdflatex_mtime}\n{preamble}'.encode('utf-8')).hexdigest()[:16]
+    format_name = f'label_{digest}'
+    format_path = os.path.join(settings.LABEL_FORMAT_ROOT, f'{format_name}.fmt')
+    if os.path.exists(format_path):
+        return format_path
+    if format_name in _failed_formats:
+        return None
+
+    os.makedirs(settings.LABEL_FORMAT_ROOT, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(dir=settings.LABEL_FORMAT_ROOT)
+    try:
+        with open(os.path.join(temp_dir, 'preamble.tex'), 'w', encoding='utf-8') as f:
+            f.write(preamble + '\n\\dump\n')
+        result = subprocess.call([
+            PDFLATEX_PATH,
+            '-ini',
+            '-interaction=nonstopmode',
+            '-halt-on-error',
+            '-jobname=' + format_name,
+            '&pdflatex',
+            'preamble.tex'
+        ], cwd=temp_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        built_path = os.path.join(temp_dir, f'{format_name}.fmt')
+        if result != 0 or not os.path.exists(built_path):
+            _failed_formats.add(format_name)
+            return None
+        # Concurrent builders may race here, the rename keeps the file whole
+        os.replace(built_path, format_path)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    # Formats of previous template versions are not needed anymore
+    for file in os.listdir(settings.LABEL_FORMAT_ROOT):
+        if file.startswith('label_') and file.endswith('.fmt') and file != f'{format_name}.fmt':
+            try:
+                os.remove(os.path.join(settings.LABEL_FORMAT_ROOT, file))
+            except OSError:
+                pass
+    return format_path
+
+
+def split_pdf(pdf_path, output_paths):
+    """Split a PDF into one file per page with pdftk, or pypdf when pdftk is not installed, return False if the page count does not match"""
+    if not os.path.exists(PDFTK_PATH):
+        return _split_pdf_pypdf(pdf_path, output_paths)
+    burst_dir = tempfile.mkdtemp(dir=os.path.dirname(pdf_path))
+    try:
+        result = subprocess.call([
+            PDFTK_PATH, pdf_path, 'burst', 'output', os.path.join(burst_dir, 'page_%06d.pdf')
+        ], cwd=burst_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        # E.g. not executable
+        return _split_pdf_pypdf(pdf_path, output_paths)
+    pages = sorted(f for f in os.listdir(burst_dir) if f.endswith('.pdf'))
+    if result != 0 or len(pages) != len(output_paths):
+        return False
+    for page, output_path in zip(pages, output_paths):
+        shutil.move(os.path.join(burst_dir, page), output_path)
+    return True
+
+
+def _split_pdf_pypdf(pdf_path, output_paths):
+    """Pure Python fallback of split_pdf"""
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        return False
+
+    try:
+        reader = PdfReader(pdf_path)
+        if len(reader.pages) != len(output_paths):
+            return False
+        for page, output_path in zip(reader.pages, output_paths):
+            writer = PdfWriter()
+            writer.add_page(page)
+            with open(output_path, 'wb') as f:
+                writer.write(f)
+    except Exception:
+        return False
+    return True
+
+
+def compile_labels(preamble, bodies, output_paths):
+    """
+    Compile rendered label bodies to one PDF per label in a single TeX run.
+
+    All labels are compiled as one multi-page document which is then split
+    into the files listed in output_paths. If the batch does not compile, or a
+    label spilled over more than one page, every label is compiled on its own
+    so the offending ones can be told apart. Returns a list of booleans telling
+    which labels were generated. This function does not touch the database so
+    it can run in a worker process.
+    """
+    if not bodies:
+        return []
+
+    format_path = label_format(preamble)
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        if format_path is not None:
+            # The preamble is already loaded by the format
+            pdf_filepath = compile_tex(render_document('', bodies), temp_dir, 'labels', format_path)
+            if pdf_filepath is None:
+                # The format may be unusable (e.g. dumped by another TeX
+                # version), do not rely on it for the rest of this batch
+                format_path = None
+        if format_path is None:
+            pdf_filepath = compile_tex(render_document(preamble, bodies), temp_dir, 'labels')
+        if pdf_filepath is not None:
+            if len(bodies) == 1:
+                shutil.move(pdf_filepath, output_paths[0])
+                return [True]
+            if split_pdf(pdf_filepath, output_paths):
+                return [True] * len(bodies)
+
+        # Fall back to compiling the labels one by one
+        results = []
+        for index, (body, output_path) in enumerate(zip(bodies, output_paths)):
+            pdf_filepath = compile_tex(render_document(preamble, [body]), temp_dir, f'label_{index}')
+            if pdf_filepath is not None:
+                shutil.move(pdf_filepath, output_path)
+            results.append(pdf_filepath is not None)
+        return results
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def merge_pdfs(input_paths, output_path):
+    """Concatenate PDFs with pdftk, or pypdf when pdftk is not installed, return True on success"""
+    if not os.path.exists(PDFTK_PATH):
+        return _merge_pdfs_pypdf(input_paths, output_path)
+    # pdftk input1.pdf input2.pdf ... cat output merged.pdf
+    cmd = [PDFTK_PATH] + list(input_paths) + ['cat', 'output', output_path]
+    result = subprocess.call(cmd)
+    return result == 0 and os.path.exists(output_path)
+
+
+def _merge_pdfs_pypdf(input_paths, output_path):
+    """Pure Python fallback of merge_pdfs"""
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        return False
+
+    writer = PdfWriter()
+    try:
+        for input_path in input_paths:
+            writer.append(input_path)
+        with open(output_path, 'wb') as f:
+            writer.write(f)
+    except Exception:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return False
+    finally:
+        writer.close()
+    return True
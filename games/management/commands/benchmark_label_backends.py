@@ -0,0 +1,85 @@
+import os
+import random
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from games import label_pdf, labels
+from games.export_jobs import MAX_CHUNK_SIZE
+from games.models import Game
+
+
+class Command(BaseCommand):
+    help = 'Compare the label rendering speed of the native and pdflatex backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Number of labels rendered by each backend')
+        parser.add_argument('--from-db', action='store_true', help='Render existing games instead of generated ones')
+        parser.add_argument('--skip-latex', action='store_true', help='Only time the native backend')
+
+    def sample_games(self, count):
+        """Unsaved games covering every label variant, nothing is written to the database"""
+        conditions = [value for value, label in Game.CONDITION_CHOICES]
+        pets = [value for value, label in Game.PET_CHOICES]
+        return [
+            Game(
+                id=index + 1,
+                name=f'Benchmark Game {index + 1}: The Expansion (Deluxe Edition)',
+                condition=conditions[index % len(conditions)],
+                price=Decimal(random.randint(100, 15000)).scaleb(-2),
+                missing_pieces=index % 3 == 0,
+                description_of_missing_pieces='One wooden meeple and two cards' if index % 3 == 0 else '',
+                smoking_house=index % 5 == 0,
+                pet=pets[index % len(pets)],
+                musty_smell=index % 7 == 0,
+            )
+            for index in range(count)
+        ]
+
+    def report(self, name, count, elapsed):
+        rate = count / elapsed if elapsed else float('inf')
+        self.stdout.write(f'{name}: {count} labels in {elapsed:.2f}s ({rate:.0f} labels/s, {elapsed * 1000 / count:.2f} ms/label)')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        if options['from_db']:
+            games = list(Game.objects.order_by('-created_at')[:count])
+            if not games:
+                self.stdout.write(self.style.ERROR('No games found. Run seed_games first or drop --from-db.'))
+                return
+            count = len(games)
+        else:
+            games = self.sample_games(count)
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            start = time.perf_counter()
+            label_pdf.render_labels(games, os.path.join(temp_dir, 'native.pdf'))
+            native = time.perf_counter() - start
+            self.report('native', count, native)
+
+            if options['skip_latex']:
+                return
+            if not os.path.exists(labels.PDFLATEX_PATH):
+                self.stdout.write(self.style.WARNING(f'pdflatex not found at {labels.PDFLATEX_PATH}, LaTeX backend skipped'))
+                return
+
+            # Same chunking as the export worker, in a single process
+            preamble, body = labels.split_template(labels.load_template())
+            start = time.perf_counter()
+            labels.label_format(preamble)
+            ok = 0
+            for first in range(0, count, MAX_CHUNK_SIZE):
+                chunk = games[first:first + MAX_CHUNK_SIZE]
+                bodies = [labels.render_label_body(game, body) for game in chunk]
+                paths = [os.path.join(temp_dir, f'latex_{first + index}.pdf') for index in range(len(chunk))]
+                ok += sum(labels.compile_labels(preamble, bodies, paths))
+            latex = time.perf_counter() - start
+            self.report('latex', count, latex)
+            if ok != count:
+                self.stdout.write(self.style.WARNING(f'{count - ok} labels failed to compile with pdflatex'))
+            self.stdout.write(self.style.SUCCESS(f'native backend is {latex / native:.1f}x faster'))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
@@ -0,0 +1,282 @@
+"""
+Benchmark of the hot views and exports.
+
+The views run against a separate test database seeded by seed_load_data, so a
+given --seed and dataset size always measures the same data. Every scenario is
+requested through the test client: first the timed iterations, then one more
+pass under tracemalloc and a query counter for the peak memory and the query
+count, so neither slows down the timings. A view that fails is reported with
+its error and the other scenarios still run. Streamed responses are read to
+the end inside the timing.
+
+Results are written to JSON with the commit they were measured on, and
+--compare prints the change of the median latency against an earlier file.
+"""
+from datetime import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from games.export_jobs import claim_job, enqueue_label_export, run_job
+from games.models import ExportJob, Game
+from honeypot_monitor.recorder import recorder
+
+PERCENTILES = [50, 90, 95, 99]
+# Games in each sheet merged by the merge scenario
+MERGE_JOB_SIZE = 25
+
+
+def git_commit():
+    """Return the current commit hash, or None outside a git checkout"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(timings):
+    """Return the latency statistics in milliseconds of a list of durations in seconds"""
+    timings = sorted(timing * 1000 for timing in timings)
+    summary = {
+        'iterations': len(timings),
+        'min_ms': round(timings[0], 2),
+        'mean_ms': round(statistics.fmean(timings), 2),
+        'max_ms': round(timings[-1], 2),
+    }
+    cuts = statistics.quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+    for percentile in PERCENTILES:
+        summary[f'p{percentile}_ms'] = round(cuts[percentile - 1], 2)
+    return summary
+
+
+class QueryCounter:
+    """Database execute wrapper counting queries, unlike the debug query log it has no upper limit"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def consume(response):
+    """Read a response to the end, like a browser downloading it, and release it"""
+    if response.streaming:
+        for chunk in response.streaming_content:
+            pass
+    # Runs the cleanups of file downloads
+    response.close()
+    return response
+
+
+class Command(BaseCommand):
+    help = 'Measure latency, queries and memory of the hot views on a seeded test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Number of sellers in the dataset')
+        parser.add_argument('--games', type=int, default=5000, help='Number of games in the dataset')
+        parser.add_argument('--honeypot-attempts', type=int, default=20000, help='Number of honeypot attempts in the dataset')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the dataset')
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per scenario before timing')
+        parser.add_argument('--only', nargs='+', metavar='SCENARIO', help='Run only these scenarios')
+        parser.add_argument('--output', help='JSON file of the results (default: benchmarks/views-<commit>.json, ignored by git)')
+        parser.add_argument('--compare', metavar='JSON', help='Earlier results to compare the median latencies with')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database and its dataset for the next run')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['games'] < 1:
+            raise CommandError('The dataset needs at least one user and one game.')
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f'Cannot read {options["compare"]}: {e}')
+
+        commit = git_commit()
+        output = options['output'] or os.path.join(settings.BASE_DIR, 'benchmarks', f'views-{(commit or datetime.now().strftime("%Y%m%d_%H%M%S"))[:12]}.json')
+
+        # Exports and label caches written during the benchmark are thrown away
+        exports_root = tempfile.mkdtemp(prefix='benchmark_exports_')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            with override_settings(
+                EXPORTS_ROOT=exports_root,
+                LABEL_CACHE_ROOT=os.path.join(exports_root, 'label_cache'),
+                LABEL_FORMAT_ROOT=os.path.join(exports_root, 'label_formats'),
+            ):
+                dataset = self.seed(options)
+                results = self.run_scenarios(options)
+        finally:
+            recorder.flush()
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+            shutil.rmtree(exports_root, ignore_errors=True)
+
+        report = {
+            'commit': commit,
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'dataset': dataset,
+            'results': results,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        self.print_results(results, baseline)
+        self.stdout.write(self.style.SUCCESS(f'Results written to {output}'))
+
+    def seed(self, options):
+        """Fill the test database with the requested dataset, unless a kept database already holds it"""
+        dataset = {key: options[key] for key in ('users', 'games', 'honeypot_attempts', 'seed')}
+        if Game.objects.count() < options['games']:
+            call_command(
+                'seed_load_data', users=options['users'], games=options['games'],
+                honeypot_attempts=options['honeypot_attempts'], seed=options['seed'], stdout=self.stdout,
+            )
+        self.admin, created = User.objects.get_or_create(username='benchmark_admin', defaults={'email': 'benchmark_admin@example.com', 'is_staff': True, 'is_superuser': True})
+        # The seller with the most games, the worst case of the seller pages
+        self.seller = User.objects.annotate(game_count=Count('games')).order_by('-game_count', 'id').first()
+        self.game = Game.objects.order_by('id')[Game.objects.count() // 2]
+        return dataset
+
+    def scenarios(self):
+        """Return the benchmarked requests, each a dict with the request and the user sending it"""
+        admin_games = reverse('games:admin_only_games')
+        honeypot = reverse('honeypot_admin')
+        return [
+            {'name': 'game_list', 'user': self.seller, 'path': reverse('games:game_list')},
+            {'name': 'game_list_staff', 'user': self.admin, 'path': reverse('games:game_list')},
+            {'name': 'my_games', 'user': self.seller, 'path': reverse('games:my_games')},
+            {'name': 'game_detail', 'user': self.seller, 'path': reverse('games:game_detail', args=[self.game.pk])},
+            {'name': 'admin_only_games', 'user': self.admin, 'path': admin_games},
+            {'name': 'admin_only_games_filtered', 'user': self.admin, 'path': admin_games, 'data': {'condition': 'good', 'printed': 'false', 'drop_off_location': 'Norton'}},
+            {'name': 'admin_only_games_csv', 'user': self.admin, 'path': admin_games, 'data': {'export': 'csv'}},
+            {'name': 'admin_only_games_csv_gzip', 'user': self.admin, 'path': admin_games, 'data': {'export': 'csv', 'gzip': 'true'}},
+            # Queues the export, compiling is measured by benchmark_label_backends
+            {'name': 'admin_only_games_latex', 'user': self.admin, 'path': admin_games, 'data': {'export': 'latex', 'printed': 'false', 'condition': 'new in shrink'},
+             'teardown': self.delete_pending_exports},
+            {'name': 'admin_only_games_merge', 'user': self.admin, 'path': admin_games, 'data': {'export': 'merge'},
+             'setup': self.create_finished_exports},
+            {'name': 'admin_users_dashboard', 'user': self.admin, 'path': reverse('admin_users_dashboard')},
+            {'name': 'honeypot_admin', 'user': None, 'path': honeypot},
+            {'name': 'honeypot_admin_login', 'user': None, 'path': honeypot, 'method': 'post', 'data': {'username': 'admin', 'password': 'admin'}},
+        ]
+
+    def delete_pending_exports(self):
+        ExportJob.objects.filter(created_by=self.admin, status='pending').delete()
+
+    def create_finished_exports(self):
+        """Render two small native sheets for the merge scenario to combine"""
+        # The previous merge deleted their sheets
+        ExportJob.objects.filter(created_by=self.admin).delete()
+        game_ids = list(Game.objects.order_by('id').values_list('id', flat=True)[:2 * MERGE_JOB_SIZE])
+        for start in (0, MERGE_JOB_SIZE):
+            job = enqueue_label_export(Game.objects.filter(id__in=game_ids[start:start + MERGE_JOB_SIZE]), self.admin, label_backend='native')
+            run_job(claim_job(job.pk), workers=1)
+
+    def request(self, client, scenario, iteration):
+        method = getattr(client, scenario.get('method', 'get'))
+        # A new address per request, the honeypot middleware blocks repeat offenders
+        address = f'10.{iteration // 65536 % 256}.{iteration // 256 % 256}.{iteration % 256}'
+        return consume(method(scenario['path'], scenario.get('data'), REMOTE_ADDR=address))
+
+    def measure(self, scenario, warmup, iterations):
+        client = Client()
+        if scenario['user'] is not None:
+            client.force_login(scenario['user'])
+        setup, teardown = scenario.get('setup'), scenario.get('teardown')
+
+        def run(iteration):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            response = self.request(client, scenario, iteration)
+            elapsed = time.perf_counter() - start
+            if teardown:
+                teardown()
+            return response, elapsed
+
+        for iteration in range(warmup):
+            run(iteration)
+        timings = []
+        for iteration in range(warmup, warmup + iterations):
+            response, elapsed = run(iteration)
+            timings.append(elapsed)
+
+        # Separate pass, tracing allocations and queries slows the request down
+        if setup:
+            setup()
+        queries = QueryCounter()
+        tracemalloc.start()
+        try:
+            with connection.execute_wrapper(queries):
+                response = self.request(client, scenario, warmup + iterations)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        if teardown:
+            teardown()
+
+        return {
+            'status': response.status_code,
+            **summarize(timings),
+            'queries': queries.count,
+            'peak_memory_kb': round(peak / 1024),
+        }
+
+    def run_scenarios(self, options):
+        scenarios = self.scenarios()
+        if options['only']:
+            unknown = set(options['only']) - {scenario['name'] for scenario in scenarios}
+            if unknown:
+                raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+            scenarios = [scenario for scenario in scenarios if scenario['name'] in options['only']]
+
+        results = {}
+        for scenario in scenarios:
+            self.stdout.write(f'Running {scenario["name"]}...')
+            try:
+                results[scenario['name']] = self.measure(scenario, max(0, options['warmup']), max(1, options['iterations']))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'{scenario["name"]} failed: {e!r}'))
+                results[scenario['name']] = {'error': repr(e)}
+        return results
+
+    def print_results(self, results, baseline=None):
+        self.stdout.write(f'{"scenario":<28}{"status":>7}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queries":>9}{"peak KB":>10}')
+        for name, result in results.items():
+            if 'error' in result:
+                self.stdout.write(f'{name:<28}  {result["error"]}')
+                continue
+            line = (f'{name:<28}{result["status"]:>7}{result["p50_ms"]:>10.1f}{result["p95_ms"]:>10.1f}'
+                    f'{result["p99_ms"]:>10.1f}{result["queries"]:>9}{result["peak_memory_kb"]:>10}')
+            previous = (baseline or {}).get(name)
+            if previous and 'error' not in previous and previous['p50_ms']:
+                change = (result['p50_ms'] - previous['p50_ms']) / previous['p50_ms'] * 100
+                line += f'  p50 {change:+.0f}%, queries {result["queries"] - previous["queries"]:+d}'
+            self.stdout.write(line)
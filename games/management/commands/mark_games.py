@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from games.intake import INTAKE_ACTIONS, mark_games, parse_game_ids
+
+
+class Command(BaseCommand):
+    help = 'Mark games as received or printed in bulk, from ids given as arguments, in a file or on stdin'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=INTAKE_ACTIONS, help='State to set on the games')
+        parser.add_argument('game_ids', nargs='*', help='Game ids, read from --file or stdin when omitted')
+        parser.add_argument('--file', help='File with game ids, one per line or separated by commas')
+
+    def handle(self, *args, **options):
+        if options['game_ids']:
+            text = ' '.join(options['game_ids'])
+        elif options['file']:
+            with open(options['file']) as f:
+                text = f.read()
+        else:
+            text = sys.stdin.read()
+
+        game_ids = parse_game_ids(text)
+        if not game_ids:
+            raise CommandError('No game ids given')
+
+        action = options['action']
+        result = mark_games(game_ids, action)
+        self.stdout.write(self.style.SUCCESS(f'{result["updated"]} games marked as {action}, {result["unchanged"]} were already {action}'))
+        if result['missing']:
+            self.stdout.write(self.style.WARNING(f'Unknown game ids: {", ".join(str(game_id) for game_id in result["missing"])}'))
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from games import label_cache
+
+
+class Command(BaseCommand):
+    help = 'Evict least recently used label PDFs from the label cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-size', type=int, default=settings.LABEL_CACHE_MAX_SIZE // (1024 * 1024), help='Maximum size of the cache in MB')
+        parser.add_argument('--max-age', type=int, default=settings.LABEL_CACHE_MAX_AGE // (24 * 60 * 60), help='Remove labels unused for more than this many days')
+        parser.add_argument('--clear', action='store_true', help='Remove every cached label')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            max_size = 0
+        else:
+            max_size = options['max_size'] * 1024 * 1024
+        max_age = options['max_age'] * 24 * 60 * 60
+
+        removed, freed = label_cache.prune(max_size=max_size, max_age=max_age)
+
+        remaining = label_cache.cache_entries()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Removed {removed} cached labels ({freed / (1024 * 1024):.1f} MB freed), '
+                f'{len(remaining)} labels left ({sum(size for path, size, mtime in remaining) / (1024 * 1024):.1f} MB)'
+            )
+        )
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from games.export_jobs import claim_next_job, run_job, fail_job, prerender_due_labels, recover_stale_jobs
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Process label export jobs queued from the admin games dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Number of processes compiling labels in parallel')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait between checks when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Process the pending jobs then exit')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        self.stdout.write(f'Export worker started with {workers} worker process(es)')
+
+        while True:
+            # Jobs left running by a worker that was killed
+            recovered = recover_stale_jobs()
+            if recovered:
+                self.stdout.write(self.style.WARNING(f'Marked {recovered} abandoned export(s) as failed'))
+
+            job = claim_next_job()
+            if job is None:
+                # Compile the labels of recently added or edited games while no export waits
+                prerendered = prerender_due_labels(workers=workers)
+                if prerendered:
+                    self.stdout.write(f'Pre-rendered {prerendered} label(s)')
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Processing export #{job.pk} ({job.total} labels)')
+            try:
+                job = run_job(job, workers=workers)
+            except Exception as e:
+                fail_job(job, e)
+                self.stdout.write(self.style.ERROR(f'Export #{job.pk} failed: {str(e)}'))
+                continue
+
+            self.stdout.write(
+                self.style.SUCCESS(f'Export #{job.pk} {job.status}: {job.succeeded}/{job.total} labels generated')
+            )
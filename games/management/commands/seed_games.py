@@ -41,7 +41,7 @@ class Command(BaseCommand):
             ('very good', 'Very Good- Pieces punched, Sorted. Rarely or never played. No discernible wear'),
             ('good', 'Good- Played but well maintained. Pieces unsorted. Box/book(s) shows signs of use'),
             ('fair', 'Fair- Discernible wear. Box/book(s) shows minor damage and/or have been slightly marked'),
-            ('Poor', 'Poor- Worn but playable. Box/book(s) shows damage and/or have been significantly marked')
+            ('poor', 'Poor- Worn but playable. Box/book(s) shows damage and/or have been significantly marked')
         ]
         
         # Pet choices
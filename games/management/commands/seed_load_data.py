@@ -0,0 +1,260 @@
+"""
+Generate production scale data for load testing.
+
+Users (with their profile and verified email), games and honeypot attempts are
+inserted with bulk_create in batches. The output only depends on --seed: every
+batch draws from its own random generator, so the same data comes out whatever
+the number of processes.
+
+Sales are skewed like the real catalogue: the sellers follow a Zipf
+distribution, a few list hundreds of games and most list a handful. Honeypot
+attempts likewise come mostly from a few persistent IPs.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+import datetime
+import itertools
+import multiprocessing
+import random
+import time
+
+from allauth.account.models import EmailAddress
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+from faker import Faker
+
+from a_users.models import Profile
+from games.models import Game
+from games.stats import invalidate_seller_names, rebuild_game_stats
+from honeypot_monitor.models import HoneypotAttempt
+
+USERNAME_PREFIX = 'loadtest'
+
+# Zipf exponent of the games per seller and of the attempts per IP
+SELLER_SKEW = 1.1
+OFFENDER_SKEW = 1.3
+# Listings are spread over this many days before now
+LISTING_DAYS = 365
+
+GAME_NAMES = [
+    'Settlers of Catan', 'Ticket to Ride', 'Pandemic', 'Carcassonne', 'Dominion', '7 Wonders', 'Agricola',
+    'Puerto Rico', 'Power Grid', 'Race for the Galaxy', 'Stone Age', 'Lords of Waterdeep', 'Splendor',
+    'King of Tokyo', 'Love Letter', 'The Resistance', 'Codenames', 'Azul', 'Wingspan', 'Root', 'Gloomhaven',
+    'Spirit Island', 'Scythe', 'Terraforming Mars', 'Brass: Birmingham', 'Concordia', 'Everdell', 'Cascadia',
+    'Dixit', 'Small World', 'Betrayal at House on the Hill', 'Arkham Horror', 'Eldritch Horror', 'Twilight Struggle',
+    'Through the Ages', 'Le Havre', 'Great Western Trail', 'Viticulture', 'The Castles of Burgundy', 'Hanabi',
+]
+EDITIONS = ['', '', '', '', ' (2nd Edition)', ' Deluxe', ': Europe', ' - Big Box', ' Collector\'s Edition']
+MISSING_PIECES = [
+    'Missing 2 cards', 'Missing 1 die', 'Missing rulebook', 'Missing 3 pieces', 'Missing scoring pad',
+    'Missing player tokens', 'One meeple missing', 'Insert broken',
+]
+HONEYPOT_USERNAMES = ['admin', 'administrator', 'root', 'test', 'user', 'django', 'staff', 'guest']
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0',
+    'python-requests/2.31.0',
+    'curl/8.5.0',
+    'Go-http-client/1.1',
+    'Mozilla/5.0 zgrab/0.x',
+]
+
+
+def zipf_cum_weights(count, skew):
+    """Cumulative weights of a Zipf distribution over count ranks, for random.choices"""
+    return list(itertools.accumulate(1 / rank ** skew for rank in range(1, count + 1)))
+
+
+def batch_rng(seed, table, index):
+    """Random generator of one batch, so the data does not depend on how batches are shared out"""
+    return random.Random(f'{seed}:{table}:{index}')
+
+
+def batches(total, batch_size):
+    """Yield (index, size) of the batches making up total rows"""
+    for index, start in enumerate(range(0, total, batch_size)):
+        yield index, min(batch_size, total - start)
+
+
+def create_users(count, seed, now, batch_size):
+    """Create the load test users with their profile and verified email, return their ids by seller rank"""
+    fake = Faker()
+    fake.seed_instance(seed)
+    rng = batch_rng(seed, 'users', 0)
+    # Hashing is deliberately slow, every user shares the same password
+    password = make_password(USERNAME_PREFIX)
+    dropoff_locations = [value for value, label in Profile.DROPOFF_LOCATION_CHOICES]
+    payment_choices = [value for value, label in Profile.PAYMENT_CHOICE_CHOICES]
+
+    usernames = [f'{USERNAME_PREFIX}{number:07d}' for number in range(count)]
+    existing = set(User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('username', flat=True))
+    for start in range(0, count, batch_size):
+        new = [username for username in usernames[start:start + batch_size] if username not in existing]
+        users = [
+            User(
+                username=username,
+                email=f'{username}@example.com',
+                first_name=fake.first_name(),
+                last_name=fake.last_name(),
+                password=password,
+                date_joined=now - datetime.timedelta(days=rng.randint(0, LISTING_DAYS)),
+            )
+            for username in new
+        ]
+        if not users:
+            continue
+        with transaction.atomic():
+            # bulk_create skips the User signals that create the profile and email
+            User.objects.bulk_create(users)
+            user_ids = dict(User.objects.filter(username__in=new).values_list('username', 'id'))
+            Profile.objects.bulk_create([
+                Profile(
+                    user_id=user_ids[user.username],
+                    display_name=user.first_name,
+                    phone_number=fake.numerify('+1-###-###-####'),
+                    dropoff_location=rng.choice(dropoff_locations),
+                    payment_choice=rng.choice(payment_choices),
+                )
+                for user in users
+            ])
+            EmailAddress.objects.bulk_create([
+                EmailAddress(user_id=user_ids[user.username], email=user.email, primary=True, verified=True)
+                for user in users
+            ])
+
+    ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+    return [ids[username] for username in usernames]
+
+
+def _init_worker(ranked_ids, cum_weights):
+    # Sellers or IPs by rank and their cumulative weights, sent once per process
+    global _ranked_ids, _cum_weights
+    _ranked_ids, _cum_weights = ranked_ids, cum_weights
+
+
+def _create_games(seed, now, index, size):
+    """Insert one batch of games and return its size"""
+    rng = batch_rng(seed, 'games', index)
+    conditions = [value for value, label in Game.CONDITION_CHOICES]
+    pets = [value for value, label in Game.PET_CHOICES]
+    games = []
+    for user_id in rng.choices(_ranked_ids, cum_weights=_cum_weights, k=size):
+        missing_pieces = rng.random() < 0.2
+        created_at = now - datetime.timedelta(seconds=rng.randint(0, LISTING_DAYS * 86400))
+        printed = rng.random() < 0.6
+        received = printed and rng.random() < 0.7
+        games.append(Game(
+            user_id=user_id,
+            name=rng.choice(GAME_NAMES) + rng.choice(EDITIONS),
+            # Mostly cheap games with a long tail of expensive ones
+            price=Decimal(min(max(rng.lognormvariate(3.2, 0.6), 1), 999.99)).quantize(Decimal('0.01')),
+            condition=rng.choices(conditions, weights=[5, 10, 30, 35, 15, 5])[0],
+            missing_pieces=missing_pieces,
+            description_of_missing_pieces=rng.choice(MISSING_PIECES) if missing_pieces else '',
+            smoking_house=rng.random() < 0.05,
+            musty_smell=rng.random() < 0.08,
+            pet=rng.choices(pets, weights=[70, 18, 12])[0],
+            printed=printed,
+            received=received,
+            received_date=min(created_at + datetime.timedelta(days=rng.randint(1, 30)), now) if received else None,
+            created_at=created_at,
+        ))
+    # One commit per batch, not one per INSERT the backend splits it into
+    with transaction.atomic():
+        Game.objects.bulk_create(games)
+    return size
+
+
+def _create_attempts(seed, now, index, size):
+    """Insert one batch of honeypot attempts and return its size"""
+    rng = batch_rng(seed, 'honeypot', index)
+    attempts = []
+    for ip_rank in rng.choices(_ranked_ids, cum_weights=_cum_weights, k=size):
+        # Each IP keeps the same address and user agent across batches
+        ip_rng = random.Random(f'{seed}:ip:{ip_rank}')
+        is_login_attempt = rng.random() < 0.3
+        attempts.append(HoneypotAttempt(
+            ip_address=f'{ip_rng.randint(1, 223)}.{ip_rng.randint(0, 255)}.{ip_rng.randint(0, 255)}.{ip_rng.randint(1, 254)}',
+            user_agent=ip_rng.choice(USER_AGENTS),
+            username=rng.choice(HONEYPOT_USERNAMES) if is_login_attempt else None,
+            timestamp=now - datetime.timedelta(seconds=rng.randint(0, settings.HONEYPOT_RETENTION_DAYS * 86400)),
+            is_login_attempt=is_login_attempt,
+        ))
+    with transaction.atomic():
+        HoneypotAttempt.objects.bulk_create(attempts)
+    return size
+
+
+def _run_batches(function, seed, now, total, batch_size, processes, initargs):
+    """Run function over every batch of total rows, in worker processes if asked, yield the sizes done"""
+    jobs = [(seed, now, index, size) for index, size in batches(total, batch_size)]
+    if processes == 1:
+        _init_worker(*initargs)
+        for job in jobs:
+            yield function(*job)
+        return
+    # Every process opens its own connection, do not share the parent's
+    connections.close_all()
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=_init_worker, initargs=initargs) as pool:
+        yield from pool.map(function, *zip(*jobs))
+
+
+class Command(BaseCommand):
+    help = 'Generate users, games and honeypot attempts in bulk for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Number of sellers to create')
+        parser.add_argument('--games', type=int, default=100000, help='Number of games to create')
+        parser.add_argument('--honeypot-attempts', type=int, default=0, help='Number of honeypot attempts to create')
+        parser.add_argument('--offenders', type=int, default=500, help='Number of distinct IPs behind the honeypot attempts')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random data, the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT')
+        parser.add_argument('--processes', type=int, default=1, help='Processes inserting in parallel (ignored with SQLite, which allows a single writer)')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 and options['games']:
+            raise CommandError('Games need at least one user.')
+        seed, batch_size, processes = options['seed'], max(1, options['batch_size']), max(1, options['processes'])
+        if processes > 1 and connections['default'].vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite allows a single writer, inserting from one process'))
+            processes = 1
+
+        # Dates count back from midnight so reruns on the same day give identical rows
+        self.now = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = time.perf_counter()
+        seller_ids = create_users(options['users'], seed, self.now, batch_size)
+        self.stdout.write(f'{len(seller_ids)} users ready in {time.perf_counter() - start:.1f}s')
+
+        # Listings spread over the past year, auto_now_add would stamp them all with the current time
+        created_at = Game._meta.get_field('created_at')
+        created_at.auto_now_add = False
+        try:
+            self._insert('games', _create_games, options['games'], seed, batch_size, processes,
+                         (seller_ids, zipf_cum_weights(len(seller_ids), SELLER_SKEW)))
+        finally:
+            created_at.auto_now_add = True
+        offenders = max(1, options['offenders'])
+        self._insert('honeypot attempts', _create_attempts, options['honeypot_attempts'], seed, batch_size, processes,
+                     (list(range(offenders)), zipf_cum_weights(offenders, OFFENDER_SKEW)))
+
+        # bulk_create skips the Game signals that keep these up to date
+        rebuild_game_stats()
+        invalidate_seller_names()
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - start:.1f}s'))
+
+    def _insert(self, label, function, total, seed, batch_size, processes, initargs):
+        if total < 1:
+            return
+        start = time.perf_counter()
+        done = 0
+        for size in _run_batches(function, seed, self.now, total, batch_size, processes, initargs):
+            done += size
+            if done == total or done // batch_size % 20 == 0:
+                self.stdout.write(f'{label}: {done}/{total}')
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'{total} {label} created in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)')
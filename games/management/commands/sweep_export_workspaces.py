@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from games import workspaces
+
+
+class Command(BaseCommand):
+    help = 'Remove abandoned export and merge workspaces from the exports folder'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age', type=float, default=settings.EXPORT_WORKSPACE_TTL / (60 * 60), help='Remove workspaces not updated for more than this many hours')
+
+    def handle(self, *args, **options):
+        removed = workspaces.sweep_workspaces(max_age=options['max_age'] * 60 * 60)
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} abandoned workspaces'))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0004_game_received_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('total', models.PositiveIntegerField(default=0, help_text='Number of labels in the export')),
+                ('processed', models.PositiveIntegerField(default=0, help_text='Number of labels compiled so far')),
+                ('succeeded', models.PositiveIntegerField(default=0, help_text='Number of labels compiled successfully')),
+                ('output_file', models.CharField(blank=True, help_text='Name of the generated sheet in the exports folder', max_length=255)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, help_text='Admin who queued the export', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Export Job',
+                'verbose_name_plural': 'Export Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExportJobItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game_name', models.CharField(help_text='Name of the game when the export was queued', max_length=200)),
+                ('position', models.PositiveIntegerField(help_text='Order of the label in the sheet')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('success', 'Success'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('error_message', models.CharField(blank=True, max_length=255)),
+                ('game', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_items', to='games.game')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='games.exportjob')),
+            ],
+            options={
+                'verbose_name': 'Export Job Item',
+                'verbose_name_plural': 'Export Job Items',
+                'ordering': ['job', 'position'],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:06
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_game_stats(apps, schema_editor):
+    Game = apps.get_model('games', 'Game')
+    GameStats = apps.get_model('games', 'GameStats')
+    rows = [
+        GameStats(scope=f"user:{row['user_id']}", game_count=row['count'], total_value=row['value'] or 0)
+        for row in Game.objects.values('user_id').annotate(count=Count('id'), value=Sum('price')).order_by()
+    ]
+    GameStats.objects.bulk_create(rows, batch_size=1000)
+    GameStats.objects.create(
+        scope='global',
+        game_count=sum(row.game_count for row in rows),
+        total_value=sum((row.total_value for row in rows), Decimal('0')),
+        seller_count=len(rows),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0005_exportjob_exportjobitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(help_text='"global" or "user:<id>"', max_length=40, unique=True)),
+                ('game_count', models.PositiveIntegerField(default=0)),
+                ('total_value', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('seller_count', models.PositiveIntegerField(default=0, help_text='Users with at least one game (global scope only)')),
+            ],
+            options={
+                'verbose_name': 'Game Statistics',
+                'verbose_name_plural': 'Game Statistics',
+            },
+        ),
+        migrations.RunPython(build_game_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:09
+
+from django.conf import settings
+from django.db import migrations
+
+# The admin dashboard filters games with user__first_name__icontains and
+# user__last_name__icontains, which PostgreSQL runs as
+# UPPER(column::text) LIKE UPPER('%term%'). A trigram index on that exact
+# expression serves these substring searches; SQLite has no equivalent.
+NAME_SEARCH_COLUMNS = ['first_name', 'last_name']
+
+
+def create_name_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in NAME_SEARCH_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS games_user_{column}_trgm '
+            f'ON auth_user USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_name_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in NAME_SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS games_user_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('games', '0007_admin_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_search_indexes, drop_name_search_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0008_user_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='sheet_layout',
+            field=models.CharField(choices=[('labels', 'Label pages (2x3in)'), ('letter', 'Letter sheets'), ('a4', 'A4 sheets')], default='labels', help_text='One label per page, or labels imposed on printable sheets', max_length=10),
+        ),
+    ]
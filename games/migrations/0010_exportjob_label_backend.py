@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0009_exportjob_sheet_layout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='label_backend',
+            field=models.CharField(choices=[('latex', 'LaTeX (pdflatex)'), ('native', 'Native (fast)')], default='latex', help_text='Renderer of the label pages', max_length=10),
+        ),
+    ]
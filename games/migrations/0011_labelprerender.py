@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0010_exportjob_label_backend'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabelPrerender',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='label_prerender', serialize=False, to='games.game')),
+                ('render_after', models.DateTimeField(db_index=True, help_text='Pushed back on every edit so rapid successive edits are compiled once')),
+            ],
+            options={
+                'verbose_name': 'Label Pre-render',
+                'verbose_name_plural': 'Label Pre-renders',
+            },
+        ),
+    ]
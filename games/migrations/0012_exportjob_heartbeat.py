@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0011_labelprerender'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Last progress of the worker running the job, see EXPORT_JOB_TIMEOUT', null=True),
+        ),
+    ]
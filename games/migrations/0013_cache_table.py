@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:20
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import migrations
+
+# CACHES uses the DatabaseCache so that the signal invalidations reach every
+# gunicorn worker. Creating its table here lets a deploy run migrate alone,
+# createcachetable skips the tables that already exist.
+
+
+def create_cache_table(apps, schema_editor):
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+def drop_cache_table(apps, schema_editor):
+    for alias, config in settings.CACHES.items():
+        if config['BACKEND'] == 'django.core.cache.backends.db.DatabaseCache':
+            table = schema_editor.quote_name(caches[alias]._table)
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('games', '0012_exportjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, drop_cache_table),
+    ]
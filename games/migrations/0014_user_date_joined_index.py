@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:35
+
+from django.conf import settings
+from django.db import migrations
+
+# The admin users dashboard pages auth_user by (-date_joined, -id), both
+# PostgreSQL and SQLite scan this index backwards for it. auth_user belongs to
+# django.contrib.auth so the index is created here, like the name search ones.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('games', '0013_cache_table'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS games_user_date_joined_idx ON auth_user (date_joined, id)',
+            'DROP INDEX IF EXISTS games_user_date_joined_idx',
+        ),
+    ]
@@ -77,18 +77,63 @@ class Game(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Game'
         verbose_name_plural = 'Games'
+        # Access paths of the admin dashboard: every filter is paired with the
+        # default listing order so pages are read straight from the index
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='game_created_idx'),
+            models.Index(fields=['condition', '-created_at', '-id'], name='game_condition_created_idx'),
+            models.Index(fields=['printed', '-created_at', '-id'], name='game_printed_created_idx'),
+            models.Index(fields=['received', '-created_at', '-id'], name='game_received_created_idx'),
+            # Intake screens combine both flags, e.g. printed but not yet received
+            models.Index(fields=['printed', 'received', '-created_at', '-id'], name='game_printed_received_idx'),
+            models.Index(fields=['price', 'id'], name='game_price_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_loaded_values()
+        return instance
+    
+    def _remember_loaded_values(self, fields=None):
+        # Remember the stored values of the loaded fields, save() and the Game
+        # signals compare against them instead of reloading the game. Read from
+        # __dict__ so a deferred field never triggers a query
+        loaded = getattr(self, '_loaded_values', {})
+        for field in self._meta.concrete_fields:
+            if field.attname in self.__dict__ and (fields is None or field.attname in fields):
+                loaded[field.attname] = self.__dict__[field.attname]
+        self._loaded_values = loaded
+    
+    def loaded_value(self, attname, default=None):
+        """Return the value a field had when the game was loaded or last saved"""
+        return getattr(self, '_loaded_values', {}).get(attname, default)
     
     def save(self, *args, **kwargs):
         # Check if received is being changed from False to True
         if self.pk:  # Only for existing objects
-            old_instance = Game.objects.get(pk=self.pk)
-            if not old_instance.received and self.received:
+            if 'received' in getattr(self, '_loaded_values', {}):
+                was_received = self.loaded_value('received')
+            else:
+                # Not loaded from the database (or received was deferred)
+                was_received = Game.objects.filter(pk=self.pk).values_list('received', flat=True).first()
+            if not was_received and self.received:
                 # Set received_date when received changes from False to True
                 self.received_date = timezone.now()
         elif self.received:  # For new objects that are immediately received
             self.received_date = timezone.now()
         
         super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = {self._meta.get_field(name).attname for name in update_fields}
+        self._remember_loaded_values(update_fields)
+    
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is not None:
+            fields = {self._meta.get_field(name).attname for name in fields}
+        self._remember_loaded_values(fields)
     
     def __str__(self):
         return f"{self.name} - {self.get_condition_display()} - ${self.price}"
@@ -124,3 +169,121 @@ class Game(models.Model):
     def admin_only_received_date(self):
         """Return received_date only for admin users"""
         return self.received_date.strftime('%Y-%m-%d %H:%M:%S') if self.received_date else 'Not received'
+
+
+class ExportJob(models.Model):
+    """Label export queued from the admin dashboard and processed by the export worker"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    SHEET_LAYOUT_CHOICES = [
+        ('labels', 'Label pages (2x3in)'),
+        ('letter', 'Letter sheets'),
+        ('a4', 'A4 sheets'),
+    ]
+
+    LABEL_BACKEND_CHOICES = [
+        ('latex', 'LaTeX (pdflatex)'),
+        ('native', 'Native (fast)'),
+    ]
+
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='export_jobs', help_text='Admin who queued the export')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    sheet_layout = models.CharField(max_length=10, choices=SHEET_LAYOUT_CHOICES, default='labels', help_text='One label per page, or labels imposed on printable sheets')
+    label_backend = models.CharField(max_length=10, choices=LABEL_BACKEND_CHOICES, default='latex', help_text='Renderer of the label pages')
+    total = models.PositiveIntegerField(default=0, help_text='Number of labels in the export')
+    processed = models.PositiveIntegerField(default=0, help_text='Number of labels compiled so far')
+    succeeded = models.PositiveIntegerField(default=0, help_text='Number of labels compiled successfully')
+    output_file = models.CharField(max_length=255, blank=True, help_text='Name of the generated sheet in the exports folder')
+    error_message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text='Last progress of the worker running the job, see EXPORT_JOB_TIMEOUT')
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Export Job'
+        verbose_name_plural = 'Export Jobs'
+
+    def __str__(self):
+        return f"Export #{self.pk} - {self.get_status_display()} - {self.processed}/{self.total}"
+
+    @property
+    def is_active(self):
+        """Return True while the job is waiting for or being processed by the worker"""
+        return self.status in ('pending', 'running')
+
+    @property
+    def progress_percent(self):
+        """Return the progress of the job as a percentage"""
+        if not self.total:
+            return 100 if not self.is_active else 0
+        return int(self.processed * 100 / self.total)
+
+    @property
+    def failed_count(self):
+        """Return the number of labels that failed to compile"""
+        return self.processed - self.succeeded
+
+
+class ExportJobItem(models.Model):
+    """Outcome of one game label inside an export job"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('success', 'Success'),
+        ('failed', 'Failed'),
+    ]
+
+    job = models.ForeignKey(ExportJob, on_delete=models.CASCADE, related_name='items')
+    game = models.ForeignKey(Game, on_delete=models.SET_NULL, null=True, blank=True, related_name='export_items')
+    game_name = models.CharField(max_length=200, help_text='Name of the game when the export was queued')
+    position = models.PositiveIntegerField(help_text='Order of the label in the sheet')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    error_message = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ['job', 'position']
+        verbose_name = 'Export Job Item'
+        verbose_name_plural = 'Export Job Items'
+
+    def __str__(self):
+        return f"{self.game_name} - {self.get_status_display()}"
+
+
+class LabelPrerender(models.Model):
+    """Game waiting for its label to be compiled ahead of the export (see settings.LABEL_PRERENDER)"""
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, primary_key=True, related_name='label_prerender')
+    render_after = models.DateTimeField(db_index=True, help_text='Pushed back on every edit so rapid successive edits are compiled once')
+
+    class Meta:
+        verbose_name = 'Label Pre-render'
+        verbose_name_plural = 'Label Pre-renders'
+
+    def __str__(self):
+        return f"Label of game #{self.game_id} after {self.render_after}"
+
+
+class GameStats(models.Model):
+    """Running totals of the games table, maintained by the Game signals (see games/stats.py)"""
+    GLOBAL_SCOPE = 'global'
+
+    scope = models.CharField(max_length=40, unique=True, help_text='"global" or "user:<id>"')
+    game_count = models.PositiveIntegerField(default=0)
+    total_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    seller_count = models.PositiveIntegerField(default=0, help_text='Users with at least one game (global scope only)')
+
+    class Meta:
+        verbose_name = 'Game Statistics'
+        verbose_name_plural = 'Game Statistics'
+
+    def __str__(self):
+        return f"{self.scope}: {self.game_count} games - ${self.total_value}"
+
+    @staticmethod
+    def user_scope(user_id):
+        return f'user:{user_id}'
@@ -0,0 +1,105 @@
+"""
+Keyset pagination and sorting of the admin games table.
+
+Pages are fetched with a ``WHERE (sort_key, id) < (last_sort_key, last_id)``
+style condition instead of an OFFSET, so every page costs the same no matter
+how deep the admin scrolls. The cursor carries the sort key and id of the
+last row of the previous page. The admin users dashboard pages its users with
+the same cursors.
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import Case, DateTimeField, F, IntegerField, Q, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Game
+
+ADMIN_GAMES_PAGE_SIZE = 50
+
+# Seconds a table total is reused before being counted again
+COUNT_CACHE_TIMEOUT = 60
+
+# Games that were never received sort as the oldest received date
+NEVER = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Sortable columns: expression of the sort key and type of its cursor value
+GAME_SORTS = {
+    'created_at': (F('created_at'), 'datetime'),
+    'price': (F('price'), 'decimal'),
+    # Conditions sort by quality, from new in shrink to poor
+    'condition': (Case(
+        *[When(Q(condition=value), then=Value(rank)) for rank, (value, label) in enumerate(Game.CONDITION_CHOICES)],
+        default=Value(len(Game.CONDITION_CHOICES)),
+        output_field=IntegerField(),
+    ), 'int'),
+    'received_date': (Coalesce('received_date', Value(NEVER), output_field=DateTimeField()), 'datetime'),
+    'last_name': (F('user__last_name'), 'str'),
+}
+DEFAULT_SORT = 'created_at'
+
+
+def sort_games(games, sort, direction):
+    """Order games by one of GAME_SORTS, ties broken by id"""
+    expression, kind = GAME_SORTS[sort]
+    games = games.annotate(sort_key=expression)
+    if direction == 'asc':
+        return games.order_by('sort_key', 'id')
+    return games.order_by('-sort_key', '-id')
+
+
+def encode_cursor(value, row_id):
+    """Return the cursor of the row after which the next page starts"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, Decimal):
+        value = str(value)
+    payload = json.dumps([value, row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+
+def decode_cursor(cursor, kind):
+    """Return (sort value, id) from a cursor whose value is of the given kind, None if it is missing or invalid"""
+    if not cursor:
+        return None
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if kind == 'datetime':
+            value = datetime.fromisoformat(value)
+        elif kind == 'decimal':
+            value = Decimal(value)
+        elif kind == 'int':
+            value = int(value)
+        else:
+            value = str(value)
+        return value, int(row_id)
+    except (ValueError, TypeError, InvalidOperation, json.JSONDecodeError):
+        return None
+
+
+def games_page(games, sort, direction, cursor, page_size=ADMIN_GAMES_PAGE_SIZE):
+    """Return (games of the page, cursor of the next page or None)"""
+    position = decode_cursor(cursor, GAME_SORTS[sort][1])
+    if position is not None:
+        value, game_id = position
+        if direction == 'asc':
+            games = games.filter(Q(sort_key__gt=value) | Q(sort_key=value, id__gt=game_id))
+        else:
+            games = games.filter(Q(sort_key__lt=value) | Q(sort_key=value, id__lt=game_id))
+
+    page = list(games[:page_size + 1])
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor(page[-1].sort_key, page[-1].id)
+    return page, next_cursor
+
+
+def cached_count(queryset, key):
+    """Return the row count of a queryset, reused for COUNT_CACHE_TIMEOUT seconds"""
+    cache_key = hashlib.md5(key.encode('utf-8')).hexdigest()
+    return cache.get_or_set(f'count:{cache_key}', queryset.count, COUNT_CACHE_TIMEOUT)
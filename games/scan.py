@@ -0,0 +1,129 @@
+"""
+Scan station of the drop-off counter.
+
+Labels carry a ``PAXU25:<game id>`` code. A scan marks the game as received
+with one conditional UPDATE on the primary key, without loading the game
+through the ORM or running the AdminGameForm. The few display fields of the
+game are kept in a small in-process cache of recent scans, which also
+swallows the repeated reads a hand scanner produces when held over a label.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.utils import timezone
+
+from .models import Game
+
+SCAN_CODE_RE = re.compile(r'^\s*(?:PAXU25:)?\s*#?(\d+)\s*$', re.IGNORECASE)
+
+# Recent scans remembered by each worker process
+SCAN_CACHE_SIZE = 512
+# Seconds the display fields of a scanned game are reused
+SCAN_CACHE_TIMEOUT = 10 * 60
+# A second scan of the same game within this many seconds is a duplicate read
+SCAN_DEBOUNCE = 3
+
+_recent_scans = OrderedDict()
+_recent_scans_lock = threading.Lock()
+
+
+def parse_scan_code(code):
+    """Return the game id of a scanned code, None if the code is not a game label"""
+    match = SCAN_CODE_RE.match(code or '')
+    return int(match.group(1)) if match else None
+
+
+def _cached_scan(game_id):
+    with _recent_scans_lock:
+        entry = _recent_scans.get(game_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry['cached_at'] > SCAN_CACHE_TIMEOUT:
+            del _recent_scans[game_id]
+            return None
+        _recent_scans.move_to_end(game_id)
+        return entry
+
+
+def _remember_scan(game_id, entry):
+    with _recent_scans_lock:
+        _recent_scans[game_id] = entry
+        _recent_scans.move_to_end(game_id)
+        while len(_recent_scans) > SCAN_CACHE_SIZE:
+            _recent_scans.popitem(last=False)
+
+
+def _game_info(game_id):
+    """Return the display fields of a game, None if it does not exist"""
+    row = Game.objects.filter(pk=game_id).values_list('name', 'user__first_name', 'user__last_name', 'received_date').first()
+    if row is None:
+        return None
+    name, first_name, last_name, received_date = row
+    return {
+        'name': name,
+        'seller': f'{first_name} {last_name}'.strip(),
+        'received_date': received_date,
+    }
+
+
+def scan_game(game_id):
+    """
+    Mark a scanned game as received.
+
+    Returns a dict describing the scan, with status 'received', 'already'
+    (received earlier), 'duplicate' (same game scanned again within
+    SCAN_DEBOUNCE seconds) or 'missing' (no such game).
+    """
+    now = time.monotonic()
+    cached = _cached_scan(game_id)
+    if cached is not None and now - cached['scanned_at'] < SCAN_DEBOUNCE:
+        return {**cached, 'status': 'duplicate'}
+
+    received_date = timezone.now()
+    updated = Game.objects.filter(pk=game_id, received=False).update(
+        received=True,
+        received_date=received_date,
+        updated_at=received_date,
+    )
+
+    if updated and cached is not None:
+        # Only the received date changed since the game was last displayed
+        info = {**cached, 'received_date': received_date}
+    else:
+        info = _game_info(game_id)
+        if info is None:
+            return {'game_id': game_id, 'status': 'missing'}
+        info['cached_at'] = now
+
+    entry = {
+        'game_id': game_id,
+        'name': info['name'],
+        'seller': info['seller'],
+        'received_date': info['received_date'],
+        'scanned_at': now,
+        'cached_at': info['cached_at'],
+    }
+    _remember_scan(game_id, entry)
+    return {**entry, 'status': 'received' if updated else 'already'}
+
+
+def undo_scan(game_id, received_date):
+    """
+    Mark a game as not received again, for scans made by mistake.
+
+    received_date is the date the scan set: a game received earlier or
+    changed since is left as is. Returns True if the scan was undone.
+    """
+    if received_date is None:
+        return False
+    updated = Game.objects.filter(pk=game_id, received=True, received_date=received_date).update(
+        received=False,
+        received_date=None,
+        updated_at=timezone.now(),
+    )
+    if updated:
+        with _recent_scans_lock:
+            _recent_scans.pop(game_id, None)
+    return bool(updated)
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from .export_jobs import schedule_label_prerenders
+from .labels import LABEL_FIELDS
+from .models import Game
+from .stats import invalidate_seller_names, sync_user_stats
+
+@receiver(post_save, sender=Game)
+def game_label_post_save(sender, instance, created, **kwargs):
+    # Compile the label ahead of the export when what it prints changed, the
+    # loaded values are only updated by Game.save once every receiver ran
+    changed = any(instance.__dict__.get(field) != instance.loaded_value(field) for field in LABEL_FIELDS)
+    if settings.LABEL_PRERENDER and (created or changed):
+        schedule_label_prerenders([instance.pk])
+
+@receiver(post_save, sender=Game)
+def game_post_save(sender, instance, created, **kwargs):
+    loaded_user_id = instance.loaded_value('user_id')
+    changed_hands = not created and loaded_user_id and loaded_user_id != instance.user_id
+    if not created and not changed_hands and instance.loaded_value('price') == instance.price:
+        # Status updates (received, printed, ...) leave the statistics unchanged
+        return
+    # Keep the statistics of the seller up to date
+    sync_user_stats(instance.user_id)
+    if created:
+        # Possibly the first game of a new seller
+        invalidate_seller_names()
+    elif changed_hands:
+        # The game changed hands
+        sync_user_stats(loaded_user_id)
+        invalidate_seller_names()
+
+@receiver(post_delete, sender=Game)
+def game_post_delete(sender, instance, **kwargs):
+    sync_user_stats(instance.user_id)
+    invalidate_seller_names()
+
+@receiver(post_save, sender=User)
+def user_post_save(sender, instance, update_fields=None, **kwargs):
+    # Renamed sellers, saves of other fields such as last_login are ignored
+    if update_fields is None or {'first_name', 'last_name'} & set(update_fields):
+        invalidate_seller_names()
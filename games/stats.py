@@ -0,0 +1,126 @@
+"""
+Incrementally maintained game statistics.
+
+GameStats keeps one row for the whole catalogue and one row per seller. The
+Game signals refresh the row of the seller whose game was saved or deleted
+and apply the difference to the global row, so reading the statistics is a
+single lookup instead of aggregates over the games table. Bulk operations
+that bypass the signals (queryset ``update`` of price or user,
+``bulk_create``, raw SQL) must call ``sync_user_stats`` for the affected
+sellers or ``rebuild_game_stats``.
+
+The seller names offered by the admin dashboard filters are cached the same
+way: built once, then dropped by the Game and User signals whenever a seller
+appears, disappears or is renamed.
+"""
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Sum
+
+from .models import Game, GameStats
+
+
+def _user_totals(user_id):
+    totals = Game.objects.filter(user_id=user_id).aggregate(count=Count('id'), value=Sum('price'))
+    return totals['count'], totals['value'] or Decimal('0')
+
+
+def rebuild_game_stats():
+    """Recompute every statistics row from the games table"""
+    with transaction.atomic():
+        GameStats.objects.all().delete()
+        rows = [
+            GameStats(scope=GameStats.user_scope(row['user_id']), game_count=row['count'], total_value=row['value'] or 0)
+            for row in Game.objects.values('user_id').annotate(count=Count('id'), value=Sum('price')).order_by()
+        ]
+        GameStats.objects.bulk_create(rows, batch_size=1000)
+        GameStats.objects.create(
+            scope=GameStats.GLOBAL_SCOPE,
+            game_count=sum(row.game_count for row in rows),
+            total_value=sum((row.total_value for row in rows), Decimal('0')),
+            seller_count=len(rows),
+        )
+
+
+def sync_user_stats(user_id):
+    """
+    Refresh the statistics of a seller after one of their games was saved or
+    deleted, and carry the difference over to the global statistics.
+
+    Only the games of that seller are aggregated (an indexed lookup), the
+    global row is adjusted by the difference so it never needs a full scan.
+    """
+    if not GameStats.objects.filter(scope=GameStats.GLOBAL_SCOPE).exists():
+        # First use, build everything from the games table
+        rebuild_game_stats()
+        return
+
+    with transaction.atomic():
+        game_count, total_value = _user_totals(user_id)
+        user_stats, created = GameStats.objects.select_for_update().get_or_create(scope=GameStats.user_scope(user_id))
+        count_delta = game_count - user_stats.game_count
+        value_delta = total_value - user_stats.total_value
+        seller_delta = int(game_count > 0) - int(user_stats.game_count > 0)
+        if not (count_delta or value_delta or seller_delta):
+            return
+
+        user_stats.game_count = game_count
+        user_stats.total_value = total_value
+        user_stats.save(update_fields=['game_count', 'total_value'])
+        GameStats.objects.filter(scope=GameStats.GLOBAL_SCOPE).update(
+            game_count=F('game_count') + count_delta,
+            total_value=F('total_value') + value_delta,
+            seller_count=F('seller_count') + seller_delta,
+        )
+
+
+def get_game_stats(user):
+    """Return the statistics shown to a user: every game for staff, their own games otherwise"""
+    if user.is_staff:
+        scope = GameStats.GLOBAL_SCOPE
+    else:
+        scope = GameStats.user_scope(user.pk)
+
+    stats = GameStats.objects.filter(scope=scope).first()
+    if stats is None and user.is_staff:
+        rebuild_game_stats()
+        stats = GameStats.objects.get(scope=scope)
+
+    game_count = stats.game_count if stats else 0
+    total_value = stats.total_value if stats else 0
+    return {
+        'total_games': game_count,
+        'total_value': total_value,
+        'avg_price': round(total_value / game_count, 2) if game_count else 0,
+        'active_sellers': stats.seller_count if user.is_staff else None,
+    }
+
+
+SELLER_NAMES_CACHE_KEY = 'games:seller_names'
+
+
+def get_seller_names():
+    """Return the sorted distinct first and last names of the users who listed a game"""
+    names = cache.get(SELLER_NAMES_CACHE_KEY)
+    if names is None:
+        # One indexed EXISTS probe per user instead of a DISTINCT over the games table
+        sellers = User.objects.filter(Exists(Game.objects.filter(user=OuterRef('pk')))).values_list('first_name', 'last_name')
+        first_names, last_names = set(), set()
+        for first_name, last_name in sellers:
+            first_names.add(first_name)
+            last_names.add(last_name)
+        first_names.discard('')
+        last_names.discard('')
+        names = {
+            'first_names': sorted(first_names),
+            'last_names': sorted(last_names),
+        }
+        cache.set(SELLER_NAMES_CACHE_KEY, names, None)
+    return names
+
+
+def invalidate_seller_names():
+    cache.delete(SELLER_NAMES_CACHE_KEY)
@@ -1,3 +1,904 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import itertools
+import os
+import re
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from a_users.models import Profile
+from . import imposition, label_cache, label_pdf, labels, scan
+from .exports import GAME_CSV_HEADER
+from .export_jobs import (
+    claim_job, claim_next_job, enqueue_label_export, prerender_due_labels, recent_export_jobs, recover_stale_jobs, run_job,
+    schedule_label_prerenders,
+)
+from .imports import GameImportError, import_games
+from .intake import mark_games
+from .models import ExportJob, Game, GameStats, LabelPrerender
+from .pagination import GAME_SORTS, games_page, sort_games
+
+ADMIN_FILTERS = {
+    'condition': 'good',
+    'printed': 'true',
+    'received': 'false',
+    'first_name': 'seller1',
+    'last_name': 'name2',
+    'drop_off_location': 'Norton',
+}
+
+
+class AdminGamesQueryPlanTests(TestCase):
+    """Check with EXPLAIN that the admin dashboard queries read games through an index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        sellers = User.objects.bulk_create([
+            User(username=f'seller{i}', first_name=f'Seller{i}', last_name=f'Name{i}') for i in range(50)
+        ])
+        locations = [value for value, label in Profile.DROPOFF_LOCATION_CHOICES]
+        Profile.objects.bulk_create([
+            Profile(user=seller, dropoff_location=locations[i % len(locations)]) for i, seller in enumerate(sellers)
+        ])
+        conditions = [value for value, label in Game.CONDITION_CHOICES]
+        Game.objects.bulk_create([
+            Game(
+                user=sellers[i % len(sellers)],
+                name=f'Game {i}',
+                price=Decimal(i % 97) + 1,
+                condition=conditions[i % len(conditions)],
+                printed=i % 3 == 0,
+                received=i % 5 == 0,
+            )
+            for i in range(3000)
+        ], batch_size=500)
+        # Give the planner statistics about the seeded data
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def explain(self, sql):
+        """Return the query plan of a captured query as text"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # On a small dataset a sequential scan is always cheaper, only
+                # check that an index path exists
+                cursor.execute('SET enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+                cursor.execute('RESET enable_seqscan')
+                return plan
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+
+    def game_query_plans(self, params):
+        """Load the games table with the given parameters, return the plans of the games queries"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('games:admin_only_games'), params, HTTP_HX_REQUEST='true')
+        self.assertEqual(response.status_code, 200)
+        plans = [self.explain(query['sql']) for query in queries.captured_queries if '"games_game"' in query['sql']]
+        self.assertTrue(plans)
+        return plans
+
+    def assertGamesUseIndex(self, plan):
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Seq Scan on games_game', plan)
+        else:
+            self.assertIsNone(re.search(r'SCAN games_game(?! USING)', plan), plan)
+
+    def test_default_listing_uses_index(self):
+        for plan in self.game_query_plans({}):
+            self.assertGamesUseIndex(plan)
+        self.assertIn('game_created_idx', self.game_query_plans({})[0])
+
+    def test_price_sort_uses_index(self):
+        plan = self.game_query_plans({'sort': 'price', 'dir': 'asc'})[0]
+        self.assertGamesUseIndex(plan)
+        self.assertIn('game_price_idx', plan)
+
+    def test_condition_filter_uses_composite_index(self):
+        for plan in self.game_query_plans({'condition': 'good'}):
+            self.assertIn('game_condition_created_idx', plan)
+
+    def test_every_filter_combination_uses_index(self):
+        for size in range(1, len(ADMIN_FILTERS) + 1):
+            for names in itertools.combinations(ADMIN_FILTERS, size):
+                params = {name: ADMIN_FILTERS[name] for name in names}
+                with self.subTest(filters=names):
+                    for plan in self.game_query_plans(params):
+                        self.assertGamesUseIndex(plan)
+
+    def test_name_search_uses_trigram_index(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Trigram indexes are only created on PostgreSQL')
+        for name in ('first_name', 'last_name'):
+            for plan in self.game_query_plans({name: ADMIN_FILTERS[name]}):
+                self.assertIn(f'games_user_{name}_trgm', plan)
+
+
+class SplitPdfTests(SimpleTestCase):
+    """Check the batch PDF of a LaTeX compile is split without pdftk"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.pdf_path = os.path.join(self.temp_dir.name, 'batch.pdf')
+        games = [Game(id=i, name=f'Game {i}', price=Decimal('10.00'), condition='good') for i in range(1, 4)]
+        label_pdf.render_labels(games, self.pdf_path)
+
+    def test_split_without_pdftk(self):
+        from pypdf import PdfReader
+
+        output_paths = [os.path.join(self.temp_dir.name, f'label_{i}.pdf') for i in range(3)]
+        with mock.patch.object(labels, 'PDFTK_PATH', os.path.join(self.temp_dir.name, 'missing-pdftk')):
+            self.assertTrue(labels.split_pdf(self.pdf_path, output_paths))
+        for path in output_paths:
+            self.assertEqual(len(PdfReader(path).pages), 1)
+
+    def test_page_count_mismatch(self):
+        output_paths = [os.path.join(self.temp_dir.name, f'label_{i}.pdf') for i in range(2)]
+        with mock.patch.object(labels, 'PDFTK_PATH', os.path.join(self.temp_dir.name, 'missing-pdftk')):
+            self.assertFalse(labels.split_pdf(self.pdf_path, output_paths))
+
+
+class ScanStationTests(TestCase):
+    """Check scans, duplicate reads and undo at the scan station"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        seller = User.objects.create_user('seller', 'seller@example.com', 'password', first_name='Sam', last_name='Seller')
+        cls.game = Game.objects.create(user=seller, name='Azul', price=Decimal('20.00'), condition='good')
+
+    def setUp(self):
+        scan._recent_scans.clear()
+        self.client.force_login(self.admin)
+
+    def post(self, data):
+        return self.client.post(reverse('games:scan_code'), data, HTTP_HX_REQUEST='true')
+
+    def test_scan_marks_received(self):
+        result = scan.scan_game(self.game.pk)
+        self.assertEqual(result['status'], 'received')
+        self.assertEqual(result['seller'], 'Sam Seller')
+        self.game.refresh_from_db()
+        self.assertTrue(self.game.received)
+        self.assertEqual(self.game.received_date, result['received_date'])
+
+    def test_repeated_read_is_duplicate(self):
+        scan.scan_game(self.game.pk)
+        self.assertEqual(scan.scan_game(self.game.pk)['status'], 'duplicate')
+
+    def test_later_scan_keeps_received_date(self):
+        first = scan.scan_game(self.game.pk)
+        with mock.patch.object(scan, 'SCAN_DEBOUNCE', 0):
+            second = scan.scan_game(self.game.pk)
+        self.assertEqual(second['status'], 'already')
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.received_date, first['received_date'])
+
+    def test_undo_reverts_the_scan(self):
+        response = self.post({'code': f'PAXU25:{self.game.pk}'})
+        # The undo link sends back the date the scan set
+        received_date = re.search(r'"received_date": "([^"]+)"', response.content.decode()).group(1)
+        response = self.post({'code': str(self.game.pk), 'undo': '1', 'received_date': received_date})
+        self.assertContains(response, 'marked as not received')
+        self.game.refresh_from_db()
+        self.assertFalse(self.game.received)
+        self.assertIsNone(self.game.received_date)
+
+    def test_undo_is_only_offered_for_new_receptions(self):
+        self.post({'code': str(self.game.pk)})
+        self.assertNotContains(self.post({'code': str(self.game.pk)}), 'Undo')
+        scan._recent_scans.clear()
+        response = self.post({'code': str(self.game.pk)})
+        self.assertContains(response, 'Already received')
+        self.assertNotContains(response, 'Undo')
+
+    def test_undo_keeps_earlier_reception(self):
+        received_date = scan.scan_game(self.game.pk)['received_date']
+        for data in ({}, {'received_date': '2020-01-01T00:00:00+00:00'}):
+            with self.subTest(data=data):
+                response = self.post({'code': str(self.game.pk), 'undo': '1', **data})
+                self.assertContains(response, 'left as is')
+                self.game.refresh_from_db()
+                self.assertTrue(self.game.received)
+                self.assertEqual(self.game.received_date, received_date)
+
+
+class GameImportTests(TestCase):
+    """Check the bulk CSV import of a seller's games"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', 'seller@example.com', 'password')
+
+    def upload(self, text, encoding='utf-8'):
+        return import_games(SimpleUploadedFile('games.csv', text.encode(encoding)), self.seller)
+
+    def test_valid_rows_are_created(self):
+        result = self.upload(
+            'Game Name,Price,Condition,Missing Pieces,Pet Exposure\n'
+            'Azul,$25.00,Very Good,Yes,Cat\n'
+            'Root,"1,250.50",poor,no,\n'
+        )
+        self.assertEqual(result, {'created': 2, 'errors': []})
+        azul = Game.objects.get(name='Azul')
+        self.assertEqual((azul.price, azul.condition, azul.missing_pieces, azul.pet), (Decimal('25.00'), 'very good', True, 'cat'))
+        self.assertEqual(Game.objects.get(name='Root').price, Decimal('1250.50'))
+        self.assertEqual(GameStats.objects.get(scope=GameStats.user_scope(self.seller.pk)).game_count, 2)
+
+    def test_errors_are_reported_per_row(self):
+        result = self.upload(
+            'name,price,condition,missing_pieces\n'
+            'Azul,20,good,no\n'
+            ',0,meh,maybe\n'
+            '\n'
+            'Root,30,excellent,no\n'
+        )
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([line for line, errors in result['errors']], [3, 5])
+        line, errors = result['errors'][0]
+        self.assertEqual(len(errors), 4)
+        self.assertTrue(any(error.startswith('missing_pieces:') for error in errors))
+
+    def test_ambiguous_price_is_rejected(self):
+        for price in ('12,50', '1,25', '1,2345.00', '12,500,0'):
+            with self.subTest(price=price):
+                result = self.upload(f'name,price,condition\nAzul,"{price}",good\n')
+                self.assertEqual(result['created'], 0)
+                self.assertTrue(result['errors'][0][1][0].startswith('price:'))
+        self.assertFalse(Game.objects.exists())
+
+    def test_non_utf8_file_is_rejected(self):
+        with self.assertRaises(GameImportError):
+            self.upload('name,price,condition\nCaf\u00e9 International,20,good\n', encoding='cp1252')
+        self.assertFalse(Game.objects.exists())
+
+    def test_missing_columns(self):
+        with self.assertRaisesMessage(GameImportError, 'Missing columns: price, condition.'):
+            self.upload('name,description\nAzul,x\n')
+
+
+class ExportDownloadTests(TestCase):
+    """Check the downloads of export sheets and of their merge"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        Game.objects.bulk_create([Game(user=cls.admin, name=f'Game {i}', price=Decimal('10.00'), condition='good') for i in range(4)])
+
+    def setUp(self):
+        exports_root = tempfile.TemporaryDirectory()
+        self.addCleanup(exports_root.cleanup)
+        exports_settings = override_settings(EXPORTS_ROOT=exports_root.name, LABEL_CACHE_ROOT=os.path.join(exports_root.name, 'label_cache'))
+        exports_settings.enable()
+        self.addCleanup(exports_settings.disable)
+        # Merged with pypdf
+        patcher = mock.patch.object(labels, 'PDFTK_PATH', os.path.join(exports_root.name, 'missing-pdftk'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.admin)
+        self.jobs = []
+        for name in ('Game 0', 'Game 1'):
+            job = enqueue_label_export(Game.objects.filter(name__in=[name, 'Game 3']), self.admin, label_backend='native')
+            self.jobs.append(run_job(claim_job(job.pk), workers=1))
+
+    def read(self, response):
+        content = b''.join(response.streaming_content)
+        response.close()
+        return content
+
+    def test_sheet_download_answers_ranges(self):
+        response = self.client.get(reverse('games:export_job_download', args=[self.jobs[0].pk]), HTTP_RANGE='bytes=0-99')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(len(self.read(response)), 100)
+
+    def test_sheet_download_name(self):
+        response = self.client.get(reverse('games:export_job_download', args=[self.jobs[0].pk]))
+        self.read(response)
+        filename = os.path.basename(self.jobs[0].output_file)
+        self.assertTrue(filename.startswith('labels_job'))
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="{filename}"')
+
+    def test_merge_ignores_ranges(self):
+        from pypdf import PdfReader
+
+        response = self.client.get(reverse('games:admin_only_games'), {'export': 'merge'}, HTTP_RANGE='bytes=0-99')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'none')
+        content = self.read(response)
+        self.assertEqual(len(content), int(response['Content-Length']))
+        self.assertEqual(len(PdfReader(io.BytesIO(content)).pages), 4)
+
+
+class ExportJobRecoveryTests(TestCase):
+    """Check that exports of a killed worker do not stay running forever"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        Game.objects.create(user=cls.admin, name='Azul', price=Decimal('10.00'), condition='good')
+
+    def running_job(self, idle):
+        enqueue_label_export(Game.objects.all(), self.admin)
+        job = claim_next_job()
+        ExportJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - idle)
+        return job
+
+    def test_stale_job_is_failed(self):
+        job = self.running_job(timedelta(hours=1))
+        self.assertEqual(recover_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertTrue(job.error_message)
+
+    def test_live_job_keeps_running(self):
+        job = self.running_job(timedelta(seconds=10))
+        self.assertEqual(recover_stale_jobs(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+
+    def test_panel_stops_polling_for_stale_job(self):
+        self.running_job(timedelta(hours=1))
+        context = recent_export_jobs()
+        self.assertFalse(context['export_jobs_active'])
+        self.assertEqual(context['export_jobs'][0].status, 'failed')
+
+    def test_recovered_job_is_not_finished_by_its_worker(self):
+        exports_root = tempfile.TemporaryDirectory()
+        self.addCleanup(exports_root.cleanup)
+        job = self.running_job(timedelta(seconds=0))
+        draw_label = label_pdf.draw_label
+
+        def slow_draw_label(game):
+            # The label takes longer than EXPORT_JOB_TIMEOUT, the job is recovered meanwhile
+            ExportJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+            recover_stale_jobs()
+            return draw_label(game)
+
+        ExportJob.objects.filter(pk=job.pk).update(label_backend='native')
+        job.refresh_from_db()
+        with override_settings(EXPORTS_ROOT=exports_root.name), mock.patch.object(label_pdf, 'draw_label', slow_draw_label):
+            job = run_job(job, workers=1)
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.output_file, '')
+        self.assertIn('worker stopped', job.error_message)
+        self.assertFalse(Game.objects.filter(printed=True).exists())
+
+
+def legacy_csv_row(game):
+    """Row of a game as the export wrote it before it was streamed"""
+    profile = getattr(game.user, 'profile', None)
+    payment_choice = {'cash_40': 'Cash (40%)', 'credit_70': 'Store Credit (70%)'}.get(profile and profile.payment_choice, '')
+    return [
+        str(game.id), game.name, game.user.first_name or '', game.user.last_name or '', game.user.email or '',
+        (profile.phone_number or '') if profile else '', payment_choice, str(game.price), game.get_condition_display(),
+        'Yes' if game.missing_pieces else 'No', game.description_of_missing_pieces or '',
+        'Yes' if game.smoking_house else 'No', 'Yes' if game.musty_smell else 'No', game.get_pet_display(),
+        'Yes' if game.printed else 'No', 'Yes' if game.received else 'No',
+        game.received_date.strftime('%Y-%m-%d %H:%M:%S') if game.received_date else '',
+        (profile.dropoff_location or '') if profile else '', game.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+    ]
+
+
+class GameCsvExportTests(TestCase):
+    """Check that the streamed CSV export keeps the format of the original one"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        seller = User.objects.create_user('seller', 'seller@example.com', first_name='Ada', last_name='Lovelace')
+        Profile.objects.filter(user=seller).delete()
+        Profile.objects.create(user=seller, phone_number='555-0100', payment_choice='credit_70', dropoff_location='Norton')
+        # A seller without a profile and without names
+        bare = User.objects.create_user('bare')
+        Profile.objects.filter(user=bare).delete()
+        Game.objects.create(
+            user=seller, name='Brass, "Birmingham"', price=Decimal('42.50'), condition='like new', missing_pieces=True,
+            description_of_missing_pieces='2 cards\nand a die', smoking_house=True, pet='cat', printed=True, received=True,
+        )
+        Game.objects.create(user=bare, name='Azul', price=Decimal('10.00'), condition='poor')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def expected_rows(self):
+        games = Game.objects.select_related('user__profile').order_by('-created_at')
+        return [GAME_CSV_HEADER] + [legacy_csv_row(game) for game in games]
+
+    def test_rows_match_original_format(self):
+        response = self.client.get(reverse('games:admin_only_games'), {'export': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="games_export.csv"')
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertEqual(list(csv.reader(io.StringIO(content))), self.expected_rows())
+
+    def test_gzip_has_same_rows(self):
+        response = self.client.get(reverse('games:admin_only_games'), {'export': 'csv', 'gzip': 'true'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="games_export.csv.gz"')
+        content = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+        self.assertEqual(list(csv.reader(io.StringIO(content))), self.expected_rows())
+
+
+class GameStatsTests(TestCase):
+    """Check that the signal deltas keep GameStats equal to aggregates of the games table"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice')
+        cls.bob = User.objects.create_user('bob')
+
+    def stats(self, scope):
+        row = GameStats.objects.filter(scope=scope).first()
+        return (row.game_count, row.total_value) if row else (0, Decimal('0'))
+
+    def assertStatsMatchGames(self):
+        for user in (self.alice, self.bob):
+            games = Game.objects.filter(user=user)
+            expected = (games.count(), sum((game.price for game in games), Decimal('0')))
+            self.assertEqual(self.stats(GameStats.user_scope(user.pk)), expected, user.username)
+        games = Game.objects.all()
+        self.assertEqual(self.stats(GameStats.GLOBAL_SCOPE), (games.count(), sum((game.price for game in games), Decimal('0'))))
+        global_stats = GameStats.objects.get(scope=GameStats.GLOBAL_SCOPE)
+        self.assertEqual(global_stats.seller_count, games.values('user').distinct().count())
+
+    def test_deltas_through_game_lifecycle(self):
+        azul = Game.objects.create(user=self.alice, name='Azul', price=Decimal('10.00'), condition='good')
+        root = Game.objects.create(user=self.alice, name='Root', price=Decimal('25.50'), condition='fair')
+        self.assertStatsMatchGames()
+
+        azul.price = Decimal('12.25')
+        azul.save()
+        self.assertStatsMatchGames()
+
+        # A status update leaves the statistics alone
+        root.received = True
+        root.save()
+        self.assertStatsMatchGames()
+
+        root.user = self.bob
+        root.save()
+        self.assertStatsMatchGames()
+
+        # Edit a freshly loaded instance, as the views do
+        root = Game.objects.get(pk=root.pk)
+        root.user = self.alice
+        root.price = Decimal('20.00')
+        root.save()
+        self.assertStatsMatchGames()
+        self.assertEqual(GameStats.objects.get(scope=GameStats.GLOBAL_SCOPE).seller_count, 1)
+
+        azul.delete()
+        root.delete()
+        self.assertStatsMatchGames()
+        self.assertEqual(self.stats(GameStats.GLOBAL_SCOPE), (0, Decimal('0')))
+
+
+class GamesCursorTests(TestCase):
+    """Check that following the cursors visits every game once, for every sort and direction"""
+
+    @classmethod
+    def setUpTestData(cls):
+        sellers = [User.objects.create_user(f'seller{i}', last_name=['Smith', 'Jones', ''][i]) for i in range(3)]
+        conditions = [value for value, label in Game.CONDITION_CHOICES]
+        now = timezone.now()
+        Game.objects.bulk_create([
+            Game(
+                user=sellers[i % 3],
+                name=f'Game {i}',
+                # Few distinct values so that pages split runs of equal sort keys
+                price=Decimal(i % 4) + Decimal('0.99'),
+                condition=conditions[i % 3],
+                received=i % 5 == 0,
+                received_date=now - timedelta(days=i % 2) if i % 5 == 0 else None,
+            )
+            for i in range(47)
+        ])
+        Game.objects.filter(id__in=Game.objects.order_by('id').values('id')[:20]).update(created_at=now)
+
+    def test_pages_have_no_gaps_or_duplicates(self):
+        expected_ids = set(Game.objects.values_list('id', flat=True))
+        for sort in GAME_SORTS:
+            for direction in ('asc', 'desc'):
+                with self.subTest(sort=sort, direction=direction):
+                    games = sort_games(Game.objects.all(), sort, direction)
+                    ids, cursor = [], None
+                    while True:
+                        page, cursor = games_page(games, sort, direction, cursor, page_size=6)
+                        ids.extend(game.id for game in page)
+                        if cursor is None:
+                            break
+                    self.assertEqual(len(ids), len(expected_ids))
+                    self.assertEqual(set(ids), expected_ids)
+                    self.assertEqual(ids, [game.id for game in games])
+
+
+class ReceivedDateTests(TestCase):
+    """Check how received_date is set on save and by the bulk intake"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller')
+
+    def create_game(self, **fields):
+        return Game.objects.create(user=self.seller, name='Azul', price=Decimal('10.00'), condition='good', **fields)
+
+    def test_save_sets_date_without_select(self):
+        game = Game.objects.get(pk=self.create_game().pk)
+        game.received = True
+        with CaptureQueriesContext(connection) as queries:
+            game.save()
+        self.assertFalse([query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT')])
+        self.assertIsNotNone(game.received_date)
+
+    def test_second_save_keeps_date(self):
+        game = self.create_game(received=True)
+        received_date = game.received_date
+        self.assertIsNotNone(received_date)
+        game.name = 'Azul: Summer Pavilion'
+        game.save()
+        game.refresh_from_db()
+        self.assertEqual(game.received_date, received_date)
+
+    def test_loaded_values_follow_saves_and_refreshes(self):
+        game = Game.objects.get(pk=self.create_game().pk)
+        game.price = Decimal('12.00')
+        game.save(update_fields=['price'])
+        self.assertEqual(game.loaded_value('price'), Decimal('12.00'))
+        self.assertFalse(game.loaded_value('received'))
+
+        Game.objects.filter(pk=game.pk).update(received=True)
+        game.refresh_from_db(fields=['received'])
+        self.assertTrue(game.loaded_value('received'))
+        # Already received in the database, saving does not stamp a new date
+        game.received = True
+        game.save()
+        self.assertIsNone(game.received_date)
+
+    def test_deferred_received_is_read_on_save(self):
+        game = Game.objects.defer('received').get(pk=self.create_game().pk)
+        self.assertIsNone(game.loaded_value('received'))
+        game.received = True
+        with CaptureQueriesContext(connection) as queries:
+            game.save()
+        self.assertEqual(len([query for query in queries.captured_queries if query['sql'].startswith('SELECT')]), 1)
+        self.assertIsNotNone(game.received_date)
+
+    def test_mark_games_keeps_existing_dates(self):
+        old_date = timezone.now() - timedelta(days=3)
+        received = self.create_game(received=True)
+        Game.objects.filter(pk=received.pk).update(received_date=old_date)
+        pending = self.create_game()
+        result = mark_games([received.pk, pending.pk, 999999], 'received')
+        self.assertEqual(result, {'updated': 1, 'unchanged': 1, 'missing': [999999]})
+        received.refresh_from_db()
+        pending.refresh_from_db()
+        self.assertEqual(received.received_date, old_date)
+        self.assertTrue(pending.received)
+        self.assertGreater(pending.received_date, old_date)
+
+
+class ImpositionTests(SimpleTestCase):
+    """Check the grids and sheets of imposed label exports"""
+
+    def label_pdf(self, count):
+        """Write count blank 2x3in label pages, return the path"""
+        from pypdf import PdfWriter
+        from pypdf.generic import ContentStream, DecodedStreamObject
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'labels.pdf')
+        writer = PdfWriter()
+        for number in range(1, count + 1):
+            page = writer.add_blank_page(144, 216)
+            # A rectangle as wide as the label number tells the labels apart on the sheets
+            stream = DecodedStreamObject()
+            stream.set_data(f'0 0 {number} 1 re f'.encode('ascii'))
+            page.replace_contents(ContentStream(stream, writer))
+        with open(path, 'wb') as f:
+            writer.write(f)
+        self.output_path = os.path.join(directory.name, 'sheets.pdf')
+        return path
+
+    @override_settings(LABEL_SHEET_GRIDS={})
+    def test_fitted_grids(self):
+        self.assertEqual(imposition.sheet_grid('letter', 144, 216), (4, 3))
+        self.assertEqual(imposition.sheet_grid('a4', 144, 216), (3, 3))
+        # A label larger than the sheet still gets one cell
+        self.assertEqual(imposition.sheet_grid('letter', 1000, 1000), (1, 1))
+
+    @override_settings(LABEL_SHEET_GRIDS={'letter': (2, 2)})
+    def test_configured_grid(self):
+        self.assertEqual(imposition.sheet_grid('letter', 144, 216), (2, 2))
+        self.assertEqual(imposition.sheet_grid('a4', 144, 216), (3, 3))
+
+    @override_settings(LABEL_SHEET_GRIDS={'letter': (5, 3), 'a4': (0, 2)})
+    def test_grid_off_the_sheet_falls_back_to_fitted(self):
+        with self.assertLogs('games.imposition', 'WARNING'):
+            self.assertEqual(imposition.sheet_grid('letter', 144, 216), (4, 3))
+        with self.assertLogs('games.imposition', 'WARNING'):
+            self.assertEqual(imposition.sheet_grid('a4', 144, 216), (3, 3))
+
+    def sheet_labels(self, sheet):
+        """Return the numbers of the labels drawn on a sheet"""
+        return [int(width) for width in re.findall(rb'0 0 (\d+) 1 re', sheet.get_contents().get_data())]
+
+    @override_settings(LABEL_SHEET_GRIDS={})
+    def test_sheet_count_and_partial_last_sheet(self):
+        from pypdf import PdfReader
+
+        self.assertEqual(imposition.impose_pdf(self.label_pdf(25), self.output_path, sheet='letter'), 3)
+        sheets = PdfReader(self.output_path).pages
+        self.assertEqual(len(sheets), 3)
+        self.assertEqual([float(value) for value in sheets[0].mediabox.upper_right], [612, 792])
+        # 12 labels on each full sheet, the last one holds the remaining label
+        self.assertEqual(self.sheet_labels(sheets[0]), list(range(1, 13)))
+        self.assertEqual(self.sheet_labels(sheets[1]), list(range(13, 25)))
+        self.assertEqual(self.sheet_labels(sheets[2]), [25])
+        # at the top left of the centred grid
+        left = (612 - 4 * 144) / 2
+        bottom = (792 - 3 * 216) / 2 + 2 * 216
+        offsets = re.findall(rb'1 \S+ \S+ 1 (\S+) (\S+) cm', sheets[2].get_contents().get_data())
+        self.assertEqual([(float(x), float(y)) for x, y in offsets], [(left, bottom)])
+
+    @override_settings(LABEL_SHEET_GRIDS={})
+    def test_exact_sheets_and_empty_input(self):
+        self.assertEqual(imposition.impose_pdf(self.label_pdf(9), self.output_path, sheet='a4'), 1)
+        self.assertEqual(imposition.impose_pdf(self.label_pdf(0), self.output_path, sheet='a4'), 0)
+
+
+def write_blank_pdf(path, pages):
+    """Write a PDF of blank 2x3in pages"""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(144, 216)
+    with open(path, 'wb') as f:
+        writer.write(f)
+
+
+class CompileLabelsTests(SimpleTestCase):
+    """Check how a batch of labels is compiled and split, pdflatex is replaced by a stub"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        for name, value in (('label_format', mock.Mock(return_value=None)), ('PDFTK_PATH', os.path.join(self.directory, 'missing-pdftk'))):
+            patcher = mock.patch.object(labels, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.jobnames = []
+
+    def fake_compile_tex(self, spill=()):
+        """Stub of compile_tex: one page per label, two for the bodies in spill, nothing for broken ones"""
+        def compile_tex(tex_source, work_dir, jobname, format_path=None):
+            self.jobnames.append(jobname)
+            if 'BROKEN' in tex_source and jobname != 'labels':
+                return None
+            bodies = re.findall(r'\\begingroup\n(.*?)\n\\par\\endgroup', tex_source, re.S)
+            path = os.path.join(work_dir, f'{jobname}.pdf')
+            write_blank_pdf(path, sum(2 if body in spill else 1 for body in bodies))
+            return path
+        return compile_tex
+
+    def compile(self, bodies, **stub):
+        paths = [os.path.join(self.directory, f'out_{index}.pdf') for index in range(len(bodies))]
+        with mock.patch.object(labels, 'compile_tex', self.fake_compile_tex(**stub)):
+            results = labels.compile_labels('\\documentclass{article}\n', bodies, paths)
+        return results, paths
+
+    def test_batch_compiled_in_one_run(self):
+        from pypdf import PdfReader
+
+        results, paths = self.compile(['one', 'two', 'three'])
+        self.assertEqual(results, [True, True, True])
+        self.assertEqual(self.jobnames, ['labels'])
+        for path in paths:
+            self.assertEqual(len(PdfReader(path).pages), 1)
+
+    def test_label_spilling_past_a_page_falls_back_to_single_labels(self):
+        results, paths = self.compile(['one', 'two', 'BROKEN'], spill={'two'})
+        # The batch has four pages for three labels, each label is compiled on its own
+        self.assertEqual(self.jobnames, ['labels', 'label_0', 'label_1', 'label_2'])
+        self.assertEqual(results, [True, True, False])
+        self.assertTrue(os.path.exists(paths[0]))
+        self.assertFalse(os.path.exists(paths[2]))
+
+    def test_empty_batch(self):
+        self.assertEqual(self.compile([])[0], [])
+        self.assertEqual(self.jobnames, [])
+
+
+class LabelFormatTests(SimpleTestCase):
+    """Check when the precompiled format of the template preamble is rebuilt"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        pdflatex = os.path.join(directory.name, 'pdflatex')
+        open(pdflatex, 'w').close()
+        self.format_root = os.path.join(directory.name, 'formats')
+        format_settings = override_settings(LABEL_FORMAT_ROOT=self.format_root)
+        format_settings.enable()
+        self.addCleanup(format_settings.disable)
+        for name, value in (('PDFLATEX_PATH', pdflatex), ('_failed_formats', set())):
+            patcher = mock.patch.object(labels, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def dump_format(self, cmd, cwd, **kwargs):
+        """Stub of pdflatex -ini, writes the format named by -jobname"""
+        jobname = next(arg for arg in cmd if arg.startswith('-jobname=')).split('=', 1)[1]
+        with open(os.path.join(cwd, f'{jobname}.fmt'), 'w') as f:
+            f.write(open(os.path.join(cwd, 'preamble.tex')).read())
+        return 0
+
+    def test_format_built_once_per_preamble(self):
+        with mock.patch('subprocess.call', side_effect=self.dump_format) as call:
+            first = labels.label_format('\\documentclass{article}\n')
+            self.assertEqual(labels.label_format('\\documentclass{article}\n'), first)
+            self.assertEqual(call.call_count, 1)
+
+            # A template edit builds a new format and drops the previous one
+            second = labels.label_format('\\documentclass{article}\n\\usepackage{xcolor}\n')
+            self.assertEqual(call.call_count, 2)
+        self.assertNotEqual(second, first)
+        self.assertFalse(os.path.exists(first))
+        self.assertEqual(os.listdir(self.format_root), [os.path.basename(second)])
+        with open(second) as f:
+            self.assertIn('xcolor', f.read())
+
+    def test_failed_format_is_not_retried(self):
+        with mock.patch('subprocess.call', return_value=1) as call:
+            self.assertIsNone(labels.label_format('\\documentclass{article}\n'))
+            self.assertIsNone(labels.label_format('\\documentclass{article}\n'))
+        self.assertEqual(call.call_count, 1)
+
+
+class LabelCachePruneTests(SimpleTestCase):
+    """Check which label cache entries prune evicts"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache_settings = override_settings(LABEL_CACHE_ROOT=directory.name)
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+        self.now = time.time()
+
+    def entry(self, key, size, age):
+        """Store a cache entry of size bytes last used age seconds ago"""
+        source = os.path.join(settings.LABEL_CACHE_ROOT, 'source.pdf')
+        with open(source, 'wb') as f:
+            f.write(b'x' * size)
+        path = label_cache.store(key * 64, source)
+        os.utime(path, (self.now - age, self.now - age))
+        return path
+
+    def test_least_recently_used_evicted_down_to_max_size(self):
+        oldest = self.entry('a', 100, 300)
+        older = self.entry('b', 100, 200)
+        recent = self.entry('c', 100, 100)
+        # A hit makes the oldest entry the most recently used
+        self.assertEqual(label_cache.lookup('a' * 64), oldest)
+        self.assertEqual(label_cache.prune(max_size=150, max_age=0), (2, 200))
+        self.assertEqual([os.path.exists(path) for path in (oldest, older, recent)], [True, False, False])
+
+    def test_entries_within_limits_are_kept(self):
+        paths = [self.entry(key, 100, 60) for key in 'abc']
+        self.assertEqual(label_cache.prune(max_size=300, max_age=3600), (0, 0))
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+    def test_entries_past_max_age_are_evicted(self):
+        stale = self.entry('a', 10, 7200)
+        fresh = self.entry('b', 10, 60)
+        self.assertEqual(label_cache.prune(max_size=None, max_age=3600), (1, 10))
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))
+
+    def test_recent_partial_writes_are_kept(self):
+        directory = os.path.join(settings.LABEL_CACHE_ROOT, 'ab')
+        os.makedirs(directory)
+        for name, age in (('recent.tmp', 60), ('abandoned.tmp', 7200)):
+            path = os.path.join(directory, name)
+            open(path, 'wb').close()
+            os.utime(path, (self.now - age, self.now - age))
+        label_cache.prune(max_size=0, max_age=0)
+        self.assertEqual(os.listdir(directory), ['recent.tmp'])
+
+
+class NativeLabelRendererTests(SimpleTestCase):
+    """Check the PDF written by the native label renderer"""
+
+    def game(self, pk, name):
+        return Game(id=pk, name=name, price=Decimal('12.50'), condition='good', pet='cat', missing_pieces=True)
+
+    def test_one_page_per_game(self):
+        from pypdf import PdfReader
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'labels.pdf')
+            label_pdf.render_labels([self.game(pk, f'Game {pk}') for pk in range(1, 4)], path)
+            reader = PdfReader(path, strict=True)
+            self.assertEqual(len(reader.pages), 3)
+            self.assertEqual([float(value) for value in reader.pages[0].mediabox.upper_right], [144, 216])
+            self.assertIn('PAXU25:2', reader.pages[1].extract_text())
+
+    def test_special_characters_are_escaped(self):
+        from pypdf import PdfReader
+
+        name = r'Brass (Birmingham) \ Café 100% ☃'
+        reader = PdfReader(io.BytesIO(label_pdf.render_label(self.game(7, name))), strict=True)
+        text = reader.pages[0].extract_text()
+        # Characters outside WinAnsiEncoding are replaced, the others kept as is
+        self.assertIn(r'Brass (Birmingham) \ Café 100% ?', text)
+        self.assertIn("SELLER'S PRICE: $12.50", text)
+
+    def test_pdf_string(self):
+        self.assertEqual(label_pdf.pdf_string('a(b)\\c'), b'(a\\(b\\)\\\\c)')
+        self.assertEqual(label_pdf.pdf_string('Café'), b'(Caf\xe9)')
+
+
+@override_settings(LABEL_PRERENDER=True, LABEL_PRERENDER_DELAY=30)
+class LabelPrerenderTests(TestCase):
+    """Check the debounced queue of labels compiled ahead of the export"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller')
+
+    def setUp(self):
+        self.game = Game.objects.create(user=self.seller, name='Azul', price=Decimal('10.00'), condition='good')
+
+    def render_after(self):
+        return LabelPrerender.objects.get(game=self.game).render_after
+
+    def test_new_game_is_queued(self):
+        self.assertGreater(self.render_after(), timezone.now() + timedelta(seconds=25))
+
+    def test_repeated_edits_only_move_the_deadline(self):
+        later = timezone.now() + timedelta(minutes=5)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            schedule_label_prerenders([self.game.pk])
+            schedule_label_prerenders([self.game.pk])
+        self.assertEqual(LabelPrerender.objects.count(), 1)
+        self.assertEqual(self.render_after(), later + timedelta(seconds=30))
+
+    def test_only_label_changes_are_queued(self):
+        LabelPrerender.objects.all().delete()
+        self.game.received = True
+        self.game.save()
+        self.assertFalse(LabelPrerender.objects.exists())
+        self.game.name = 'Azul: Summer Pavilion'
+        self.game.save()
+        self.assertTrue(LabelPrerender.objects.filter(game=self.game).exists())
+
+    def test_due_labels_are_taken_from_the_queue(self):
+        other = Game.objects.create(user=self.seller, name='Root', price=Decimal('20.00'), condition='good')
+        LabelPrerender.objects.filter(game=self.game).update(render_after=timezone.now() - timedelta(seconds=1))
+        # Both labels are already cached, nothing is compiled
+        with mock.patch.object(label_cache, 'lookup', return_value='cached.pdf'), mock.patch.object(labels, 'compile_labels') as compile_labels:
+            self.assertEqual(prerender_due_labels(), 1)
+        compile_labels.assert_not_called()
+        # The label edited within the delay stays queued
+        self.assertEqual(list(LabelPrerender.objects.values_list('game_id', flat=True)), [other.pk])
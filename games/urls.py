@@ -6,9 +6,16 @@ app_name = 'games'
 urlpatterns = [
     path('', views.game_list, name='game_list'),
     path('add/', views.add_game, name='add_game'),
+    path('import/', views.import_games, name='import_games'),
     path('<int:game_id>/', views.game_detail, name='game_detail'),
     path('<int:game_id>/edit/', views.edit_game, name='edit_game'),
     path('<int:game_id>/delete/', views.delete_game, name='delete_game'),
+    path('<int:game_id>/label/', views.game_label, name='game_label'),
     path('my-games/', views.my_games, name='my_games'),
     path('admin-games/', views.admin_only_games, name='admin_only_games'),
+    path('admin-games/intake/', views.game_intake, name='game_intake'),
+    path('admin-games/scan/', views.scan_station, name='scan_station'),
+    path('admin-games/scan/code/', views.scan_code, name='scan_code'),
+    path('admin-games/exports/', views.export_job_list, name='export_job_list'),
+    path('admin-games/exports/<int:job_id>/download/', views.export_job_download, name='export_job_download'),
 ]
@@ -1,15 +1,26 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import HttpResponse
-from .models import Game
+from django.http import FileResponse, Http404, JsonResponse
+from .models import Game, ExportJob
 from .forms import GameForm, AdminGameForm
-import csv
+from . import label_pdf, labels, label_cache, workspaces
+from .export_jobs import enqueue_label_export, recent_export_jobs
+from .downloads import FileDownloadResponse
+from .exports import game_csv_rows, streaming_csv_response
+from .imports import GameImportError, MAX_IMPORT_ROWS, import_games as import_games_csv, template_rows
+from .intake import INTAKE_ACTIONS, mark_games, parse_game_ids
+from .scan import parse_scan_code, scan_game, undo_scan
+from .pagination import DEFAULT_SORT, GAME_SORTS, cached_count, games_page, sort_games
+from .stats import get_seller_names
+import io
 import os
-import zipfile
-import subprocess
+from contextlib import ExitStack
+from datetime import datetime
 from django.conf import settings
-from django.template.loader import render_to_string
+from urllib.parse import urlencode
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_POST
 
 def is_admin_user(user):
     """Check if user is an admin/staff user"""
@@ -47,6 +58,31 @@ def add_game(request):
     
     return render(request, 'games/add_game.html', {'form': form})
 
+@login_required
+def import_games(request):
+    """Allow users to add many games at once from a CSV file"""
+    if request.GET.get('template') == 'true':
+        return streaming_csv_response(template_rows(), 'games_import_template.csv')
+    
+    result = None
+    if request.method == 'POST':
+        uploaded_file = request.FILES.get('file')
+        if uploaded_file is None:
+            messages.error(request, 'Choose a CSV file to import.')
+        else:
+            try:
+                result = import_games_csv(uploaded_file, request.user)
+            except GameImportError as e:
+                messages.error(request, str(e))
+            else:
+                if result['created']:
+                    messages.success(request, f'{result["created"]} games added successfully!')
+                if not result['errors']:
+                    return redirect('games:game_list')
+                messages.error(request, f'{len(result["errors"])} rows could not be imported, fix them and upload only those rows again.')
+    
+    return render(request, 'games/import_games.html', {'result': result, 'max_rows': MAX_IMPORT_ROWS})
+
 def game_detail(request, game_id):
     """Display detailed information about a specific game"""
     game = get_object_or_404(Game, id=game_id)
@@ -138,261 +174,215 @@ def admin_only_games(request):
     
     # Handle CSV export
     if request.GET.get('export') == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="games_export.csv"'
-        
-        writer = csv.writer(response)
-        # Write header row
-        writer.writerow([
-            'Game ID', 'Game Name', 'First Name', 'Last Name', 'Email', 'Phone Number', 'Payment Choice', 'Price', 'Condition', 'Missing Pieces', 
-            'Missing Pieces Description', 'Smoking House', 'Musty Smell', 
-            'Pet Exposure', 'Printed', 'Received', 'Received Date', 'Drop Off Location', 'Created Date'
-        ])
-        
-        # Write data rows
-        for game in games:
-            # Get payment choice display text
-            payment_choice_display = ''
-            if hasattr(game.user, 'profile') and game.user.profile.payment_choice:
-                if game.user.profile.payment_choice == 'cash_40':
-                    payment_choice_display = 'Cash (40%)'
-                elif game.user.profile.payment_choice == 'credit_70':
-                    payment_choice_display = 'Store Credit (70%)'
-            
-            writer.writerow([
-                game.id,
-                game.name,
-                game.user.first_name or '',
-                game.user.last_name or '',
-                game.user.email or '',
-                game.user.profile.phone_number if hasattr(game.user, 'profile') else '',
-                payment_choice_display,
-                game.price,
-                game.get_condition_display(),
-                'Yes' if game.missing_pieces else 'No',
-                game.description_of_missing_pieces or '',
-                'Yes' if game.smoking_house else 'No',
-                'Yes' if game.musty_smell else 'No',
-                game.get_pet_display(),
-                'Yes' if game.printed else 'No',
-                'Yes' if game.received else 'No',
-                game.received_date.strftime('%Y-%m-%d %H:%M:%S') if game.received_date else '',
-                game.user.profile.dropoff_location if hasattr(game.user, 'profile') else '',
-                game.created_at.strftime('%Y-%m-%d %H:%M:%S')
-            ])
-        
-        return response
+        # Streamed so the catalogue is never loaded in memory, add gzip=true for a compressed download
+        return streaming_csv_response(game_csv_rows(games), 'games_export.csv', compress=request.GET.get('gzip') == 'true')
     
     # Handle LaTeX export
     if request.GET.get('export') == 'latex':
-        # Create exports directory if it doesn't exist
-        exports_dir = settings.EXPORTS_ROOT
-        if not os.path.exists(exports_dir):
-            os.makedirs(exports_dir)
-        
-        # Create a temporary directory for LaTeX files
-        import tempfile
-        import shutil
+        if not games.exists():
+            messages.error(request, 'No games match the current filters.')
+            return redirect('games:admin_only_games')
         
-        # Create a temporary directory
-        temp_dir = tempfile.mkdtemp()
+        # Queue the export, the labels are compiled by the export worker
+        sheet_layout = request.GET.get('layout', 'labels')
+        if sheet_layout not in dict(ExportJob.SHEET_LAYOUT_CHOICES):
+            sheet_layout = 'labels'
+        label_backend = request.GET.get('backend', 'latex')
+        if label_backend not in dict(ExportJob.LABEL_BACKEND_CHOICES):
+            label_backend = 'latex'
+        job = enqueue_label_export(games, request.user, sheet_layout=sheet_layout, label_backend=label_backend)
+        messages.success(request, f'Label export #{job.pk} queued for {job.total} games ({job.get_sheet_layout_display()}, {job.get_label_backend_display()}). Progress is shown below and the "printed" field will be set to True for the generated labels.')
         
-        try:
-            # Read the LaTeX template
-            template_path = os.path.join(settings.BASE_DIR, 'games', 'templates', 'export_templates', 'tex_template.txt')
-            
-            with open(template_path, 'r', encoding='utf-8') as f:
-                template_content = f.read()
-            
-            # Track successful PDF generations
-            successful_pdfs = []
-            failed_pdfs = []
-            
-            # Generate LaTeX files for each game and convert to PDF
-            for game in games:
-                # Create filename for this game
-                safe_name = "".join(c for c in game.name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                safe_name = safe_name.replace(' ', '_')
-                tex_filename = f"game_{game.id}_{safe_name}.tex"
-                pdf_filename = f"game_{game.id}_{safe_name}.pdf"
-                
-                tex_filepath = os.path.join(temp_dir, tex_filename)
-                pdf_filepath = os.path.join(exports_dir, pdf_filename)
-                
-                # Replace template placeholders with actual values
-                game_content = template_content.replace('game.id', str(game.id))
-                game_content = game_content.replace('game.condition', game.get_condition_display())
-                game_content = game_content.replace('game.price', str(game.price))
-                
-                # Handle missing components
-                if game.missing_pieces:
-                    missing_components = f"Missing Components: {game.description_of_missing_pieces or 'Yes'}"
-                else:
-                    missing_components = "All Components Present"
-                game_content = game_content.replace('missingcomponents', missing_components)
-                
-                # Handle smoking household
-                if game.smoking_house:
-                    smoking_household = "Smoking Household: Yes"
-                else:
-                    smoking_household = "Smoking Household: No"
-                game_content = game_content.replace('smokinghousehold', smoking_household)
-                
-                # Handle animal condition
-                if game.pet != 'none':
-                    animal_condition = f"Animal Exposure: {game.get_pet_display()}"
-                else:
-                    animal_condition = "Animal Exposure: None"
-                game_content = game_content.replace('animalcondition', animal_condition)
-                
-                # Handle musty smell
-                if game.musty_smell:
-                    musty_smell = "Musty Smell: Yes"
-                else:
-                    musty_smell = "Musty Smell: No"
-                game_content = game_content.replace('mustysmell', musty_smell)
-                
-                # Write the LaTeX file
-                with open(tex_filepath, 'w', encoding='utf-8') as f:
-                    f.write(game_content)
-                
-                # Convert LaTeX to PDF using pdflatex
-                try:
-                    # Run pdflatex command
-                    result = subprocess.call([
-                        '/usr/bin/pdflatex',  # Use absolute path
-                        # 'pdflatex',
-                        '-interaction=nonstopmode',
-                        '-output-directory=' + temp_dir,
-                        tex_filepath
-                    ], cwd=temp_dir)
-                    
-                    # Check if PDF was generated successfully
-                    generated_pdf = os.path.join(temp_dir, pdf_filename)
-                    if result == 0 and os.path.exists(generated_pdf):
-                        # Move PDF to exports directory
-                        shutil.move(generated_pdf, pdf_filepath)
-                        successful_pdfs.append(pdf_filename)
-                        
-                        # Update the game's printed field to True since PDF was generated
-                        game.printed = True
-                        game.save()
-                    else:
-                        failed_pdfs.append(f"{game.name} (LaTeX compilation failed)")
-                        
-                except Exception as e:
-                    failed_pdfs.append(f"{game.name} (Error: {str(e)})")
-            
-            # Clean up temporary LaTeX files and auxiliary files
-            for root, dirs, files in os.walk(temp_dir):
-                for file in files:
-                    if file.endswith(('.tex', '.aux', '.log', '.out')):
-                        try:
-                            os.remove(os.path.join(root, file))
-                        except:
-                            pass
-            
-            # Show success/error messages
-            if successful_pdfs:
-                messages.success(request, f'Successfully generated {len(successful_pdfs)} PDF files in the exports folder. The "printed" field has been set to True for these games.')
-            if failed_pdfs:
-                messages.error(request, f'Failed to generate PDFs for: {", ".join(failed_pdfs)}')
-            
-            # Redirect back to the admin dashboard
-            return redirect('games:admin_only_games')
-            
-        finally:
-            # Clean up temporary directory
-            shutil.rmtree(temp_dir)
+        # Redirect back to the admin dashboard
+        return redirect('games:admin_only_games')
     
     # Handle PDF merge
     if request.GET.get('export') == 'merge':
-        exports_dir = settings.EXPORTS_ROOT
-        
-        if not os.path.exists(exports_dir):
-            messages.error(request, 'No exports folder found. Please generate PDFs first.')
-            return redirect('games:admin_only_games')
-        
-        # Get all PDF files in the exports directory
-        pdf_files = [f for f in os.listdir(exports_dir) if f.endswith('.pdf')]
-        
-        if not pdf_files:
-            messages.error(request, 'No PDF files found in the exports folder. Please generate PDFs first.')
-            return redirect('games:admin_only_games')
+        # Only the sheets of this admin's finished exports, other admins' exports are left alone
+        jobs = list(ExportJob.objects.filter(created_by=request.user, status='done').exclude(output_file='').order_by('created_at'))
+        job_workspaces = [os.path.dirname(os.path.join(settings.EXPORTS_ROOT, job.output_file)) for job in jobs]
         
-        # Sort PDF files by name for consistent ordering
-        pdf_files.sort()
-        
-        # Create input file list for pdftk
-        input_files = []
-        for pdf_file in pdf_files:
-            input_files.append(os.path.join(exports_dir, pdf_file))
-        
-        # Create merged PDF filename with timestamp
-        from datetime import datetime
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        merged_filename = f"merged_games_{timestamp}.pdf"
-        merged_filepath = os.path.join(exports_dir, merged_filename)
+        workspace = workspaces.merge_workspace()
+        workspaces.write_manifest(workspace, created_by=request.user.username, status='merging', jobs=[job.pk for job in jobs])
+        merged_filename = f"merged_games_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        merged_filepath = os.path.join(workspace, merged_filename)
         
         try:
-            # Use pdftk to merge PDFs
-            # pdftk input1.pdf input2.pdf ... cat output merged.pdf
-            cmd = ['/usr/bin/pdftk'] + input_files + ['cat', 'output', merged_filepath]
-            
-            result = subprocess.call(cmd)
-            
-            if result == 0 and os.path.exists(merged_filepath):
-                # Read the merged PDF and return it as download
-                with open(merged_filepath, 'rb') as f:
-                    response = HttpResponse(f.read(), content_type='application/pdf')
-                    response['Content-Disposition'] = f'attachment; filename="{merged_filename}"'
-                
-                # Delete all individual PDF files after successful download
-                for pdf_file in pdf_files:
+            with ExitStack() as stack:
+                # Shared locks keep the sheets from being swept while they are merged
+                input_files = []
+                for job, job_workspace in zip(jobs, job_workspaces):
                     try:
-                        os.remove(os.path.join(exports_dir, pdf_file))
-                    except:
-                        pass
-                
-                # Delete the merged PDF file as well
-                try:
-                    os.remove(merged_filepath)
-                except:
-                    pass
+                        stack.enter_context(workspaces.workspace_lock(job_workspace, shared=True))
+                    except FileNotFoundError:
+                        continue
+                    sheet_filepath = os.path.join(settings.EXPORTS_ROOT, job.output_file)
+                    if os.path.exists(sheet_filepath):
+                        input_files.append(sheet_filepath)
                 
-                return response
-            else:
-                messages.error(request, 'Failed to merge PDFs. Please check if pdftk is installed.')
-                return redirect('games:admin_only_games')
+                if not input_files:
+                    workspaces.remove_workspace(workspace)
+                    messages.error(request, 'No generated PDFs found. Please generate PDFs first.')
+                    return redirect('games:admin_only_games')
                 
+                # pdftk when installed, pypdf otherwise
+                merged = labels.merge_pdfs(input_files, merged_filepath)
         except Exception as e:
+            workspaces.remove_workspace(workspace)
             messages.error(request, f'Error merging PDFs: {str(e)}')
             return redirect('games:admin_only_games')
+        
+        if not merged:
+            workspaces.remove_workspace(workspace)
+            messages.error(request, 'Failed to merge PDFs. Please check if pdftk or pypdf is installed.')
+            return redirect('games:admin_only_games')
+        
+        workspaces.write_manifest(workspace, status='done', files=[merged_filename])
+        
+        def remove_merged_exports():
+            for job_workspace in job_workspaces:
+                workspaces.remove_workspace(job_workspace)
+        
+        # Stream the merged PDF from disk. Its workspace is deleted when the
+        # response is closed, the merged exports only once the download
+        # completed. A resumed download would get another merge, so no ranges
+        return FileDownloadResponse(
+            request, merged_filepath, merged_filename,
+            cleanup=lambda: workspaces.remove_workspace(workspace),
+            sent_cleanup=remove_merged_exports,
+            ranged=False,
+        )
+    
+    current_filters = {
+        'game_id': game_id_filter,
+        'condition': condition_filter,
+        'printed': printed_filter,
+        'received': received_filter,
+        'first_name': first_name_filter,
+        'last_name': last_name_filter,
+        'drop_off_location': drop_off_filter,
+    }
+    filter_query = urlencode({key: value for key, value in current_filters.items() if value})
+    
+    # Sort and paginate the table, the exports above work on the full filtered set
+    sort = request.GET.get('sort', DEFAULT_SORT)
+    if sort not in GAME_SORTS:
+        sort = DEFAULT_SORT
+    direction = 'asc' if request.GET.get('dir') == 'asc' else 'desc'
+    page, next_cursor = games_page(sort_games(games, sort, direction), sort, direction, request.GET.get('cursor'))
+    
+    context = {
+        'games': page,
+        'next_cursor': next_cursor,
+        'current_sort': sort,
+        'current_dir': direction,
+        'filter_query': filter_query,
+        'current_filters': current_filters,
+        'sheet_layouts': ExportJob.SHEET_LAYOUT_CHOICES,
+        'label_backends': ExportJob.LABEL_BACKEND_CHOICES,
+    }
+    
+    # HTMX requests only need the next rows or the refreshed table
+    if request.htmx and request.GET.get('cursor'):
+        return render(request, 'partials/admin_games_rows.html', context)
+    
+    context['total_count'] = cached_count(games, f'admin_games_count:{filter_query}')
+    if request.htmx:
+        return render(request, 'partials/admin_games_table.html', context)
     
     # Get unique values for filter dropdowns
     conditions = Game.CONDITION_CHOICES
-    first_names = Game.objects.values_list('user__first_name', flat=True).distinct().order_by('user__first_name').exclude(user__first_name='')
-    last_names = Game.objects.values_list('user__last_name', flat=True).distinct().order_by('user__last_name').exclude(user__last_name='')
+    seller_names = get_seller_names()
     
     # Get drop off location choices from Profile model (not from Game model)
     from a_users.models import Profile
     drop_off_locations = Profile.DROPOFF_LOCATION_CHOICES
     
-    context = {
-        'games': games,
+    context.update({
         'conditions': conditions,
-        'first_names': first_names,
-        'last_names': last_names,
+        'first_names': seller_names['first_names'],
+        'last_names': seller_names['last_names'],
         'drop_off_locations': drop_off_locations,
-        'current_filters': {
-            'game_id': game_id_filter,
-            'condition': condition_filter,
-            'printed': printed_filter,
-            'received': received_filter,
-            'first_name': first_name_filter,
-            'last_name': last_name_filter,
-            'drop_off_location': drop_off_filter,
-        }
-    }
+        **recent_export_jobs(),
+    })
     
     return render(request, 'games/admin_only_games.html', context)
+
+@user_passes_test(is_admin_user)
+def game_label(request, game_id):
+    """Admin-only view returning the label of a single game, compiled on demand (add backend=native to skip pdflatex)"""
+    game = get_object_or_404(Game, id=game_id)
+    
+    if request.GET.get('backend') == 'native':
+        return FileResponse(io.BytesIO(label_pdf.render_label(game)), as_attachment=True, filename=f"{labels.label_filename(game)}.pdf", content_type='application/pdf')
+    
+    try:
+        pdf_filepath = label_cache.get_label_pdf(game)
+    except Exception as e:
+        messages.error(request, f'Error generating label: {str(e)}')
+        return redirect('games:admin_only_games')
+    
+    if pdf_filepath is None:
+        messages.error(request, f'Failed to generate the label for {game.name} (LaTeX compilation failed)')
+        return redirect('games:admin_only_games')
+    
+    return FileResponse(open(pdf_filepath, 'rb'), as_attachment=True, filename=f"{labels.label_filename(game)}.pdf", content_type='application/pdf')
+
+@user_passes_test(is_admin_user)
+@require_POST
+def game_intake(request):
+    """Admin-only bulk intake: mark a list of scanned game ids as received or printed"""
+    action = request.POST.get('action', '')
+    game_ids = parse_game_ids(request.POST.get('game_ids', ''))
+    if action not in INTAKE_ACTIONS or not game_ids:
+        messages.error(request, 'Enter at least one game ID and choose whether to mark the games received or printed.')
+        return redirect('games:admin_only_games')
+    
+    result = mark_games(game_ids, action)
+    messages.success(request, f'{result["updated"]} games marked as {action}, {result["unchanged"]} were already {action}.')
+    if result['missing']:
+        messages.error(request, f'Unknown game IDs: {", ".join(str(game_id) for game_id in result["missing"])}')
+    return redirect('games:admin_only_games')
+
+@user_passes_test(is_admin_user)
+def scan_station(request):
+    """Admin-only page of the drop-off counter, each scanned label marks its game as received"""
+    return render(request, 'games/scan_station.html')
+
+@user_passes_test(is_admin_user)
+@require_POST
+def scan_code(request):
+    """Admin-only endpoint of the scan station, returns a result fragment (or JSON outside HTMX)"""
+    code = request.POST.get('code', '')
+    game_id = parse_scan_code(code)
+    if game_id is None:
+        result = {'code': code, 'status': 'invalid'}
+    elif request.POST.get('undo'):
+        # Only the state set by that scan is reverted
+        received_date = parse_datetime(request.POST.get('received_date', ''))
+        result = {'game_id': game_id, 'status': 'undone' if undo_scan(game_id, received_date) else 'kept'}
+    else:
+        result = scan_game(game_id)
+    
+    if not request.htmx:
+        return JsonResponse({key: value for key, value in result.items() if key not in ('scanned_at', 'cached_at')})
+    return render(request, 'partials/scan_result.html', {'scan': result})
+
+@user_passes_test(is_admin_user)
+def export_job_list(request):
+    """Admin-only partial listing recent label exports, polled by HTMX while a job is active"""
+    return render(request, 'partials/export_jobs.html', recent_export_jobs())
+
+@user_passes_test(is_admin_user)
+def export_job_download(request, job_id):
+    """Admin-only download of the label sheet generated by an export job"""
+    job = get_object_or_404(ExportJob, id=job_id)
+    if not job.output_file:
+        raise Http404('This export has no generated sheet.')
+    
+    sheet_filepath = os.path.join(settings.EXPORTS_ROOT, job.output_file)
+    if not os.path.exists(sheet_filepath):
+        messages.error(request, f'The sheet of export #{job.pk} is no longer in the exports folder.')
+        return redirect('games:admin_only_games')
+    
+    return FileDownloadResponse(request, sheet_filepath, os.path.basename(job.output_file))
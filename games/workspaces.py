@@ -0,0 +1,146 @@
+"""
+Isolated export workspaces under ``settings.EXPORTS_ROOT``.
+
+Every label export job writes into its own directory ``jobs/job_<id>/`` and
+every merge download into ``jobs/merge_<token>/``, so concurrent exports of
+several admins, gunicorn workers or nodes sharing the exports folder never see
+each other's files. A workspace holds:
+
+- ``manifest.json``: owner, status and files of the workspace, always replaced
+  atomically so readers never see a half written manifest;
+- ``.lock``: lock file taken exclusively while the workspace is written or
+  removed and shared while its files are read. ``flock`` locks work across
+  processes and, on Linux, across nodes sharing the folder over NFS.
+
+Workspaces older than ``settings.EXPORT_WORKSPACE_TTL`` that nobody holds a
+lock on are removed by ``sweep_workspaces``.
+"""
+import errno
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+MANIFEST_NAME = 'manifest.json'
+LOCK_NAME = '.lock'
+
+
+def workspaces_root():
+    return os.path.join(settings.EXPORTS_ROOT, 'jobs')
+
+
+def job_workspace(job):
+    """Return the workspace directory of an export job, creating it if needed"""
+    path = os.path.join(workspaces_root(), f'job_{job.pk}')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def merge_workspace():
+    """Create the workspace of a merge download"""
+    path = os.path.join(workspaces_root(), f'merge_{uuid.uuid4().hex}')
+    os.makedirs(path)
+    return path
+
+
+def relative_path(path):
+    """Return a path relative to EXPORTS_ROOT, as stored in ExportJob.output_file"""
+    return os.path.relpath(path, settings.EXPORTS_ROOT)
+
+
+class WorkspaceLocked(Exception):
+    """Raised when a non-blocking lock of a workspace is held by someone else"""
+
+
+@contextmanager
+def workspace_lock(path, shared=False, blocking=True):
+    """Hold the lock of a workspace for the duration of the block"""
+    fd = os.open(os.path.join(path, LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o664)
+    flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+    if not blocking:
+        flags |= fcntl.LOCK_NB
+    try:
+        try:
+            fcntl.flock(fd, flags)
+        except OSError as e:
+            if e.errno in (errno.EACCES, errno.EAGAIN, errno.EWOULDBLOCK):
+                raise WorkspaceLocked(path)
+            raise
+        yield path
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+def read_manifest(path):
+    """Return the manifest of a workspace, an empty dict if it has none yet"""
+    try:
+        with open(os.path.join(path, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_manifest(path, **values):
+    """Update the manifest of a workspace with the given values, atomically"""
+    manifest = read_manifest(path)
+    manifest.setdefault('created_at', time.time())
+    manifest.update(values, updated_at=time.time())
+    fd, temp_path = tempfile.mkstemp(dir=path, prefix='.manifest', suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, os.path.join(path, MANIFEST_NAME))
+    return manifest
+
+
+def remove_workspace(path, blocking=True):
+    """Delete a workspace once nobody reads it, return False if it is in use and blocking is False"""
+    if not os.path.isdir(path):
+        return True
+    try:
+        with workspace_lock(path, blocking=blocking):
+            # Move it out of the way first so no new reader can find it
+            trash = f'{path}.deleted-{uuid.uuid4().hex}'
+            os.rename(path, trash)
+    except WorkspaceLocked:
+        return False
+    except FileNotFoundError:
+        return True
+    shutil.rmtree(trash, ignore_errors=True)
+    return True
+
+
+def sweep_workspaces(max_age=None):
+    """
+    Remove the workspaces not updated for more than max_age seconds (default
+    settings.EXPORT_WORKSPACE_TTL) and not locked by a running export or
+    download. Returns the number of workspaces removed.
+    """
+    if max_age is None:
+        max_age = settings.EXPORT_WORKSPACE_TTL
+    root = workspaces_root()
+    if not os.path.isdir(root):
+        return 0
+
+    now = time.time()
+    removed = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if not os.path.isdir(path):
+            continue
+        if '.deleted-' in name:
+            # Leftover of an interrupted removal
+            shutil.rmtree(path, ignore_errors=True)
+            continue
+        updated_at = read_manifest(path).get('updated_at') or os.path.getmtime(path)
+        if now - updated_at <= max_age:
+            continue
+        if remove_workspace(path, blocking=False):
+            removed += 1
+    return removed
@@ -1,22 +1,94 @@
+import datetime
+
+from django.conf import settings
 from django.contrib import admin
-from .models import HoneypotAttempt
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import HoneypotAttempt, HoneypotDailyRollup
+from .rollups import day_bounds
+
+# IPs offered by the IP filter
+IP_FILTER_LIMIT = 50
+
+
+class RollupIPFilter(admin.SimpleListFilter):
+    """IP filter built from the daily rollups, instead of a DISTINCT over every attempt"""
+    title = 'IP address (most active)'
+    parameter_name = 'ip_address'
+
+    def lookups(self, request, model_admin):
+        since = timezone.localdate() - datetime.timedelta(days=settings.HONEYPOT_RETENTION_DAYS)
+        rows = (
+            HoneypotDailyRollup.objects.filter(date__gte=since)
+            .values('ip_address')
+            .annotate(total=Sum(F('page_views') + F('login_attempts')))
+            .order_by('-total')[:IP_FILTER_LIMIT]
+        )
+        return [(row['ip_address'], f"{row['ip_address']} ({row['total']})") for row in rows]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(ip_address=self.value())
+        return queryset
+
+
+class RollupDayFilter(admin.SimpleListFilter):
+    """Day filter built from the daily rollups, replaces the date hierarchy and its DISTINCT over timestamps"""
+    title = 'day'
+    parameter_name = 'day'
+
+    def lookups(self, request, model_admin):
+        rows = (
+            HoneypotDailyRollup.objects.values('date')
+            .annotate(total=Sum(F('page_views') + F('login_attempts')))
+            .order_by('-date')[:settings.HONEYPOT_RETENTION_DAYS]
+        )
+        return [(row['date'].isoformat(), f"{row['date']:%b %d, %Y} ({row['total']})") for row in rows]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            day = datetime.date.fromisoformat(self.value())
+        except ValueError:
+            return queryset.none()
+        start, end = day_bounds(day)
+        return queryset.filter(timestamp__gte=start, timestamp__lt=end)
+
 
 @admin.register(HoneypotAttempt)
 class HoneypotAttemptAdmin(admin.ModelAdmin):
     list_display = ['ip_address', 'username', 'is_login_attempt', 'timestamp', 'short_user_agent']
-    list_filter = ['is_login_attempt', 'timestamp', 'ip_address']
+    list_filter = ['is_login_attempt', RollupDayFilter, RollupIPFilter]
     search_fields = ['ip_address', 'username', 'user_agent']
     readonly_fields = ['ip_address', 'user_agent', 'username', 'timestamp', 'is_login_attempt']
-    date_hierarchy = 'timestamp'
-    
+    # Counting every attempt on each page load gets slow on a large table
+    show_full_result_count = False
+
     def has_add_permission(self, request):
         """Prevent manual creation of honeypot attempts"""
         return False
-    
+
     def has_change_permission(self, request, obj=None):
         """Prevent editing of honeypot attempts"""
         return False
-    
+
     def has_delete_permission(self, request, obj=None):
         """Allow deletion for cleanup"""
         return True
+
+
+@admin.register(HoneypotDailyRollup)
+class HoneypotDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'ip_address', 'page_views', 'login_attempts', 'top_usernames', 'first_seen', 'last_seen']
+    list_filter = ['date']
+    search_fields = ['ip_address']
+    readonly_fields = ['date', 'ip_address', 'page_views', 'login_attempts', 'top_usernames', 'first_seen', 'last_seen']
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        """Rollups are computed by the rollup_honeypot command"""
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
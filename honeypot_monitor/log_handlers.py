@@ -0,0 +1,69 @@
+"""
+Non-blocking file logging of honeypot hits.
+
+Records are formatted in the request thread and put on an in-memory queue, a
+background ``QueueListener`` writes them to the log file so a burst of hits
+never waits on disk I/O.
+
+The handler is a plain ``logging.Handler`` owning its queue and listener:
+since Python 3.12 ``dictConfig`` configures ``QueueHandler`` subclasses itself
+(it passes them a queue and requires ``handlers``), which a handler taking a
+filename cannot satisfy.
+"""
+import copy
+import logging
+import os
+import queue
+from logging.handlers import QueueListener
+
+
+class QueuedFileHandler(logging.Handler):
+    """Handler queueing formatted records for a listener thread that writes them to a file"""
+
+    def __init__(self, filename, encoding='utf-8', level=logging.NOTSET):
+        super().__init__(level)
+        # Messages arrive already formatted by this handler's formatter
+        self.file_handler = logging.FileHandler(filename, encoding=encoding, delay=True)
+        self.queue = None
+        self.listener = None
+        self._pid = None
+
+    def _start(self):
+        # Threads do not survive a fork, each worker process starts its own listener
+        self._pid = os.getpid()
+        self.queue = queue.SimpleQueue()
+        self.listener = QueueListener(self.queue, self.file_handler)
+        self.listener.start()
+
+    def prepare(self, record):
+        """Return a copy of the record with its message formatted, safe to hand to another thread"""
+        message = self.format(record)
+        record = copy.copy(record)
+        record.message = message
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.stack_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            if self._pid != os.getpid():
+                self.acquire()
+                try:
+                    if self._pid != os.getpid():
+                        self._start()
+                finally:
+                    self.release()
+            self.queue.put_nowait(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        # Stopping the listener writes the records still in the queue
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+        self.file_handler.close()
+        super().close()
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from honeypot_monitor import rollups
+
+
+class Command(BaseCommand):
+    help = 'Summarize honeypot attempts per IP and day, then purge the raw attempts past the retention window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=settings.HONEYPOT_RETENTION_DAYS, help='Keep the raw attempts of this many days')
+        parser.add_argument('--no-purge', action='store_true', help='Only update the rollups')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Attempts deleted per DELETE statement')
+
+    def handle(self, *args, **options):
+        days = rollups.rollup_attempts()
+        if days:
+            self.stdout.write(f'Rolled up {len(days)} days ({days[0]} to {days[-1]})')
+        else:
+            self.stdout.write('No honeypot attempts to roll up')
+
+        if options['no_purge']:
+            return
+        deleted = rollups.purge_attempts(retention_days=options['retention_days'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {deleted} attempts older than {options["retention_days"]} days'))
@@ -0,0 +1,171 @@
+"""
+Early rejection of repeat honeypot offenders.
+
+``HoneypotBlockMiddleware`` sits first in ``MIDDLEWARE`` and answers requests
+of known offenders with a static 403 before sessions, CSRF, authentication or
+any view run. Offenders are kept in memory by each worker:
+
+- IPs with at least ``HONEYPOT_BLOCK_THRESHOLD`` recorded HoneypotAttempts in
+  the last ``HONEYPOT_BLOCK_TTL`` seconds, reloaded from the database every
+  ``HONEYPOT_BLOCK_REFRESH`` seconds (through the cache, shared by all
+  workers, when ``HONEYPOT_BLOCK_SHARED_CACHE`` is set);
+- IPs hitting the honeypot faster than their token bucket allows
+  (``HONEYPOT_RATE_BURST`` hits, refilled at ``HONEYPOT_RATE_PER_MINUTE``),
+  blocked at once without waiting for the next reload.
+
+An offender is released ``HONEYPOT_BLOCK_TTL`` seconds after its last hit.
+
+Behind nginx every request comes from the proxy, so the client address is
+read from ``HONEYPOT_CLIENT_IP_HEADER`` (``X-Real-IP`` set by nginx
+``proxy_params``) when the request comes from one of
+``HONEYPOT_TRUSTED_PROXIES``. Loopback and proxy addresses are never blocked,
+a misconfigured proxy then blocks nobody instead of everybody.
+"""
+import ipaddress
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+OFFENDERS_CACHE_KEY = 'honeypot_offenders'
+# Token buckets kept per worker, the least recently seen IPs are dropped first
+MAX_BUCKETS = 10000
+
+
+class OffenderList:
+    """Blocked IPs and honeypot token buckets of a worker process"""
+
+    def __init__(self):
+        self._blocked = {}  # ip -> time.time() the block expires
+        self._buckets = OrderedDict()  # ip -> (tokens, time.monotonic() of last refill)
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._refreshed_at = None
+
+    def is_blocked(self, ip):
+        expires_at = self._blocked.get(ip)
+        if expires_at is None:
+            return False
+        if expires_at < time.time():
+            with self._lock:
+                self._blocked.pop(ip, None)
+            return False
+        return True
+
+    def block(self, ip):
+        with self._lock:
+            self._blocked[ip] = time.time() + settings.HONEYPOT_BLOCK_TTL
+
+    def hit(self, ip):
+        """Take a token from the bucket of an IP hitting the honeypot, block it and return True once the bucket is empty"""
+        now = time.monotonic()
+        burst = settings.HONEYPOT_RATE_BURST
+        with self._lock:
+            tokens, refilled_at = self._buckets.pop(ip, (burst, now))
+            tokens = min(burst, tokens + (now - refilled_at) * settings.HONEYPOT_RATE_PER_MINUTE / 60)
+            if tokens >= 1:
+                self._buckets[ip] = (tokens - 1, now)
+                while len(self._buckets) > MAX_BUCKETS:
+                    self._buckets.popitem(last=False)
+                return False
+        self.block(ip)
+        return True
+
+    def refresh(self, force=False):
+        """Reload the offenders recorded in the database, at most every HONEYPOT_BLOCK_REFRESH seconds"""
+        now = time.monotonic()
+        if not force and self._refreshed_at is not None and now - self._refreshed_at < settings.HONEYPOT_BLOCK_REFRESH:
+            return
+        # One thread reloads, the others keep using the current list
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            self._refreshed_at = now
+            offenders = cache.get(OFFENDERS_CACHE_KEY) if settings.HONEYPOT_BLOCK_SHARED_CACHE else None
+            if offenders is None:
+                offenders = recorded_offenders()
+                if settings.HONEYPOT_BLOCK_SHARED_CACHE:
+                    cache.set(OFFENDERS_CACHE_KEY, offenders, settings.HONEYPOT_BLOCK_REFRESH)
+            with self._lock:
+                for ip, expires_at in offenders.items():
+                    self._blocked[ip] = max(expires_at, self._blocked.get(ip, 0))
+                expired = [ip for ip, expires_at in self._blocked.items() if expires_at < time.time()]
+                for ip in expired:
+                    del self._blocked[ip]
+        except DatabaseError:
+            # E.g. before the migrations ran, keep the current list
+            logger.exception('Failed to load the honeypot offenders')
+        finally:
+            self._refreshing.release()
+
+
+def client_ip(request):
+    """Return the address of the client, from the proxy header when a trusted proxy sent the request"""
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    header = settings.HONEYPOT_CLIENT_IP_HEADER
+    if header and remote_addr in settings.HONEYPOT_TRUSTED_PROXIES:
+        forwarded = request.META.get(header, '').split(',')[0].strip()
+        if forwarded:
+            return forwarded
+    return remote_addr
+
+
+def is_exempt(ip):
+    """Whether an address must never be blocked: loopback, trusted proxies or not an IP at all"""
+    if ip in settings.HONEYPOT_TRUSTED_PROXIES:
+        return True
+    try:
+        return ipaddress.ip_address(ip).is_loopback
+    except ValueError:
+        return True
+
+
+def recorded_offenders():
+    """Return {ip: block expiry timestamp} of the IPs with enough recent honeypot attempts"""
+    from .models import HoneypotAttempt
+
+    ttl = settings.HONEYPOT_BLOCK_TTL
+    rows = (
+        HoneypotAttempt.objects.filter(timestamp__gte=timezone.now() - timedelta(seconds=ttl))
+        .values('ip_address')
+        .annotate(hits=Count('id'), last_hit=Max('timestamp'))
+        .filter(hits__gte=settings.HONEYPOT_BLOCK_THRESHOLD)
+        .values_list('ip_address', 'last_hit')
+    )
+    return {ip: last_hit.timestamp() + ttl for ip, last_hit in rows}
+
+
+offenders = OffenderList()
+
+
+class HoneypotBlockMiddleware:
+    """Reject repeat honeypot offenders before the rest of the middleware stack"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.honeypot_path = None
+
+    def __call__(self, request):
+        if not settings.HONEYPOT_BLOCK:
+            return self.get_response(request)
+
+        ip = client_ip(request)
+        if is_exempt(ip):
+            return self.get_response(request)
+        offenders.refresh()
+        if self.honeypot_path is None:
+            self.honeypot_path = reverse('honeypot_admin')
+        if offenders.is_blocked(ip) or (request.path_info == self.honeypot_path and offenders.hit(ip)):
+            return HttpResponse(b'Forbidden', status=403, content_type='text/plain')
+        return self.get_response(request)
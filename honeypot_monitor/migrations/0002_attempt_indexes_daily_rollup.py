@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('honeypot_monitor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HoneypotDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('ip_address', models.GenericIPAddressField()),
+                ('page_views', models.PositiveIntegerField(default=0)),
+                ('login_attempts', models.PositiveIntegerField(default=0)),
+                ('top_usernames', models.JSONField(blank=True, default=list, help_text='Most tried usernames as [username, attempts] pairs')),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Honeypot Daily Rollup',
+                'verbose_name_plural': 'Honeypot Daily Rollups',
+                'ordering': ['-date', '-login_attempts', '-page_views'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='honeypotattempt',
+            index=models.Index(fields=['ip_address', 'timestamp'], name='honeypot_ip_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='honeypotattempt',
+            index=models.Index(fields=['-timestamp'], name='honeypot_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='honeypotdailyrollup',
+            index=models.Index(fields=['ip_address', 'date'], name='honeypot_rollup_ip_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='honeypotdailyrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'ip_address'), name='honeypot_rollup_date_ip_unique'),
+        ),
+    ]
@@ -15,6 +15,11 @@ class HoneypotAttempt(models.Model):
         ordering = ['-timestamp']
         verbose_name = 'Honeypot Attempt'
         verbose_name_plural = 'Honeypot Attempts'
+        indexes = [
+            # Attempts of one IP (admin filter, offender reload) and time ranges (purge, daily rollup)
+            models.Index(fields=['ip_address', 'timestamp'], name='honeypot_ip_timestamp_idx'),
+            models.Index(fields=['-timestamp'], name='honeypot_timestamp_idx'),
+        ]
     
     def __str__(self):
         action = 'Login attempt' if self.is_login_attempt else 'Page access'
@@ -26,3 +31,32 @@ class HoneypotAttempt(models.Model):
         if len(self.user_agent) > 50:
             return self.user_agent[:50] + '...'
         return self.user_agent
+
+
+class HoneypotDailyRollup(models.Model):
+    """Attempts of one IP on one day, kept after the raw attempts are purged (see rollups.py)"""
+    date = models.DateField()
+    ip_address = models.GenericIPAddressField()
+    page_views = models.PositiveIntegerField(default=0)
+    login_attempts = models.PositiveIntegerField(default=0)
+    top_usernames = models.JSONField(default=list, blank=True, help_text='Most tried usernames as [username, attempts] pairs')
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-date', '-login_attempts', '-page_views']
+        verbose_name = 'Honeypot Daily Rollup'
+        verbose_name_plural = 'Honeypot Daily Rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'ip_address'], name='honeypot_rollup_date_ip_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['ip_address', 'date'], name='honeypot_rollup_ip_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ip_address} on {self.date}: {self.total_attempts} attempts"
+
+    @property
+    def total_attempts(self):
+        return self.page_views + self.login_attempts
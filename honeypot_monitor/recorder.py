@@ -0,0 +1,83 @@
+"""
+Buffered recording of honeypot attempts.
+
+Scanners hit the fake admin in bursts of thousands of requests. Instead of one
+INSERT per hit inside the request, attempts are collected in memory and
+written by a background thread with ``bulk_create``, every
+``settings.HONEYPOT_FLUSH_SIZE`` attempts or every
+``settings.HONEYPOT_FLUSH_INTERVAL`` milliseconds, whichever comes first.
+Whatever is still buffered is written when the worker process exits.
+"""
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import HoneypotAttempt
+
+logger = logging.getLogger(__name__)
+
+
+class AttemptRecorder:
+    """Per-process buffer of honeypot attempts flushed by a background thread"""
+
+    def __init__(self):
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+
+    @property
+    def flush_size(self):
+        return getattr(settings, 'HONEYPOT_FLUSH_SIZE', 100)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'HONEYPOT_FLUSH_INTERVAL', 500) / 1000
+
+    def _start(self):
+        # Threads do not survive a fork, each worker process starts its own
+        self._pid = os.getpid()
+        self._wakeup = threading.Event()
+        threading.Thread(target=self._run, name='honeypot-recorder', daemon=True).start()
+
+    def record(self, **fields):
+        """Buffer an attempt, it is written to the database shortly after"""
+        attempt = HoneypotAttempt(**fields)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._buffer = []
+                self._start()
+            self._buffer.append(attempt)
+            full = len(self._buffer) >= self.flush_size
+        if full:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Write the buffered attempts, return how many were written"""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+        # The flushing thread keeps its own connection, drop it if it expired
+        close_old_connections()
+        try:
+            HoneypotAttempt.objects.bulk_create(batch, batch_size=500)
+        except Exception:
+            logger.exception('Failed to record %d honeypot attempts', len(batch))
+            return 0
+        return len(batch)
+
+
+recorder = AttemptRecorder()
+# Workers stopped by the application server exit normally, flush what is left
+atexit.register(recorder.flush)
@@ -0,0 +1,118 @@
+"""
+Daily rollups and retention of honeypot attempts.
+
+Raw HoneypotAttempt rows are only kept for ``settings.HONEYPOT_RETENTION_DAYS``
+days. Before they are purged, each day is summarized in HoneypotDailyRollup:
+one row per IP and day with its page views, login attempts and most tried
+usernames. A day is always rolled up again from its raw rows, so running the
+rollup several times (or during the day) is safe, and raw rows are purged
+whole days at a time, only once their day is rolled up.
+
+The raw table is not partitioned by day. Django has no support for
+partitioned tables: on PostgreSQL the primary key would have to include the
+timestamp, and the daily partitions would need creating ahead of time outside
+the migrations. SQLite has no partitioning at all. Purging whole days through
+the timestamp index keeps the table within the retention window on both
+databases instead.
+"""
+import datetime
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from .models import HoneypotAttempt, HoneypotDailyRollup
+
+# Usernames kept per IP and day
+TOP_USERNAMES = 10
+
+
+def day_bounds(day):
+    """Return the aware datetimes of the start of day and of the next day"""
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+
+
+def rollup_day(day):
+    """Summarize the attempts of one day, replacing its previous rollup. Returns the number of IPs"""
+    start, end = day_bounds(day)
+    attempts = HoneypotAttempt.objects.filter(timestamp__gte=start, timestamp__lt=end)
+
+    usernames = defaultdict(Counter)
+    rows = attempts.filter(is_login_attempt=True).exclude(username__isnull=True).exclude(username='')
+    for ip, username, count in rows.values('ip_address', 'username').annotate(count=Count('id')).values_list('ip_address', 'username', 'count'):
+        usernames[ip][username] = count
+
+    rollups = [
+        HoneypotDailyRollup(
+            date=day,
+            ip_address=row['ip_address'],
+            page_views=row['page_views'],
+            login_attempts=row['login_attempts'],
+            top_usernames=[[username, count] for username, count in usernames[row['ip_address']].most_common(TOP_USERNAMES)],
+            first_seen=row['first_seen'],
+            last_seen=row['last_seen'],
+        )
+        for row in attempts.values('ip_address').annotate(
+            page_views=Count('id', filter=Q(is_login_attempt=False)),
+            login_attempts=Count('id', filter=Q(is_login_attempt=True)),
+            first_seen=Min('timestamp'),
+            last_seen=Max('timestamp'),
+        ).order_by()
+    ]
+    if not rollups:
+        # Nothing recorded, or already purged: keep what was rolled up before
+        return 0
+    with transaction.atomic():
+        HoneypotDailyRollup.objects.filter(date=day).delete()
+        HoneypotDailyRollup.objects.bulk_create(rollups, batch_size=1000)
+    return len(rollups)
+
+
+def rollup_attempts(until=None):
+    """
+    Roll up every day from the last rolled up day (which may have been
+    incomplete) or the first recorded attempt, up to until (default today).
+    Returns the list of days rolled up.
+    """
+    until = until or timezone.localdate()
+    last_rolled_up = HoneypotDailyRollup.objects.aggregate(last=Max('date'))['last']
+    if last_rolled_up is not None:
+        day = last_rolled_up
+    else:
+        first = HoneypotAttempt.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+        if first is None:
+            return []
+        day = timezone.localdate(first)
+
+    days = []
+    while day <= until:
+        rollup_day(day)
+        days.append(day)
+        day += datetime.timedelta(days=1)
+    return days
+
+
+def purge_attempts(retention_days=None, batch_size=10000):
+    """
+    Delete the raw attempts of the days older than retention_days (default
+    settings.HONEYPOT_RETENTION_DAYS) that are rolled up, in batches so the
+    table is never locked for long. Returns the number of attempts deleted.
+    """
+    if retention_days is None:
+        retention_days = settings.HONEYPOT_RETENTION_DAYS
+    last_rolled_up = HoneypotDailyRollup.objects.aggregate(last=Max('date'))['last']
+    if last_rolled_up is None:
+        return 0
+    # Whole days only, and never the last rolled up day, it may still be incomplete
+    oldest_kept = min(timezone.localdate() - datetime.timedelta(days=retention_days), last_rolled_up)
+    cutoff, _ = day_bounds(oldest_kept)
+
+    deleted = 0
+    while True:
+        ids = list(HoneypotAttempt.objects.filter(timestamp__lt=cutoff).order_by().values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += HoneypotAttempt.objects.filter(pk__in=ids).delete()[0]
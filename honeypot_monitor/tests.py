@@ -1,3 +1,194 @@
-from django.test import TestCase
+import copy
+import logging
+import logging.config
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import middleware
+from .models import HoneypotAttempt
+from .recorder import AttemptRecorder
+
+BLOCK_SETTINGS = {
+    'HONEYPOT_BLOCK': True,
+    'HONEYPOT_BLOCK_THRESHOLD': 3,
+    'HONEYPOT_RATE_BURST': 5,
+    'HONEYPOT_RATE_PER_MINUTE': 2,
+    'HONEYPOT_CLIENT_IP_HEADER': 'HTTP_X_REAL_IP',
+    'HONEYPOT_TRUSTED_PROXIES': ['127.0.0.1', '::1'],
+}
+
+
+@override_settings(**BLOCK_SETTINGS)
+class HoneypotBlockMiddlewareTests(TestCase):
+    """Check which clients the honeypot middleware blocks"""
+
+    def setUp(self):
+        # A fresh offender list per test, attempts are neither written by the recorder thread nor logged
+        patcher = mock.patch.object(middleware, 'offenders', middleware.OffenderList())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for name in ('recorder', 'logger'):
+            patcher = mock.patch(f'honeypot_monitor.views.{name}')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, path, **extra):
+        return self.client.get(path, **{'REMOTE_ADDR': '203.0.113.7', **extra})
+
+    def test_token_bucket_blocks_after_burst(self):
+        for _ in range(5):
+            self.assertEqual(self.get('/admin/').status_code, 200)
+        self.assertEqual(self.get('/admin/').status_code, 403)
+        # Blocked on every page, other clients are not
+        self.assertEqual(self.get('/').status_code, 403)
+        self.assertEqual(self.get('/', REMOTE_ADDR='203.0.113.8').status_code, 200)
+
+    def test_threshold_reload_blocks_recorded_offenders(self):
+        now = timezone.now()
+        HoneypotAttempt.objects.bulk_create(
+            [HoneypotAttempt(ip_address='203.0.113.7', user_agent='x', timestamp=now - timedelta(minutes=i)) for i in range(3)]
+            + [HoneypotAttempt(ip_address='203.0.113.8', user_agent='x', timestamp=now) for i in range(2)]
+        )
+        self.assertEqual(self.get('/').status_code, 403)
+        self.assertEqual(self.get('/', REMOTE_ADDR='203.0.113.8').status_code, 200)
+
+    def test_threshold_ignores_old_attempts(self):
+        old = timezone.now() - timedelta(days=2)
+        HoneypotAttempt.objects.bulk_create([HoneypotAttempt(ip_address='203.0.113.7', user_agent='x', timestamp=old) for i in range(3)])
+        self.assertEqual(self.get('/').status_code, 200)
+
+    def test_admin_users_dashboard_is_never_rate_limited(self):
+        for _ in range(20):
+            self.assertNotEqual(self.get('/admin/users/').status_code, 403)
+        self.assertEqual(self.get('/').status_code, 200)
+
+    def test_loopback_is_never_blocked(self):
+        HoneypotAttempt.objects.bulk_create([HoneypotAttempt(ip_address='127.0.0.1', user_agent='x') for i in range(3)])
+        for _ in range(10):
+            self.assertEqual(self.get('/admin/', REMOTE_ADDR='127.0.0.1').status_code, 200)
+        self.assertEqual(self.get('/', REMOTE_ADDR='127.0.0.1').status_code, 200)
+
+    def test_client_address_from_trusted_proxy_header(self):
+        for _ in range(6):
+            self.get('/admin/', REMOTE_ADDR='127.0.0.1', HTTP_X_REAL_IP='198.51.100.1')
+        self.assertEqual(self.get('/', REMOTE_ADDR='127.0.0.1', HTTP_X_REAL_IP='198.51.100.1').status_code, 403)
+        # The proxy itself and the other visitors behind it are not blocked
+        self.assertEqual(self.get('/', REMOTE_ADDR='127.0.0.1').status_code, 200)
+        self.assertEqual(self.get('/', REMOTE_ADDR='127.0.0.1', HTTP_X_REAL_IP='198.51.100.2').status_code, 200)
+
+    def test_header_from_untrusted_client_is_ignored(self):
+        for _ in range(6):
+            self.get('/admin/', HTTP_X_REAL_IP='198.51.100.1')
+        self.assertEqual(self.get('/', HTTP_X_REAL_IP='198.51.100.9').status_code, 403)
+        self.assertEqual(self.get('/', REMOTE_ADDR='127.0.0.1', HTTP_X_REAL_IP='198.51.100.1').status_code, 200)
+
+    @override_settings(HONEYPOT_BLOCK=False)
+    def test_disabled_blocks_nobody(self):
+        for _ in range(10):
+            self.assertEqual(self.get('/admin/').status_code, 200)
+        self.assertEqual(self.get('/').status_code, 200)
+
+
+class LoggingConfigTests(SimpleTestCase):
+    """Check that the LOGGING setting configures and writes the honeypot log"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.filename = os.path.join(self.directory.name, 'honeypot.log')
+        # Put back the logging Django configured once the test is done
+        self.addCleanup(logging.config.dictConfig, settings.LOGGING)
+
+    def configure(self):
+        config = copy.deepcopy(settings.LOGGING)
+        config['handlers']['file']['filename'] = self.filename
+        # Keep the console handler out of the test output
+        with mock.patch('sys.stderr'):
+            logging.config.dictConfig(config)
+        return logging.getLogger('honeypot').handlers[0]
+
+    def test_dict_config_accepts_file_handler(self):
+        handler = self.configure()
+        self.assertEqual(handler.level, logging.WARNING)
+        self.assertEqual(handler.formatter._fmt, settings.LOGGING['formatters']['verbose']['format'])
+
+    def test_records_are_written_by_listener(self):
+        handler = self.configure()
+        logging.getLogger('honeypot').warning('Honeypot hit from %s', '203.0.113.7')
+        logging.getLogger('honeypot').info('Below the handler level')
+        # Closing stops the listener, which writes what is still queued
+        handler.close()
+        with open(self.filename, encoding='utf-8') as log:
+            lines = log.read().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith('WARNING '))
+        self.assertTrue(lines[0].endswith('Honeypot hit from 203.0.113.7'))
+
+
+class AttemptRecorderTests(TestCase):
+    """Check when the buffered honeypot attempts are written"""
+
+    def attempt(self, number=0):
+        return {'ip_address': f'203.0.113.{number}', 'user_agent': 'curl/8.5.0', 'timestamp': timezone.now()}
+
+    @override_settings(HONEYPOT_FLUSH_SIZE=3)
+    def test_flush_on_size(self):
+        recorder = AttemptRecorder()
+        # Started in this process already, no flushing thread
+        recorder._pid = os.getpid()
+        recorder.record(**self.attempt(1))
+        recorder.record(**self.attempt(2))
+        self.assertFalse(recorder._wakeup.is_set())
+        recorder.record(**self.attempt(3))
+        # A full buffer wakes the flushing thread up before the interval
+        self.assertTrue(recorder._wakeup.is_set())
+        self.assertEqual(recorder.flush(), 3)
+        self.assertEqual(HoneypotAttempt.objects.count(), 3)
+        self.assertEqual(recorder.flush(), 0)
+
+    @override_settings(HONEYPOT_FLUSH_SIZE=1000, HONEYPOT_FLUSH_INTERVAL=10)
+    def test_flush_on_interval(self):
+        recorder = AttemptRecorder()
+        flushed = threading.Event()
+
+        def flush():
+            recorder._buffer.clear()
+            flushed.set()
+
+        # The thread has its own database connection, check the call rather than the rows
+        with mock.patch.object(recorder, 'flush', side_effect=flush):
+            recorder.record(**self.attempt())
+            self.assertFalse(recorder._wakeup.is_set())
+            self.assertTrue(flushed.wait(5))
+
+    def test_flush_at_exit(self):
+        script = textwrap.dedent("""
+            import django
+            from unittest import mock
+            django.setup()
+            from django.conf import settings
+            from django.utils import timezone
+            from honeypot_monitor.models import HoneypotAttempt
+            from honeypot_monitor.recorder import recorder
+            settings.HONEYPOT_FLUSH_INTERVAL = 60 * 1000
+            write = mock.patch.object(HoneypotAttempt.objects, 'bulk_create', lambda batch, **kwargs: print(len(batch)))
+            write.start()
+            for number in range(4):
+                recorder.record(ip_address='203.0.113.1', user_agent='x', timestamp=timezone.now())
+        """)
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'a_core.settings'}
+        result = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=60
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split(), ['4'])
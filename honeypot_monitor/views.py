@@ -2,7 +2,8 @@ from django.shortcuts import render
 from django.contrib.auth.models import User
 from django.http import HttpResponse
 import logging
-from .models import HoneypotAttempt
+from .middleware import client_ip
+from .recorder import recorder
 
 # Set up logging for honeypot attempts
 logger = logging.getLogger(__name__)
@@ -12,7 +13,7 @@ def honeypot_admin(request):
     Honeypot admin view to trap bots and malicious users
     """
     # Log the attempt
-    ip = request.META.get('REMOTE_ADDR', 'Unknown')
+    ip = client_ip(request) or 'Unknown'
     user_agent = request.META.get('HTTP_USER_AGENT', 'Unknown')
     
     if request.method == 'POST':
@@ -21,8 +22,8 @@ def honeypot_admin(request):
         password = request.POST.get('password', '')
         logger.warning(f'Honeypot login attempt - IP: {ip}, User-Agent: {user_agent}, Username: {username}')
         
-        # Save to database
-        HoneypotAttempt.objects.create(
+        # Save to database, in the next batch of the recorder
+        recorder.record(
             ip_address=ip,
             user_agent=user_agent,
             username=username,
@@ -40,8 +41,8 @@ def honeypot_admin(request):
     # Log page access
     logger.warning(f'Honeypot accessed by IP: {ip}, User-Agent: {user_agent}')
     
-    # Save to database
-    HoneypotAttempt.objects.create(
+    # Save to database, in the next batch of the recorder
+    recorder.record(
         ip_address=ip,
         user_agent=user_agent,
         is_login_attempt=False